@@ -1,17 +1,821 @@
+import argparse
 import asyncio
-from typing import Set, List
+import contextlib
+import contextvars
+import hashlib
+import inspect
+import json
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, Optional, Set, List, Tuple
+import aiofiles
+import httpx
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
 from crawl4ai.extraction_strategy import JsonCssExtractionStrategy, LLMExtractionStrategy
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 from bs4 import BeautifulSoup
 import os
 from datetime import datetime
+from urllib.parse import urljoin, urlparse
+
+class TokenBucket:
+    """Asyncio token bucket used to rate limit page fetches.
+
+    Tokens refill at `rate` per second up to `capacity`; every fetch takes
+    one token and waits until one is available. A rate of 0/None disables
+    limiting entirely.
+    """
+
+    def __init__(self, rate: Optional[float], capacity: Optional[float] = None):
+        self.rate = rate or 0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        # Serialize waiters so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """AIMD controller for the number of page fetches in flight.
+
+    Starts at `initial` concurrent fetches. Every `limit` consecutive healthy
+    responses (2xx/304 within `target_latency` seconds) raise the limit by
+    one, up to `maximum`. A throttling signal (429, 5xx or a timeout) halves
+    the limit (down to `minimum`) and pauses all new fetches for an
+    exponentially growing backoff, or for the server's Retry-After.
+    """
+
+    def __init__(self, initial: int, maximum: Optional[int] = None, minimum: int = 1,
+                 target_latency: float = 5.0, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(initial, maximum or initial)
+        self.limit = max(self.minimum, initial)
+        self.target_latency = target_latency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.backoffs = 0
+        self._healthy_streak = 0
+        self._backoff = base_backoff
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    # Drop the lock while sleeping so records can still come in
+                    self._condition.release()
+                    try:
+                        await asyncio.sleep(pause)
+                    finally:
+                        await self._condition.acquire()
+                    continue
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def record(self, latency: float, status: Optional[int] = None, timed_out: bool = False,
+                     retry_after: Optional[float] = None):
+        """Feed one response into the controller."""
+        async with self._condition:
+            if timed_out or status == 429 or (status is not None and status >= 500):
+                self.limit = max(self.minimum, self.limit // 2)
+                delay = retry_after if retry_after is not None else self._backoff
+                self._paused_until = max(self._paused_until, time.monotonic() + min(delay, self.max_backoff))
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                self._healthy_streak = 0
+                self.backoffs += 1
+                print(f"Backing off {min(delay, self.max_backoff):.1f}s (status={status}, timed_out={timed_out}); "
+                      f"concurrency limit now {self.limit}")
+            elif status is not None and status < 400 and latency <= self.target_latency:
+                self._backoff = self.base_backoff
+                self._healthy_streak += 1
+                if self._healthy_streak >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.peak_limit = max(self.peak_limit, self.limit)
+                    self._healthy_streak = 0
+            else:
+                # Slow or client-error responses neither grow nor shrink the pool
+                self._healthy_streak = 0
+            self._condition.notify_all()
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric Retry-After header (HTTP-date values are ignored)."""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(status: Optional[int]) -> bool:
+    """Failures worth another attempt: no response at all, throttling or server errors."""
+    return status is None or status in (408, 425, 429) or status >= 500
+
+
+class CrawlState:
+    """Persistent per-URL crawl state stored as JSON.
+
+    Each entry keeps the HTTP validators (ETag / Last-Modified), hashes of
+    the last fetched HTML and extracted markdown, the file the page was
+    written to and when it was last crawled/changed. The crawler uses it to
+    skip pages that have not changed since the previous run.
+    """
+
+    HISTORY_LENGTH = 30
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        # URLs updated by this process, see save_updates()
+        self.updated: Set[str] = set()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("pages", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable crawl state {path}: {e}")
+
+    def get(self, url: str) -> Optional[dict]:
+        return self.entries.get(url)
+
+    def update(self, url: str, **fields):
+        self.entries.setdefault(url, {}).update(fields)
+        self.updated.add(url)
+
+    def record_visit(self, url: str, changed: bool):
+        """Append a crawl of `url` to its change history (last HISTORY_LENGTH visits)."""
+        now = datetime.now().isoformat()
+        entry = self.entries.setdefault(url, {})
+        history = entry.setdefault("history", [])
+        history.append({"crawled": now, "changed": changed})
+        del history[:-self.HISTORY_LENGTH]
+        entry["last_crawled"] = now
+        if changed:
+            entry["last_changed"] = now
+        self.updated.add(url)
+
+    def recrawl_priority(self, url: str, now: Optional[datetime] = None) -> float:
+        """Expected number of changes since `url` was last crawled.
+
+        The change rate per crawl is estimated from the history with add-one
+        smoothing ((changes + 1) / (visits + 2)), so a page with no history
+        counts as changing half the time, and multiplied by the days since
+        the last crawl. Never-crawled URLs come first (infinity).
+        """
+        entry = self.entries.get(url)
+        if not entry or not entry.get("last_crawled"):
+            return float("inf")
+        history = entry.get("history", [])
+        rate = (sum(1 for visit in history if visit["changed"]) + 1) / (len(history) + 2)
+        age = (now or datetime.now()) - datetime.fromisoformat(entry["last_crawled"])
+        return rate * age.total_seconds() / 86400
+
+    def save(self):
+        self._dump(self.path, self.entries)
+
+    def save_updates(self, path: str):
+        """Write only the entries updated by this process to `path` (see merge())."""
+        self._dump(path, {url: self.entries[url] for url in self.updated})
+
+    def merge(self, path: str):
+        """Fold a file written by save_updates() into this state and delete it."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pages = json.load(f).get("pages", {})
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable crawl state updates {path}: {e}")
+            return
+        for url, fields in pages.items():
+            self.update(url, **fields)
+        os.remove(path)
+
+    @staticmethod
+    def _dump(path: str, entries: Dict[str, dict]):
+        # Write to a temp file first so an interrupted save never truncates the state
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+class CrawlJournal:
+    """Append-only JSONL journal of the current crawl run.
+
+    A `start` record lists the run id (its timestamp) and the URLs in navbar
+    order, every saved page appends a `page` record (index, URL, output file,
+    markdown sha256) and a finished run appends `complete`. If the process
+    dies mid-crawl the journal shows which pages are already on disk so the
+    next run can resume instead of starting over. Starting a new run
+    truncates the journal.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def last_incomplete_run(self) -> Optional[dict]:
+        """Return `{"run_id", "urls", "pages"}` of an unfinished run, if any."""
+        if not os.path.exists(self.path):
+            return None
+        run = None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave a torn last line behind
+                    continue
+                event = record.get("event")
+                if event == "start":
+                    run = {"run_id": record["run_id"], "urls": record["urls"], "pages": {}}
+                elif run is None:
+                    continue
+                elif event == "page":
+                    run["pages"][record["page_index"]] = record
+                elif event == "discover":
+                    run["urls"].append(record["url"])
+                elif event == "complete":
+                    run = None
+        return run
+
+    def last_run_files(self) -> Dict[str, str]:
+        """Return `{url: file}` of the pages saved by the last run, finished or not."""
+        files = {}
+        if not os.path.exists(self.path):
+            return files
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("event") == "start":
+                    files = {}
+                elif record.get("event") == "page":
+                    files[record["url"]] = record["file"]
+        return files
+
+    def start(self, run_id: str, urls: List[str], resume: bool = False):
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if not resume:
+            self._append({"event": "start", "run_id": run_id, "urls": urls, "time": datetime.now().isoformat()})
+
+    def record_page(self, run_id: str, page_index: int, url: str, file_name: str, sha256: str):
+        self._append({"event": "page", "run_id": run_id, "page_index": page_index,
+                      "url": url, "file": file_name, "sha256": sha256})
+
+    def record_url(self, run_id: str, page_index: int, url: str):
+        """A page found while crawling (see `expand`), numbered after the nav pages."""
+        self._append({"event": "discover", "run_id": run_id, "page_index": page_index, "url": url})
+
+    def complete(self, run_id: str):
+        self._append({"event": "complete", "run_id": run_id, "time": datetime.now().isoformat()})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _append(self, record: dict):
+        # Flush every record so a killed process loses at most the page in flight
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+
+class WorkQueue:
+    """SQLite-backed page queue shared by the worker processes of a sharded crawl.
+
+    The coordinator fills it with the navbar-ordered URLs; each worker
+    process (`1_scrap_docs.py --worker QUEUE`) claims pending pages one at a
+    time in an IMMEDIATE transaction, so no page is handed out twice, and
+    marks them done or failed. Page numbering comes from the queue, which
+    lets the coordinator rebuild the navbar order at the end.
+
+    It also stands in for CrawlJournal inside a worker: `record_page`
+    marks the page done and the run-level calls are no-ops.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS pages (
+            page_index INTEGER PRIMARY KEY,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            file TEXT,
+            sha256 TEXT,
+            error TEXT
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly where needed
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def create(self, run_id: str, base_url: str, urls: List[str]):
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             [("run_id", run_id), ("base_url", base_url)])
+            conn.executemany("INSERT INTO pages (page_index, url) VALUES (?, ?)",
+                             list(enumerate(urls, start=1)))
+            conn.execute("COMMIT")
+
+    def meta(self) -> Dict[str, str]:
+        with contextlib.closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT key, value FROM meta"))
+
+    def urls(self) -> List[str]:
+        with contextlib.closing(self._connect()) as conn:
+            return [url for (url,) in conn.execute("SELECT url FROM pages ORDER BY page_index")]
+
+    def claim(self, worker_id: int) -> Optional[Tuple[int, str]]:
+        """Hand the lowest pending page to `worker_id`, or None when the queue is drained."""
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT page_index, url FROM pages WHERE status = 'pending' "
+                               "ORDER BY page_index LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE pages SET status = 'claimed', worker = ?, attempts = attempts + 1 "
+                             "WHERE page_index = ?", (worker_id, row[0]))
+            conn.execute("COMMIT")
+        return tuple(row) if row is not None else None
+
+    def fail(self, page_index: int, error: Optional[str]):
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("UPDATE pages SET status = 'failed', error = ? WHERE page_index = ?", (error, page_index))
+
+    def requeue_claimed(self) -> int:
+        """Put pages claimed by workers that died back to pending; returns how many."""
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute("UPDATE pages SET status = 'pending', worker = NULL WHERE status = 'claimed'").rowcount
+
+    def results(self) -> List[dict]:
+        with contextlib.closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute("SELECT * FROM pages ORDER BY page_index")]
+
+    # CrawlJournal interface used by crawl_docs inside a worker process
+
+    def start(self, run_id: str, urls: List[str], resume: bool = False):
+        pass
+
+    def record_page(self, run_id: str, page_index: int, url: str, file_name: str, sha256: str):
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("UPDATE pages SET status = 'done', file = ?, sha256 = ?, error = NULL WHERE page_index = ?",
+                         (file_name, sha256, page_index))
+
+    def record_url(self, run_id: str, page_index: int, url: str):
+        pass
+
+    def complete(self, run_id: str):
+        pass
+
+    def close(self):
+        pass
+
+
+@dataclass
+class FetchedPage:
+    """Outcome of fetching one page, via plain HTTP or the browser."""
+    success: bool
+    markdown: str = ""
+    html: str = ""
+    error_message: Optional[str] = None
+    via: str = "browser"
+    status_code: Optional[int] = None
+    structure: Optional[dict] = None
+
+
+# Timestamps of browser milestones for the page being fetched by the current
+# task; filled by the crawl4ai hooks installed in BrowserSession.
+_page_marks: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("page_marks", default=None)
+
+TIMING_HOOKS = ("before_goto", "after_goto", "before_return_html")
+
+
+def _timing_hook(mark: str):
+    async def hook(*args, **kwargs):
+        marks = _page_marks.get()
+        if marks is not None:
+            marks[mark] = time.monotonic()
+    return hook
+
+
+# Playwright resource types the docs' markdown never needs
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "texttrack", "manifest"})
+
+
+def site_domain(url: str) -> str:
+    """Registrable domain of `url` (`tradingview.com` for www.tradingview.com); IPs and bare hosts as-is."""
+    host = urlparse(url).hostname or ""
+    labels = host.split(".")
+    if len(labels) <= 2 or all(label.isdigit() for label in labels):
+        return host
+    return ".".join(labels[-2:])
+
+
+def resource_blocker(domain: str):
+    """Playwright route handler aborting blocked resource types and third-party hosts.
+
+    Requests to `domain` or its subdomains (static/CDN hosts of the site)
+    go through unless their resource type is in BLOCKED_RESOURCE_TYPES;
+    everything else (analytics, ads, embeds) is aborted.
+    """
+    async def handle(route):
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        first_party = host == domain or host.endswith(f".{domain}")
+        if not first_party or request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    return handle
+
+
+def elapsed_ms(started: float, ended: Optional[float] = None) -> float:
+    return round(((ended if ended is not None else time.monotonic()) - started) * 1000, 1)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
+
+
+class PageWriter:
+    """Dedicated task that performs a crawl's file writes.
+
+    Workers `submit()` files and go straight back to fetching; the writer
+    writes each job's files in submission order through aiofiles (i.e. on
+    a worker thread) and then calls the job's `on_written(write_ms, error)`,
+    where `error` is the OSError that stopped the job or None, awaiting it
+    if it is a coroutine function, so disk I/O never stalls the event loop
+    running the page fetches. Leaving the
+    context waits for every submitted job, even when the crawl fails.
+    """
 
-class PineScriptDocsCrawler:
     def __init__(self):
-        self.base_url = "https://www.tradingview.com/pine-script-docs"
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, files: List[Tuple[str, str]],
+               on_written: Optional[Callable[[float, Optional[OSError]], Optional[Awaitable[None]]]] = None):
+        self.queue.put_nowait((files, on_written))
+
+    async def drain(self):
+        """Wait until every job submitted so far is written and called back."""
+        await self.queue.join()
+
+    async def _run(self):
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            files, on_written = job
+            started = time.monotonic()
+            error = None
+            try:
+                for path, text in files:
+                    async with aiofiles.open(path, "w", encoding="utf-8") as f:
+                        await f.write(text)
+            except OSError as e:
+                print(f"Failed to write {path}: {e}")
+                error = e
+            try:
+                if on_written is not None:
+                    result = on_written(elapsed_ms(started), error)
+                    if inspect.isawaitable(result):
+                        await result
+            finally:
+                self.queue.task_done()
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self.queue.put_nowait(None)
+        await self._task
+
+
+class BrowserSession:
+    """Shared AsyncWebCrawler that is only launched when a page needs it.
+
+    In `http` fetch mode most pages never touch the browser, so Playwright
+    is started lazily on the first fallback and closed on exit.
+
+    With `recycle_after` set, the browser is closed and relaunched after
+    that many pages to cap memory growth on long crawls: once the limit is
+    reached new pages wait until the pages in flight finish, then get a
+    fresh browser. `hooks` are extra crawl4ai hooks (name -> coroutine)
+    installed next to the telemetry hooks.
+    """
+
+    def __init__(self, browser_config: BrowserConfig, recycle_after: int = 0, hooks: Optional[dict] = None):
+        self.browser_config = browser_config
+        self.recycle_after = recycle_after
+        self.hooks = hooks or {}
+        self.launches = 0
+        self._crawler = None
+        self._condition = asyncio.Condition()
+        self._active = 0
+        self._pages = 0
+        self._retiring = False
+
+    async def _launch(self):
+        crawler = AsyncWebCrawler(config=self.browser_config)
+        await crawler.__aenter__()
+        strategy = getattr(crawler, "crawler_strategy", None)
+        if strategy is not None and hasattr(strategy, "set_hook"):
+            # Hooks timestamp navigation/render milestones for telemetry
+            for mark in TIMING_HOOKS:
+                strategy.set_hook(mark, _timing_hook(mark))
+            for name, hook in self.hooks.items():
+                strategy.set_hook(name, hook)
+        self._crawler = crawler
+        self._pages = 0
+        self.launches += 1
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """Borrow the browser for one page fetch."""
+        async with self._condition:
+            while self._retiring:
+                await self._condition.wait()
+            if self._crawler is None:
+                await self._launch()
+            self._active += 1
+            self._pages += 1
+            if self.recycle_after and self._pages >= self.recycle_after:
+                self._retiring = True
+            crawler = self._crawler
+        try:
+            yield crawler
+        finally:
+            async with self._condition:
+                self._active -= 1
+                if self._retiring and self._active == 0:
+                    print(f"Recycling browser after {self._pages} pages")
+                    await self.close()
+                    self._retiring = False
+                    self._condition.notify_all()
+
+    async def close(self):
+        if self._crawler is not None:
+            crawler, self._crawler = self._crawler, None
+            await crawler.__aexit__(None, None, None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class _QuietFixtureHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Serve recorded documentation pages from a fixtures directory.
+
+    Pages recorded with `record_dir` are stored under their URL path
+    (`pine-script-docs/language/loops/index.html`), so a plain static file
+    server on a local port reproduces the site for offline crawls:
+
+        with FixtureServer("fixtures") as server:
+            crawler.base_url = server.origin + "/pine-script-docs"
+    """
+
+    def __init__(self, root: str, host: str = "127.0.0.1", port: int = 0):
+        self.root = root
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def origin(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        handler = partial(_QuietFixtureHandler, directory=self.root)
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def fixture_path(root: str, url: str) -> str:
+    """Path of the recorded HTML for `url` inside a fixtures directory."""
+    path = urlparse(url).path.strip("/")
+    return os.path.join(root, *path.split("/"), "index.html") if path else os.path.join(root, "index.html")
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def markdown_sections(text: str) -> List[List[str]]:
+    """Split page markdown at its H1/H2 headings into `[key, sha256]` pairs.
+
+    Headings inside ``` fences don't count. The key is the heading text
+    (`""` for anything before the first heading), suffixed with ` (2)`,
+    ` (3)`... when a title repeats on the page.
+    """
+    sections = []
+    title, lines = "", []
+    in_code = False
+    for line in text.splitlines(keepends=True):
+        if line.startswith("```"):
+            in_code = not in_code
+        elif not in_code and line.startswith(("# ", "## ")):
+            if title or "".join(lines).strip():
+                sections.append((title, "".join(lines)))
+            title, lines = line.lstrip("#").strip(), []
+            continue
+        lines.append(line)
+    if title or "".join(lines).strip():
+        sections.append((title, "".join(lines)))
+
+    keyed, seen = [], {}
+    for title, body in sections:
+        seen[title] = seen.get(title, 0) + 1
+        key = title if seen[title] == 1 else f"{title} ({seen[title]})"
+        keyed.append([key, sha256_text(body)])
+    return keyed
+
+
+def section_diff(previous: List[List[str]], current: List[List[str]]) -> dict:
+    """Compare two markdown_sections() results by key: added, removed and modified sections."""
+    old, new = dict(map(tuple, previous)), dict(map(tuple, current))
+    return {
+        "added": [key for key in new if key not in old],
+        "removed": [key for key in old if key not in new],
+        "modified": [key for key in new if key in old and old[key] != new[key]],
+    }
+
+
+DEFAULT_BASE_URL = "https://www.tradingview.com/pine-script-docs"
+FETCH_MODES = ("browser", "http")
+BROWSER_PROFILES = ("full", "light")
+# Pages per browser before the light profile relaunches it
+LIGHT_RECYCLE_AFTER = 200
+# Chromium switches for the light profile on top of the defaults
+LIGHT_BROWSER_ARGS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+    "--mute-audio",
+    "--no-first-run",
+]
+NAMING_MODES = ("timestamp", "stable")
+
+# Schema fields a static page must contain to be converted without the browser
+REQUIRED_STATIC_FIELDS = ("title", "content")
+
+
+class PineScriptDocsCrawler:
+    def __init__(self, concurrency: int = 4, rate_limit: Optional[float] = 2.0, burst: Optional[float] = None,
+                 incremental: bool = False, fetch_mode: str = "browser", resume: bool = False,
+                 naming: str = "timestamp", record_dir: Optional[str] = None, replay_dir: Optional[str] = None,
+                 output_dir: Optional[str] = None, max_concurrency: Optional[int] = None,
+                 target_latency: float = 5.0, max_retries: int = 2, retry_backoff: float = 2.0,
+                 profile: str = "full", recycle_after: Optional[int] = None, shards: int = 1,
+                 discovery_ttl: float = 0, expand: bool = False, budget: Optional[int] = None):
+        """
+        concurrency: number of page fetches in flight on the shared browser
+            at the start of the crawl (see AdaptiveLimiter)
+        rate_limit: maximum pages/second started (token bucket); 0/None disables it
+        burst: token bucket capacity (defaults to max(1, rate_limit))
+        incremental: skip pages unchanged since the previous crawl (see CrawlState)
+        fetch_mode: "browser" renders every page with Playwright; "http" fetches
+            static HTML with a pooled HTTP client and only falls back to the
+            browser when the page lacks the schema's content selectors
+        resume: continue the last unfinished crawl recorded in the crawl journal
+        naming: "timestamp" writes `{index}_{name}_{timestamp}.md` per run;
+            "stable" writes `{index}_{name}.md` plus a `.sha256` sidecar and
+            leaves the file untouched when its content hash is unchanged
+        record_dir: save the HTML of every fetched page into this fixtures directory
+        replay_dir: serve a fixtures directory on a local port and crawl it
+            instead of tradingview.com (see FixtureServer)
+        output_dir: where `pinescript_docs` output goes (default: next to this script)
+        max_concurrency: let healthy responses grow the fetches in flight up
+            to this many (default: `concurrency`, i.e. only back off)
+        target_latency: seconds a response may take and still count as healthy
+        max_retries: end-of-run retry rounds for pages that failed with a
+            timeout, throttling or server error
+        retry_backoff: seconds before the first retry round, doubled per round
+        profile: "full" renders pages like a regular browser; "light" runs
+            Chromium in text/light mode, blocks images, media, fonts and
+            third-party hosts, and recycles the browser periodically
+        recycle_after: relaunch the browser after this many pages; 0 never
+            does (default: LIGHT_RECYCLE_AFTER for the light profile, else 0)
+        shards: crawl with this many worker processes, each with its own
+            browser, sharing a SQLite work queue (see crawl_sharded)
+        discovery_ttl: reuse the nav URLs of `discovery_cache.json` for this
+            many seconds instead of reading `/welcome/` again; 0 (the
+            default) disables it. The cache is never used when recording or
+            replaying fixtures
+        expand: also crawl in-scope links found on crawled pages that the
+            nav lacks (breadth-first, numbered after the nav pages)
+        budget: crawl at most this many pages per run, the ones most likely
+            to have changed according to their change history (needs
+            `incremental`); the others keep their previous output
+        """
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(f"fetch_mode must be one of {FETCH_MODES}, got {fetch_mode!r}")
+        if naming not in NAMING_MODES:
+            raise ValueError(f"naming must be one of {NAMING_MODES}, got {naming!r}")
+        if profile not in BROWSER_PROFILES:
+            raise ValueError(f"profile must be one of {BROWSER_PROFILES}, got {profile!r}")
+        if budget and not incremental:
+            raise ValueError("budget needs incremental crawl state to rank pages by change history")
+        if budget and shards > 1:
+            raise ValueError("budget is not supported with shards: workers claim every queued page")
+        if expand and shards > 1:
+            raise ValueError("expand is not supported with shards: page numbers are assigned by the work queue")
+        self.base_url = DEFAULT_BASE_URL
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.incremental = incremental
+        self.fetch_mode = fetch_mode
+        self.resume = resume
+        self.naming = naming
+        self.record_dir = record_dir
+        self.replay_dir = replay_dir
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.profile = profile
+        self.recycle_after = recycle_after
+        self.shards = shards
+        self.discovery_ttl = discovery_ttl
+        self.expand = expand
+        self.budget = budget
         # Create output directory
         script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.output_dir = os.path.join(script_dir, "pinescript_docs")
+        self.output_dir = output_dir or os.path.join(script_dir, "pinescript_docs")
         self.visited_urls: Set[str] = set()
         
         # Define the extraction schema for structure
@@ -51,6 +855,12 @@ class PineScriptDocsCrawler:
             "related_topics": List[str]
         }
 
+    @property
+    def site_root(self) -> str:
+        """Scheme and host of `base_url`, used to resolve root-relative links."""
+        parsed = urlparse(self.base_url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
     def normalize_url(self, url: str) -> str:
         """Convert relative URLs to absolute and clean them"""
         if not url:
@@ -59,6 +869,10 @@ class PineScriptDocsCrawler:
         # Remove anchor tags and query parameters
         url = url.split('#')[0].split('?')[0]
         
+        # Absolute links to the live docs inside replayed pages stay in scope
+        if self.base_url != DEFAULT_BASE_URL and url.startswith(DEFAULT_BASE_URL):
+            url = self.base_url + url[len(DEFAULT_BASE_URL):]
+        
         # Skip external links and special protocols
         if url.startswith(('http', 'https')) and not url.startswith(self.base_url):
             return ""
@@ -68,12 +882,431 @@ class PineScriptDocsCrawler:
         # Handle relative URLs
         if not url.startswith('http'):
             if url.startswith('/'):
-                url = f"https://www.tradingview.com{url}"
+                url = f"{self.site_root}{url}"
             else:
                 url = f"{self.base_url}/{url}"
                 
         return url
 
+    async def record_fixture(self, url: str, html: str):
+        """Save the fetched HTML of `url` into `record_dir` (no-op when not recording)."""
+        if not self.record_dir or not html:
+            return
+        path = fixture_path(self.record_dir, url)
+
+        def write():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html)
+
+        await asyncio.to_thread(write)
+
+    @staticmethod
+    def markdown_text(result) -> str:
+        """Return the raw markdown of a crawl result.
+
+        Handles both plain strings and MarkdownGenerationResult objects.
+        """
+        if isinstance(result.markdown, str):
+            return result.markdown
+        return result.markdown.raw_markdown if result.markdown else ""
+
+    def page_slug(self, url: str) -> str:
+        """Path of `url` below the docs root as a file name, e.g. `concepts/alerts` -> `concepts_alerts`.
+
+        The whole path is used because the last segment alone is ambiguous
+        (`alerts`, `overview` and `strategies` each exist in several sections).
+        """
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else urlparse(url).path
+        return "_".join(part for part in path.split('/') if part) or 'index'
+
+    def page_file_name(self, page_index: int, url: str, timestamp: str) -> str:
+        """File name of a crawled page in `unprocessed/` for the configured naming mode.
+
+        Stable names only depend on the URL, so adding or removing a nav page
+        does not rename (and re-embed) every page after it; the nav order is
+        kept in `page_order.json` instead (see page_order_text).
+        """
+        if self.naming == "stable":
+            return f"{self.page_slug(url)}.md"
+        page_name = url.rstrip('/').split('/')[-1] or 'index'
+        return f"{page_index}_{page_name}_{timestamp}.md"
+
+    def reusable_file(self, page_index: int, url: str, file_name: str) -> bool:
+        """Whether a page's previous file can stand as this run's output: same stable name or nav position."""
+        if self.naming == "stable":
+            return file_name == self.page_file_name(page_index, url, "")
+        return file_name.startswith(f"{page_index}_")
+
+    @staticmethod
+    def page_order_path(unprocessed_dir: str) -> str:
+        return os.path.join(unprocessed_dir, "page_order.json")
+
+    def page_order_text(self, urls: List[str]) -> str:
+        """`page_order.json`: the stable file names of `urls`, in nav order.
+
+        The processor orders its inputs (and `processed_all_docs.md`) by it,
+        since stable names no longer carry the nav position.
+        """
+        files = list(dict.fromkeys(self.page_file_name(0, url, "") for url in urls))
+        return json.dumps({"files": files}, indent=2)
+
+    def stable_page_files(self, unprocessed_dir: str) -> Dict[str, str]:
+        """Map the `Source:` URL of every stable-named page in `unprocessed_dir` to its file.
+
+        This is how a page finds (and supersedes) a previous file under
+        another name, e.g. one named after its nav position by older versions.
+        """
+        files = {}
+        for name in sorted(os.listdir(unprocessed_dir)):
+            path = os.path.join(unprocessed_dir, name)
+            if not name.endswith(".md") or not os.path.exists(self.hash_sidecar_path(path)):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    header = [f.readline() for _ in range(3)]
+            except OSError:
+                continue
+            if header[2].startswith("Source: "):
+                files[header[2][len("Source: "):].strip()] = name
+        return files
+
+    @staticmethod
+    def hash_sidecar_path(path: str) -> str:
+        return f"{os.path.splitext(path)[0]}.sha256"
+
+    def read_hash_sidecar(self, path: str) -> Optional[str]:
+        """Return the content sha256 recorded next to a page file, if any."""
+        try:
+            with open(self.hash_sidecar_path(path), "r", encoding="utf-8") as f:
+                return f.read().split()[0]
+        except (OSError, IndexError):
+            return None
+
+    @staticmethod
+    def hash_sidecar_text(path: str, sha256: str) -> str:
+        # sha256sum-style line: "<hash>  <file name>"
+        return f"{sha256}  {os.path.basename(path)}\n"
+
+    @staticmethod
+    def page_text(title: str, url: str, content: str) -> str:
+        """Full page file: `# {title}` and `Source:` header, then the markdown."""
+        return f"# {title}\n\nSource: {url}\n\n{content}"
+
+    @staticmethod
+    def combined_text(outcomes: Dict[int, tuple]) -> Tuple[str, str]:
+        """Build the combined markdown and failed-URL list from per-page outcomes, in page order."""
+        combined, failed = [], []
+        for page_index in sorted(outcomes):
+            url, page_name, content, error = outcomes[page_index]
+            if content is not None:
+                combined.append(f"\n\n# {page_index}_{page_name}\n\nSource: {url}\n\n{content}\n\n---\n\n")
+            else:
+                failed.append(f"{url}: {error}\n")
+        return "".join(combined), "".join(failed)
+
+    def remove_page_file(self, path: str):
+        """Delete a page file and its hash and structure sidecars, if present."""
+        for file_path in (path, self.hash_sidecar_path(path), self.structure_sidecar_path(path)):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def read_page_file(path: str) -> str:
+        """Return the markdown of a saved page without its `# name` / `Source:` header."""
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        parts = text.split("\n\n", 2)
+        return parts[2] if len(parts) == 3 else ""
+
+    async def conditional_get(self, client: httpx.AsyncClient, url: str, entry: Optional[dict]) -> Tuple[bool, dict, httpx.Response]:
+        """GET `url` with the validators of the previous crawl and report whether it is unchanged.
+
+        Sends If-None-Match / If-Modified-Since from `entry`. A 304 means
+        unchanged; on a 200 the raw HTML hash is compared instead, for
+        servers that don't honour validators. Returns `(unchanged, fields,
+        response)` where `fields` are the fresh validators to store in the
+        crawl state.
+        """
+        entry = entry or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await client.get(url, headers=headers)
+        fields = {
+            "etag": response.headers.get("etag", entry.get("etag")),
+            "last_modified": response.headers.get("last-modified", entry.get("last_modified")),
+        }
+        if response.status_code == 304:
+            return True, fields, response
+        if response.status_code == 200:
+            fields["html_sha256"] = hashlib.sha256(response.content).hexdigest()
+            return fields["html_sha256"] == entry.get("html_sha256"), fields, response
+        return False, fields, response
+
+    def static_main_html(self, html: str) -> Optional[str]:
+        """Return the schema's base element (`main`) from static HTML.
+
+        Returns None when the base element or any of REQUIRED_STATIC_FIELDS
+        is missing, i.e. the page needs JavaScript rendering.
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        base = soup.select_one(self.structure_schema["baseSelector"])
+        if base is None:
+            return None
+        for field in self.structure_schema["fields"]:
+            if field["name"] in REQUIRED_STATIC_FIELDS and base.select_one(field["selector"]) is None:
+                return None
+        return str(base)
+
+    @staticmethod
+    def structure_sidecar_path(path: str) -> str:
+        return f"{os.path.splitext(path)[0]}.structure.json"
+
+    def page_structure(self, html: str, extracted_content: Optional[str] = None) -> Optional[dict]:
+        """Title, headings and TOC of a page, from the structure schema's fields.
+
+        Uses crawl4ai's `extracted_content` (JsonCssExtractionStrategy over
+        `structure_schema`) when present, otherwise applies the same
+        selectors to `html` with BeautifulSoup. Each heading of the content
+        becomes `{"level", "text", "anchor"}`; `toc` lists the `{"text",
+        "anchor"}` links of the right-side table of contents. Returns None
+        when the page has no base element.
+        """
+        fields = None
+        if extracted_content:
+            try:
+                extracted = json.loads(extracted_content)
+            except ValueError:
+                extracted = None
+            if isinstance(extracted, list) and extracted and isinstance(extracted[0], dict):
+                fields = extracted[0]
+        if fields is None:
+            soup = BeautifulSoup(html or "", 'html.parser')
+            base = soup.select_one(self.structure_schema["baseSelector"])
+            if base is None:
+                return None
+            fields = {}
+            for field in self.structure_schema["fields"]:
+                element = base.select_one(field["selector"])
+                if element is not None:
+                    fields[field["name"]] = element.get_text(" ", strip=True) if field["type"] == "text" else str(element)
+
+        headings = []
+        content = BeautifulSoup(fields.get("content") or "", 'html.parser')
+        for element in content.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]):
+            anchor = element.get("id")
+            if not anchor:
+                link = element.find("a", href=lambda href: href and href.startswith("#"))
+                anchor = link["href"][1:] if link else None
+            headings.append({"level": int(element.name[1]), "text": element.get_text(" ", strip=True), "anchor": anchor})
+        toc = []
+        for link in BeautifulSoup(fields.get("toc") or "", 'html.parser').find_all("a"):
+            href = link.get("href") or ""
+            toc.append({"text": link.get_text(" ", strip=True), "anchor": href.split("#", 1)[1] if "#" in href else None})
+        return {"title": (fields.get("title") or "").strip(), "headings": headings, "toc": toc}
+
+    @staticmethod
+    def html_to_markdown(html: str, url: str) -> str:
+        """Convert an HTML fragment to markdown with crawl4ai's default generator."""
+        return DefaultMarkdownGenerator().generate_markdown(html, base_url=url).raw_markdown
+
+    async def fetch_page(self, url: str, browser: BrowserSession, run_config: CrawlerRunConfig,
+                         html: Optional[str] = None, telemetry: Optional[dict] = None) -> FetchedPage:
+        """Fetch one page, converting `html` in-process when it is usable.
+
+        `html` is the static page body already downloaded over HTTP (or None
+        in browser mode). Pages without the expected content are rendered by
+        the shared browser instead.
+
+        `telemetry["timings_ms"]` receives the phases that apply: extraction
+        and markdown generation for static pages; navigation, render and
+        extraction for browser pages, where crawl4ai's markdown generation
+        happens inside arun and is counted as extraction.
+        """
+        timings = telemetry.setdefault("timings_ms", {}) if telemetry is not None else {}
+        if html is not None:
+            started = time.monotonic()
+            main_html = self.static_main_html(html)
+            timings["extraction"] = elapsed_ms(started)
+            if main_html is not None:
+                started = time.monotonic()
+                markdown = self.html_to_markdown(main_html, url)
+                timings["markdown"] = elapsed_ms(started)
+                return FetchedPage(True, markdown=markdown, html=html, via="http",
+                                   structure=self.page_structure(main_html))
+            print(f"Static HTML lacks expected content, falling back to browser: {url}")
+
+        if telemetry is not None:
+            telemetry["attempts"] = telemetry.get("attempts", 0) + 1
+        marks = {}
+        async with browser.page() as crawler:
+            token = _page_marks.set(marks)
+            started = time.monotonic()
+            try:
+                result = await crawler.arun(url=url, config=run_config)
+            finally:
+                _page_marks.reset(token)
+            ended = time.monotonic()
+        if "after_goto" in marks and "before_return_html" in marks:
+            timings["navigation"] = elapsed_ms(marks.get("before_goto", started), marks["after_goto"])
+            timings["render"] = elapsed_ms(marks["after_goto"], marks["before_return_html"])
+            timings["extraction"] = elapsed_ms(marks["before_return_html"], ended)
+        else:
+            # No hook timestamps (e.g. a cached result): only the total is known
+            timings["browser"] = elapsed_ms(started, ended)
+        status_code = getattr(result, "status_code", None)
+        if not result.success:
+            return FetchedPage(False, error_message=result.error_message, status_code=status_code)
+        return FetchedPage(True, markdown=self.markdown_text(result), html=result.html or "", status_code=status_code,
+                           structure=self.page_structure(result.html, getattr(result, "extracted_content", None)))
+
+    def make_browser_config(self) -> BrowserConfig:
+        extra_args = ["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"]
+        if self.profile == "light":
+            # text_mode/light_mode turn off images and background features crawl4ai knows about
+            return BrowserConfig(headless=True, text_mode=True, light_mode=True,
+                                 extra_args=extra_args + LIGHT_BROWSER_ARGS)
+        return BrowserConfig(
+            headless=True,
+            extra_args=extra_args
+        )
+
+    def browser_hooks(self) -> dict:
+        """crawl4ai hooks of the browser profile."""
+        if self.profile != "light":
+            return {}
+        blocker = resource_blocker(site_domain(self.base_url))
+
+        async def block_resources(page, context=None, **kwargs):
+            # Routed per page: contexts can be shared between concurrent pages
+            await page.route("**/*", blocker)
+            return page
+        return {"on_page_context_created": block_resources}
+
+    def make_browser_session(self) -> BrowserSession:
+        recycle_after = self.recycle_after
+        if recycle_after is None:
+            recycle_after = LIGHT_RECYCLE_AFTER if self.profile == "light" else 0
+        return BrowserSession(self.make_browser_config(), recycle_after=recycle_after, hooks=self.browser_hooks())
+
+    def nav_links(self, html: str) -> List[str]:
+        """Return the normalized documentation links of the navigation, in navbar order."""
+        urls = []
+        seen = set()
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Find all navigation elements
+        nav_elements = soup.find_all(['nav', 'div'], class_=['toc', 'sidebar'])
+        for nav in nav_elements:
+            for link in nav.find_all('a'):
+                href = link.get('href')
+                if href:
+                    full_url = self.normalize_url(href)
+                    if full_url and full_url not in seen:
+                        seen.add(full_url)
+                        urls.append(full_url)
+                        print(f"Found URL: {full_url}")
+        return urls
+
+    def page_links(self, html: str, page_url: str) -> List[str]:
+        """Return the in-scope documentation links of a crawled page, in document order.
+
+        Links are resolved against `page_url`, normalized, and kept only
+        when they point below `base_url` at something other than a file
+        (images, downloads).
+        """
+        urls = []
+        seen = set()
+        for link in BeautifulSoup(html or "", 'html.parser').find_all('a', href=True):
+            href = link['href']
+            if href.startswith('#'):
+                continue
+            full_url = self.normalize_url(urljoin(page_url, href))
+            last_segment = urlparse(full_url).path.rstrip('/').rsplit('/', 1)[-1]
+            if full_url.startswith(f"{self.base_url}/") and "." not in last_segment and full_url not in seen:
+                seen.add(full_url)
+                urls.append(full_url)
+        return urls
+
+    @property
+    def discovery_cache_path(self) -> str:
+        return os.path.join(self.output_dir, "discovery_cache.json")
+
+    @property
+    def uses_discovery_cache(self) -> bool:
+        # A recording must fetch the nav page itself, and a replay's URLs
+        # point at a throwaway local server
+        return bool(self.discovery_ttl) and not self.record_dir and not self.replay_dir
+
+    def read_discovery_cache(self) -> Dict[str, dict]:
+        """The discovery cache by base URL, empty if missing or unreadable."""
+        if not os.path.exists(self.discovery_cache_path):
+            return {}
+        try:
+            with open(self.discovery_cache_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("base_urls", {})
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Ignoring unreadable discovery cache: {e}")
+            return {}
+
+    def load_discovery_cache(self) -> Optional[List[str]]:
+        """Return cached nav URLs for `base_url` if younger than `discovery_ttl` seconds."""
+        if not self.uses_discovery_cache:
+            return None
+        cache = self.read_discovery_cache().get(self.base_url, {})
+        age = time.time() - cache.get("discovered_at", 0)
+        if age > self.discovery_ttl or not cache.get("urls"):
+            return None
+        print(f"Using {len(cache['urls'])} URLs discovered {age / 60:.0f} minutes ago ({self.discovery_cache_path})")
+        return cache["urls"]
+
+    def save_discovery_cache(self, urls: List[str]):
+        cache = self.read_discovery_cache()
+        cache[self.base_url] = {"discovered_at": time.time(), "urls": urls}
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.discovery_cache_path, "w", encoding="utf-8") as f:
+            json.dump({"base_urls": cache}, f, indent=2)
+
+    def write_report(self, path: str, run_id: str, elapsed: float, workers: int, counts: dict, pages: List[dict],
+                     limiter: Optional[AdaptiveLimiter] = None, browser_launches: int = 0):
+        """Write the JSON crawl report: run totals, p50/p95/max per phase and per-page telemetry."""
+        phases = sorted({phase for page in pages for phase in page["timings_ms"]})
+        report = {
+            "run_id": run_id,
+            "elapsed_s": round(elapsed, 2),
+            "pages_per_second": round(len(pages) / elapsed, 3) if elapsed > 0 else None,
+            "concurrency": workers,
+            "rate_limit": self.rate_limit,
+            "fetch_mode": self.fetch_mode,
+            "profile": self.profile,
+            "browser_launches": browser_launches,
+            "counts": counts,
+            "adaptive": {
+                "final_limit": limiter.limit,
+                "peak_limit": limiter.peak_limit,
+                "backoffs": limiter.backoffs,
+            } if limiter is not None else None,
+            "timings_ms": {
+                phase: summarize([p["timings_ms"][phase] for p in pages if phase in p["timings_ms"]])
+                for phase in phases
+            },
+            "bytes": {
+                kind: summarize([p["bytes"][kind] for p in pages if kind in p["bytes"]])
+                for kind in ("html", "markdown", "file")
+            },
+            "attempts": summarize([p["attempts"] for p in pages]),
+            "retries": summarize([p.get("retries", 0) for p in pages]),
+            "pages": pages,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
     async def get_all_doc_urls(self) -> List[str]:
         """Extract all documentation URLs from the navigation menu
 
@@ -82,46 +1315,128 @@ class PineScriptDocsCrawler:
         then calling sorted() loses the original navbar order which caused
         filenames to be written out of order.
         """
+        cached = self.load_discovery_cache()
+        if cached:
+            return cached
         urls = []
         print("Starting to collect URLs...")
+        welcome_url = f"{self.base_url}/welcome/"
         
-        # Start with main sections from left navigation
-        browser_config = BrowserConfig(
-            headless=True,
-            extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"]
-        )
+        if self.fetch_mode == "http":
+            try:
+                async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+                    response = await client.get(welcome_url)
+                    response.raise_for_status()
+                urls = self.nav_links(response.text)
+                if urls:
+                    await self.record_fixture(welcome_url, response.text)
+            except httpx.HTTPError as e:
+                print(f"Static fetch of main page failed: {e}")
+            if not urls:
+                print("No navigation links in static HTML, falling back to browser")
         
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            result = await crawler.arun(url=f"{self.base_url}/welcome/")
-            if result.success:
-                print("Successfully accessed the main page")
-                soup = BeautifulSoup(result.html, 'html.parser')
-                
-                # Find all navigation elements
-                nav_elements = soup.find_all(['nav', 'div'], class_=['toc', 'sidebar'])
-                for nav in nav_elements:
-                    for link in nav.find_all('a'):
-                        href = link.get('href')
-                        if href:
-                            full_url = self.normalize_url(href)
-                            if full_url and full_url not in urls:
-                                urls.append(full_url)
-                                print(f"Found URL: {full_url}")
-            else:
-                print(f"Failed to access main page: {result.error_message}")
+        if not urls:
+            # Start with main sections from left navigation
+            async with self.make_browser_session() as browser, browser.page() as crawler:
+                result = await crawler.arun(url=welcome_url)
+                if result.success:
+                    print("Successfully accessed the main page")
+                    urls = self.nav_links(result.html)
+                    await self.record_fixture(welcome_url, result.html)
+                else:
+                    print(f"Failed to access main page: {result.error_message}")
         
         # Preserve the collected order (do not re-sort)
         urls_list = list(urls)
         print(f"Total URLs found: {len(urls_list)}")
+        if urls_list and self.uses_discovery_cache:
+            self.save_discovery_cache(urls_list)
         return urls_list
 
-    async def crawl_docs(self, urls: List[str]):
-        """Crawl documentation pages with both structure and content extraction"""
+    def page_changes(self, page_index: int, url: str, file_name: str, content: str,
+                     entry: Optional[dict], previous_path: Optional[str]) -> dict:
+        """Section diff of a page about to be rewritten, for `changes_{timestamp}.json`.
+
+        The previous sections come from the crawl state when it has them,
+        otherwise from the page's previous file (which, with timestamped
+        names and no crawl state, is the one the journal recorded for the
+        URL in the last run). A page with neither is reported as new, with
+        every section added.
+        """
+        previous = entry.get("sections") if entry and previous_path else None
+        if previous is None and previous_path:
+            previous = markdown_sections(self.read_page_file(previous_path))
+        change = {"page_index": page_index, "url": url, "file": file_name, "new": previous is None}
+        if previous_path:
+            change["previous_file"] = os.path.basename(previous_path)
+        change.update(section_diff(previous or [], markdown_sections(content)))
+        return change
+
+    def plan_recrawl(self, urls: List[str], state: CrawlState, unprocessed_dir: str) -> Dict[int, str]:
+        """Pick the pages that do not fit in this run's `budget`.
+
+        Pages are ranked by CrawlState.recrawl_priority (expected changes
+        since their last crawl) and the top `budget` are crawled. Returns
+        `{page_index: file}` for the rest whose output from a previous run
+        is still in place; pages without one are always crawled.
+        """
+        now = datetime.now()
+        ranked = sorted(enumerate(urls, start=1), key=lambda item: -state.recrawl_priority(item[1], now))
+        deferred = {}
+        for page_index, url in ranked[self.budget:]:
+            entry = state.get(url) or {}
+            file_name = entry.get("file", "")
+            if self.reusable_file(page_index, url, file_name) and os.path.exists(os.path.join(unprocessed_dir, file_name)):
+                deferred[page_index] = file_name
+        print(f"Recrawl budget {self.budget}: crawling {len(urls) - len(deferred)} pages, deferring {len(deferred)}")
+        return deferred
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.output_dir, "crawl_journal.jsonl")
+
+    async def crawl_docs(self, urls: List[str], resume_run: Optional[dict] = None,
+                         page_queue: Optional[asyncio.Queue] = None, work_queue: Optional[WorkQueue] = None,
+                         worker_id: Optional[int] = None):
+        """Crawl documentation pages with both structure and content extraction
+
+        Pages are fetched by a pool of workers sharing one `AsyncWebCrawler`,
+        with every fetch gated by a token bucket so the request rate never
+        exceeds `self.rate_limit` pages/second. An AdaptiveLimiter decides how
+        many of the workers may fetch at once: it starts at `self.concurrency`,
+        grows towards `self.max_concurrency` while responses are fast and
+        healthy, and backs off on 429s, 5xx and timeouts. Pages that failed
+        that way are retried in up to `self.max_retries` rounds at the end of
+        the run. Page files are numbered by their position in `urls` and the
+        combined/failed outputs are built once, in that same navbar order,
+        after the last page, so the result does not depend on which fetch
+        finishes first. All files are written by a PageWriter task so disk
+        I/O does not hold up fetches in flight.
+
+        Every saved page is recorded in the crawl journal. `resume_run` (from
+        `CrawlJournal.last_incomplete_run()`) continues that run: its
+        timestamp is reused and pages whose journaled file is still intact
+        are not fetched again.
+
+        When `page_queue` is given, `(page_index, file_name)` is put on it as
+        soon as each page's file in `unprocessed/` is ready (written, kept
+        or resumed), so a consumer can process pages while the crawl runs.
+
+        With `work_queue` this runs as worker `worker_id` of a sharded crawl
+        (see crawl_sharded): pages are claimed from the shared queue instead
+        of enumerating `urls` (the queue's full URL list), completions are
+        recorded in the queue instead of the journal, crawl state updates go
+        to a per-worker file, and the combined outputs are left to the
+        coordinator.
+        """
         # Ensure base output directory exists and create an `unprocessed` subfolder
         os.makedirs(self.output_dir, exist_ok=True)
         unprocessed_dir = os.path.join(self.output_dir, "unprocessed")
         os.makedirs(unprocessed_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if work_queue is not None:
+            timestamp = work_queue.meta()["run_id"]
+        else:
+            timestamp = resume_run["run_id"] if resume_run else datetime.now().strftime("%Y%m%d_%H%M%S")
         
         print(f"Created output directory: {self.output_dir}")
         
@@ -130,109 +1445,635 @@ class PineScriptDocsCrawler:
             schema=self.structure_schema,
             verbose=True
         )
-        
-        browser_config = BrowserConfig(
-            headless=True,
-            extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"]
-        )
+        run_config = CrawlerRunConfig(extraction_strategy=structure_strategy)
         
         # Create files for saving results
         combined_path = f"{self.output_dir}/all_docs_{timestamp}.md"
         failed_path = f"{self.output_dir}/failed_urls_{timestamp}.txt"
+        report_path = f"{self.output_dir}/crawl_report_{timestamp}.json"
+        changes_path = f"{self.output_dir}/changes_{timestamp}.json"
+        if work_queue is not None:
+            report_path = f"{self.output_dir}/crawl_report_{timestamp}_w{worker_id}.json"
+            changes_path = f"{self.output_dir}/changes_{timestamp}_w{worker_id}.json"
         
-        print("Starting crawling process...")
+        workers = max(self.concurrency, self.max_concurrency or 0)
+        if not self.expand:
+            # Nothing can be added to the queue: extra workers would sit idle
+            workers = max(1, min(workers, len(urls)))
+        limiter = AdaptiveLimiter(min(self.concurrency, workers), maximum=workers, target_latency=self.target_latency)
+        print(f"Starting crawling process ({limiter.limit} of {workers} workers, {self.fetch_mode} fetch, rate limit: {self.rate_limit or 'none'} pages/s)...")
         
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            success = 0
-            failed = 0
-            # Keep a running index for filenames so saved files are prefixed in order
-            page_index = 1
-            
-            with open(combined_path, "w", encoding="utf-8") as combined_file, \
-                 open(failed_path, "w", encoding="utf-8") as failed_file:
-                
-                # Process in small batches
-                batch_size = 3
-                for i in range(0, len(urls), batch_size):
-                    batch = urls[i:i + batch_size]
-                    print(f"\nProcessing batch {i//batch_size + 1}/{(len(urls) + batch_size - 1)//batch_size}")
+        # page_index -> (url, page_name, content, error); content is None on failure
+        outcomes: Dict[int, tuple] = {}
+        counts = {"success": 0, "unchanged": 0, "resumed": 0, "deferred": 0, "failed": 0, "retried": 0,
+                  "http": 0, "browser": 0}
+        # page_index -> per-page telemetry for the JSON crawl report
+        reports: Dict[int, dict] = {}
+        # page_index -> section diff of a rewritten page against its previous version
+        changes: Dict[int, dict] = {}
+        # Transient failures of the current round, re-queued once it is over
+        retry_pages: List[tuple] = []
+        retry_round = 0
+        
+        # Pages finished by the interrupted run are reused if their file is intact
+        journaled = resume_run["pages"] if resume_run else {}
+        state = CrawlState(os.path.join(self.output_dir, "crawl_state.json")) if self.incremental else None
+        # Pages the recrawl budget leaves for a later run keep their current file
+        deferred = self.plan_recrawl(urls, state, unprocessed_dir) if self.budget and work_queue is None else {}
+        deferred_ready = []
+        # Without crawl state a stable-named page finds its previous file by URL
+        stable_files = self.stable_page_files(unprocessed_dir) if self.naming == "stable" else {}
+        # Files saved or kept by this run, never removed as another page's superseded version
+        claimed_files: Set[str] = set()
+        # page_index -> error of pages whose files the writer failed to save
+        write_failures: Dict[int, str] = {}
+        
+        # Pages found by `expand` are appended, so work on a copy
+        urls = list(urls)
+        seen = {url.rstrip('/') for url in urls}
+        
+        # Page indices follow the order of `urls` regardless of success so
+        # numbering matches the original navbar order.
+        queue: asyncio.Queue = asyncio.Queue()
+        for page_index, url in enumerate(urls if work_queue is None else [], start=1):
+            record = journaled.get(page_index)
+            if record and record["url"] == url:
+                path = os.path.join(unprocessed_dir, record["file"])
+                if os.path.exists(path):
+                    content = self.read_page_file(path)
+                    if sha256_text(content) == record["sha256"]:
+                        outcomes[page_index] = (url, url.rstrip('/').split('/')[-1] or 'index', content, None)
+                        counts["resumed"] += 1
+                        if page_queue is not None:
+                            page_queue.put_nowait((page_index, record["file"]))
+                        continue
+            if page_index in deferred:
+                content = self.read_page_file(os.path.join(unprocessed_dir, deferred[page_index]))
+                outcomes[page_index] = (url, url.rstrip('/').split('/')[-1] or 'index', content, None)
+                counts["deferred"] += 1
+                deferred_ready.append((page_index, url, deferred[page_index], sha256_text(content)))
+                continue
+            queue.put_nowait((page_index, url))
+        if resume_run:
+            print(f"Resuming crawl {timestamp}: {counts['resumed']} pages already done, {queue.qsize()} remaining")
+        
+        bucket = TokenBucket(self.rate_limit, self.burst)
+        journal = CrawlJournal(self.journal_path) if work_queue is None else work_queue
+        # The last run's file of every URL, the baseline of the section diffs
+        # when neither crawl state nor stable names know the previous file.
+        # Read before journal.start() truncates the journal.
+        last_run_files = journal.last_run_files() if work_queue is None and not resume_run else {}
+        started = time.monotonic()
+        # One pooled HTTP client serves conditional requests and static fetches
+        http_limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+        
+        writer = PageWriter()
+        
+        # Pages being worked on; with `expand` an idle worker waits for them
+        # since they may still add links to the queue
+        frontier = asyncio.Condition()
+        active = 0
+        
+        async def next_page() -> Optional[tuple]:
+            nonlocal active
+            async with frontier:
+                while True:
+                    if not queue.empty():
+                        active += 1
+                        return queue.get_nowait()
+                    # Retry rounds only revisit this process's own failures
+                    if work_queue is not None and not retry_round:
+                        item = await asyncio.to_thread(work_queue.claim, worker_id)
+                        if item is not None:
+                            active += 1
+                        return item
+                    if not self.expand or active == 0:
+                        return None
+                    await frontier.wait()
+        
+        async def page_done():
+            nonlocal active
+            async with frontier:
+                active -= 1
+                frontier.notify_all()
+        
+        def expand_from(html: str, page_url: str):
+            """Queue in-scope links of a crawled page that no page has yet (breadth-first)."""
+            added = 0
+            for link in self.page_links(html, page_url):
+                if link.rstrip('/') not in seen:
+                    seen.add(link.rstrip('/'))
+                    urls.append(link)
+                    journal.record_url(timestamp, len(urls), link)
+                    queue.put_nowait((len(urls), link))
+                    added += 1
+            if added:
+                print(f"Found {added} new pages on {page_url}")
+        
+        async def page_ready(page_index: int, url: str, file_name: str, content_sha: str,
+                       superseded: Optional[str] = None, telemetry: Optional[dict] = None,
+                       write_ms: Optional[float] = None, write_error: Optional[OSError] = None,
+                       state_fields: Optional[dict] = None):
+            """Journal a page whose file is on disk and hand it to the page queue.
+
+            `state_fields` (validators, file and hashes) only reach the crawl
+            state here, once the page is on disk: stored any earlier, a failed
+            render would let the next run skip the page and keep its old file.
+            A page the writer failed to save is counted as failed instead and,
+            being neither journaled nor queued, is crawled again by the next
+            (or resumed) run.
+            """
+            if write_error is not None:
+                error = f"Failed to write {file_name}: {write_error}"
+                write_failures[page_index] = error
+                counts["success"] -= 1
+                counts["failed"] += 1
+                telemetry.update(status="failed", error=error)
+                if state is not None:
+                    state.update(url, etag=None, last_modified=None, html_sha256=None)
+                if work_queue is not None:
+                    await asyncio.to_thread(work_queue.fail, page_index, error)
+                return
+            if state_fields:
+                state.update(url, **state_fields)
+            if write_ms is not None:
+                telemetry["timings_ms"]["write"] = write_ms
+                print(f"Successfully saved: {file_name}")
+            claimed_files.add(file_name)
+            # Each URL owns one file: drop the superseded version (e.g. after
+            # the page moved in the nav) unless another page now uses its name
+            if superseded and os.path.basename(superseded) not in claimed_files:
+                await asyncio.to_thread(self.remove_page_file, superseded)
+            if work_queue is not None:
+                # The work queue's record_page is a blocking SQLite update
+                await asyncio.to_thread(journal.record_page, timestamp, page_index, url, file_name, content_sha)
+            else:
+                journal.record_page(timestamp, page_index, url, file_name, content_sha)
+            if page_queue is not None:
+                page_queue.put_nowait((page_index, file_name))
+        
+        async with self.make_browser_session() as browser, \
+                   httpx.AsyncClient(follow_redirects=True, timeout=30, limits=http_limits) as client:
+            async def worker():
+                while True:
+                    item = await next_page()
+                    if item is None:
+                        return
+                    page_index, url = item
                     
-                    for url in batch:
-                        try:
-                            print(f"Crawling: {url}")
-                            result = await crawler.arun(
-                                url=url,
-                                extraction_strategy=structure_strategy
-                            )
-                            
-                            if result.success:
-                                # Save as individual file (put raw markdown into `unprocessed`), prefixed with its index
-                                page_name = url.rstrip('/').split('/')[-1] or 'index'
-                                file_name = f"{page_index}_{page_name}_{timestamp}.md"
-                                file_path = os.path.join(unprocessed_dir, file_name)
-                                
-                                with open(file_path, "w", encoding="utf-8") as f:
-                                    f.write(f"# {page_index}_{page_name}\n\n")
-                                    f.write(f"Source: {url}\n\n")
-                                    # Handle both string and MarkdownGenerationResult object
-                                    if isinstance(result.markdown, str):
-                                        content = result.markdown
-                                    else:
-                                        content = result.markdown.raw_markdown if result.markdown else ""
-                                    f.write(content)
-                                
-                                # Add to combined file
-                                combined_file.write(f"\n\n# {page_index}_{page_name}\n\n")
-                                combined_file.write(f"Source: {url}\n\n")
-                                # Handle both string and MarkdownGenerationResult object
-                                if isinstance(result.markdown, str):
-                                    content = result.markdown
-                                else:
-                                    content = result.markdown.raw_markdown if result.markdown else ""
-                                combined_file.write(content)
-                                combined_file.write("\n\n---\n\n")
-                                
-                                success += 1
-                                print(f"Successfully saved: {file_name}")
+                    page_name = url.rstrip('/').split('/')[-1] or 'index'
+                    content = None
+                    error = None
+                    status_code = None
+                    # A retried page keeps its telemetry so attempts add up
+                    telemetry = reports.setdefault(page_index, {
+                        "page_index": page_index, "url": url, "status": "failed",
+                        "via": None, "attempts": 0, "retries": 0, "timings_ms": {}, "bytes": {}})
+                    telemetry["retries"] = retry_round
+                    telemetry.pop("error", None)
+                    await limiter.acquire()
+                    try:
+                        await bucket.acquire()
+                        page_started = time.monotonic()
+                        
+                        # The page's previous output, if still on disk. It can only
+                        # be reused as is when written for the same navbar
+                        # position; otherwise it is superseded by the new file.
+                        entry = state.get(url) if state else None
+                        previous_file = (entry or {}).get("file") or stable_files.get(url)
+                        previous_path = None
+                        if previous_file and os.path.exists(os.path.join(unprocessed_dir, previous_file)):
+                            previous_path = os.path.join(unprocessed_dir, previous_file)
+                        reusable = bool(previous_path and entry and self.reusable_file(page_index, url, previous_file))
+                        
+                        static_html = None
+                        fields = {}
+                        if state is not None or self.fetch_mode == "http":
+                            telemetry["attempts"] += 1
+                            request_started = time.monotonic()
+                            try:
+                                unchanged, fields, response = await self.conditional_get(
+                                    client, url, entry if reusable else None)
+                                status_code = telemetry["http_status"] = response.status_code
+                                await limiter.record(
+                                    time.monotonic() - request_started, status_code,
+                                    retry_after=retry_after_seconds(response.headers.get("retry-after")))
+                            except httpx.HTTPError as e:
+                                print(f"HTTP request failed for {url}: {e}")
+                                unchanged, fields, response = False, {}, None
+                                await limiter.record(time.monotonic() - request_started,
+                                                     timed_out=isinstance(e, httpx.TimeoutException))
+                            telemetry["timings_ms"]["navigation"] = elapsed_ms(request_started)
+                            if response is not None and is_retryable(status_code):
+                                # Throttled or erroring: rendering the page now would only add load
+                                raise RuntimeError(f"HTTP {status_code}")
+                            if state is not None:
+                                if unchanged and reusable:
+                                    state.update(url, **fields)
+                                    content = await asyncio.to_thread(self.read_page_file, previous_path)
+                                    state.record_visit(url, changed=False)
+                                    counts["unchanged"] += 1
+                                    print(f"Unchanged, skipped rendering: {url}")
+                                    await page_ready(page_index, url, entry["file"], sha256_text(content))
+                                    telemetry.update(status="unchanged", via="http")
+                                    telemetry["timings_ms"]["total"] = elapsed_ms(page_started)
+                                    outcomes[page_index] = (url, page_name, content, error)
+                                    continue
+                            if self.fetch_mode == "http" and response is not None and response.status_code == 200:
+                                static_html = response.text
+                        
+                        print(f"Crawling [{page_index}/{len(urls)}]: {url}")
+                        fetch_started = time.monotonic()
+                        result = await self.fetch_page(url, browser, run_config, html=static_html, telemetry=telemetry)
+                        if result.via == "browser":
+                            status_code = result.status_code or (200 if result.success else None)
+                            telemetry["browser_status"] = status_code
+                            await limiter.record(
+                                time.monotonic() - fetch_started, status_code,
+                                timed_out="timeout" in (result.error_message or "").lower())
+                        
+                        if result.success:
+                            counts[result.via] += 1
+                            await self.record_fixture(url, result.html)
+                            if self.expand:
+                                expand_from(result.html, url)
+                            content = result.markdown
+                            telemetry.update(status="unchanged", via=result.via)
+                            telemetry["bytes"]["html"] = len(result.html.encode("utf-8"))
+                            telemetry["bytes"]["markdown"] = len(content.encode("utf-8"))
+                            content_sha = sha256_text(content)
+                            # Save as individual file (put raw markdown into `unprocessed`), prefixed with its index
+                            file_name = self.page_file_name(page_index, url, timestamp)
+                            file_path = os.path.join(unprocessed_dir, file_name)
+                            keep_previous = reusable and entry.get("sha256") == content_sha
+                            if keep_previous:
+                                file_name = entry["file"]
+                            superseded = previous_path if previous_path and previous_path != file_path else None
+                            state_fields = None
+                            if state is not None:
+                                state_fields = dict(fields, page_index=page_index, file=file_name, sha256=content_sha,
+                                                    sections=markdown_sections(content))
+                            if keep_previous:
+                                # Rendered content is identical: keep the existing file untouched
+                                counts["unchanged"] += 1
+                                print(f"Unchanged content, kept: {file_name}")
+                                await page_ready(page_index, url, file_name, content_sha, state_fields=state_fields)
+                            elif self.naming == "stable" and await asyncio.to_thread(
+                                    lambda: os.path.exists(file_path) and self.read_hash_sidecar(file_path) == content_sha):
+                                counts["unchanged"] += 1
+                                print(f"Unchanged content, kept: {file_name}")
+                                await page_ready(page_index, url, file_name, content_sha, superseded,
+                                                 state_fields=state_fields)
                             else:
-                                print(f"Failed to crawl {url}: {result.error_message}")
-                                failed_file.write(f"{url}: {result.error_message}\n")
-                                failed += 1
-                                
-                        except Exception as e:
-                            print(f"Error processing {url}: {str(e)}")
-                            failed_file.write(f"{url}: {str(e)}\n")
-                            failed += 1
-                        finally:
-                            # Increment the page index regardless of success so numbering matches the
-                            # order of the original URL list.
-                            page_index += 1
+                                # The header names the file, so a stable file does not change with the nav position
+                                page_text = self.page_text(os.path.splitext(file_name)[0] if self.naming == "stable"
+                                                           else f"{page_index}_{page_name}", url, content)
+                                files = [(file_path, page_text)]
+                                if self.naming == "stable":
+                                    files.append((self.hash_sidecar_path(file_path),
+                                                  self.hash_sidecar_text(file_path, content_sha)))
+                                if result.structure is not None:
+                                    # Lets the processor split sections by the page's real headings
+                                    structure = dict(result.structure, source=url)
+                                    files.append((self.structure_sidecar_path(file_path),
+                                                  json.dumps(structure, indent=2, ensure_ascii=False)))
+                                telemetry["bytes"]["file"] = len(page_text.encode("utf-8"))
+                                telemetry["status"] = "saved"
+                                counts["success"] += 1
+                                last_path = os.path.join(unprocessed_dir, last_run_files.get(url, file_name))
+                                # Reads the previous file when the crawl state lacks its sections
+                                changes[page_index] = await asyncio.to_thread(
+                                    self.page_changes, page_index, url, file_name, content, entry,
+                                    previous_path or (last_path if os.path.exists(last_path) else None))
+                                # The page is journaled and queued once the writer has it on disk
+                                writer.submit(files, partial(page_ready, page_index, url, file_name, content_sha,
+                                                             superseded, telemetry, state_fields=state_fields))
+                            if state is not None:
+                                state.record_visit(url, changed=telemetry["status"] == "saved")
+                        else:
+                            error = result.error_message
+                            print(f"Failed to crawl {url}: {error}")
+                        telemetry["timings_ms"]["total"] = elapsed_ms(page_started)
+                            
+                    except Exception as e:
+                        content = None
+                        error = str(e)
+                        print(f"Error processing {url}: {error}")
+                    finally:
+                        await limiter.release()
+                        await page_done()
                     
-                    # Rate limiting between batches
-                    await asyncio.sleep(2)
+                    if content is None and state is not None:
+                        # Forget the validators so the next run fetches and renders the page again
+                        state.update(url, etag=None, last_modified=None, html_sha256=None)
+                    if content is None and retry_round < self.max_retries and is_retryable(status_code):
+                        telemetry["error"] = error
+                        retry_pages.append((page_index, url))
+                        continue
+                    if content is None:
+                        counts["failed"] += 1
+                        if work_queue is not None:
+                            await asyncio.to_thread(work_queue.fail, page_index, error)
+                        telemetry["status"] = "failed"
+                        telemetry["error"] = error
+                    outcomes[page_index] = (url, page_name, content, error)
+            
+            journal.start(timestamp, urls, resume=resume_run is not None)
+            for page in deferred_ready:
+                await page_ready(*page)
+            try:
+                async with writer:
+                    await asyncio.gather(*(worker() for _ in range(workers)))
+                    while retry_pages:
+                        retry_round += 1
+                        delay = min(self.retry_backoff * 2 ** (retry_round - 1), limiter.max_backoff)
+                        print(f"Retrying {len(retry_pages)} failed pages in {delay:.1f}s "
+                              f"(round {retry_round}/{self.max_retries})")
+                        await asyncio.sleep(delay)
+                        counts["retried"] += len(retry_pages)
+                        for item in sorted(retry_pages):
+                            queue.put_nowait(item)
+                        retry_pages.clear()
+                        await asyncio.gather(*(worker() for _ in range(workers)))
+                    # Pages whose write failed are left out of the combined output and change report
+                    await writer.drain()
+                    for page_index, error in write_failures.items():
+                        url, page_name = outcomes[page_index][:2]
+                        outcomes[page_index] = (url, page_name, None, error)
+                        changes.pop(page_index, None)
+                    if work_queue is None:
+                        # Combined output is assembled once, in page order, from the per-page results
+                        combined_text, failed_text = self.combined_text(outcomes)
+                        writer.submit([(combined_path, combined_text), (failed_path, failed_text)])
+                        if self.naming == "stable":
+                            writer.submit([(self.page_order_path(unprocessed_dir),
+                                            self.page_order_text(urls))])
+                    if changes:
+                        report = {"run_id": timestamp, "pages": [changes[i] for i in sorted(changes)]}
+                        writer.submit([(changes_path, json.dumps(report, indent=2, ensure_ascii=False))])
+                journal.complete(timestamp)
+            finally:
+                journal.close()
+                if state is not None and work_queue is not None:
+                    state.save_updates(f"{state.path}.w{worker_id}")
+                elif state is not None:
+                    state.save()
+        
+        elapsed = time.monotonic() - started
+        rate = (len(urls) if work_queue is None else len(reports)) / elapsed if elapsed > 0 else 0.0
+        self.write_report(report_path, timestamp, elapsed, workers, counts, [reports[i] for i in sorted(reports)],
+                          limiter=limiter, browser_launches=browser.launches)
         
         print(f"\nCrawling completed:")
-        print(f"- Successfully crawled: {success} pages")
-        print(f"- Failed: {failed} pages")
+        print(f"- Successfully crawled: {counts['success']} pages")
+        if self.incremental or self.naming == "stable":
+            print(f"- Unchanged (skipped/kept): {counts['unchanged']} pages")
+        if resume_run:
+            print(f"- Resumed from journal: {counts['resumed']} pages")
+        if self.budget:
+            print(f"- Deferred by the recrawl budget: {counts['deferred']} pages")
+        print(f"- Failed: {counts['failed']} pages (retried: {counts['retried']})")
+        print(f"- Concurrency limit: {limiter.limit} at the end, peak {limiter.peak_limit}, {limiter.backoffs} backoffs")
+        print(f"- Fetched via HTTP: {counts['http']}, via browser: {counts['browser']}")
+        print(f"- Elapsed: {elapsed:.1f}s ({rate:.2f} pages/s, concurrency={workers}, rate limit={self.rate_limit or 'none'})")
         print(f"\nOutputs saved to:")
+        if work_queue is None:
+            print(f"- Combined content: {combined_path}")
+            print(f"- Failed URLs: {failed_path}")
+        print(f"- Crawl report: {report_path}")
+        if changes:
+            print(f"- Section changes of {len(changes)} pages: {changes_path}")
+        print(f"- Individual pages (unprocessed): {unprocessed_dir}/*.md")
+        if self.incremental:
+            print(f"- Crawl state: {state.path}")
+
+    def worker_argv(self, queue_path: str, worker_id: int) -> List[str]:
+        """Command line of one worker process of a sharded crawl."""
+        argv = [
+            sys.executable, os.path.abspath(__file__),
+            "--worker", queue_path, "--worker-id", str(worker_id),
+            "--output-dir", self.output_dir,
+            "--concurrency", str(self.concurrency),
+            # The shards share the site: split the rate limit between them
+            "--rate-limit", str((self.rate_limit or 0) / self.shards),
+            "--fetch-mode", self.fetch_mode,
+            "--naming", self.naming,
+            "--profile", self.profile,
+            "--target-latency", str(self.target_latency),
+            "--max-retries", str(self.max_retries),
+            "--retry-backoff", str(self.retry_backoff),
+        ]
+        if self.burst is not None:
+            argv += ["--burst", str(self.burst)]
+        if self.max_concurrency is not None:
+            argv += ["--max-concurrency", str(self.max_concurrency)]
+        if self.recycle_after is not None:
+            argv += ["--recycle-after", str(self.recycle_after)]
+        if self.record_dir:
+            argv += ["--record", self.record_dir]
+        if self.incremental:
+            argv.append("--incremental")
+        return argv
+
+    async def crawl_sharded(self, urls: List[str], page_queue: Optional[asyncio.Queue] = None):
+        """Crawl `urls` with `self.shards` worker processes sharing a SQLite work queue.
+
+        Each worker (`--worker`) runs crawl_docs with its own browser and
+        claims pages from the queue until it is drained. Pages claimed by a
+        worker that exited abnormally are re-queued for one more round. The
+        combined/failed outputs are then rebuilt in navbar order from the
+        queue's results, and the workers' crawl state updates are merged.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        unprocessed_dir = os.path.join(self.output_dir, "unprocessed")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        queue_path = os.path.join(self.output_dir, f"work_queue_{timestamp}.sqlite3")
+        work_queue = WorkQueue(queue_path)
+        work_queue.create(timestamp, self.base_url, urls)
+        shards = max(1, min(self.shards, len(urls)))
+        print(f"Starting sharded crawl: {len(urls)} pages, {shards} worker processes, queue {queue_path}")
+        started = time.monotonic()
+        
+        for attempt in range(2):
+            processes = [await asyncio.create_subprocess_exec(*self.worker_argv(queue_path, worker_id))
+                         for worker_id in range(1, shards + 1)]
+            codes = await asyncio.gather(*(process.wait() for process in processes))
+            if all(code == 0 for code in codes):
+                break
+            requeued = work_queue.requeue_claimed()
+            print(f"Worker exit codes {codes}; re-queued {requeued} unfinished pages")
+            if not requeued:
+                break
+        
+        outcomes: Dict[int, tuple] = {}
+        counts = {"done": 0, "failed": 0}
+        for row in work_queue.results():
+            page_name = row["url"].rstrip('/').split('/')[-1] or 'index'
+            path = os.path.join(unprocessed_dir, row["file"]) if row["file"] else None
+            if row["status"] == "done" and path and os.path.exists(path):
+                outcomes[row["page_index"]] = (row["url"], page_name, self.read_page_file(path), None)
+                counts["done"] += 1
+                if page_queue is not None:
+                    page_queue.put_nowait((row["page_index"], row["file"]))
+            else:
+                outcomes[row["page_index"]] = (row["url"], page_name, None, row["error"] or f"not crawled ({row['status']})")
+                counts["failed"] += 1
+        
+        combined_path = f"{self.output_dir}/all_docs_{timestamp}.md"
+        failed_path = f"{self.output_dir}/failed_urls_{timestamp}.txt"
+        combined_text, failed_text = self.combined_text(outcomes)
+        with open(combined_path, "w", encoding="utf-8") as f:
+            f.write(combined_text)
+        with open(failed_path, "w", encoding="utf-8") as f:
+            f.write(failed_text)
+        if self.naming == "stable":
+            with open(self.page_order_path(unprocessed_dir), "w", encoding="utf-8") as f:
+                f.write(self.page_order_text(urls))
+        if self.incremental:
+            state = CrawlState(os.path.join(self.output_dir, "crawl_state.json"))
+            for worker_id in range(1, shards + 1):
+                if os.path.exists(f"{state.path}.w{worker_id}"):
+                    state.merge(f"{state.path}.w{worker_id}")
+            state.save()
+        
+        elapsed = time.monotonic() - started
+        rate = len(urls) / elapsed if elapsed > 0 else 0.0
+        print(f"\nSharded crawl completed:")
+        print(f"- Pages done: {counts['done']}, failed: {counts['failed']}")
+        print(f"- Elapsed: {elapsed:.1f}s ({rate:.2f} pages/s, {shards} worker processes)")
         print(f"- Combined content: {combined_path}")
         print(f"- Failed URLs: {failed_path}")
-        print(f"- Individual pages (unprocessed): {unprocessed_dir}/*.md")
+        print(f"- Work queue: {queue_path}")
+
+    async def run_worker(self, queue_path: str, worker_id: int):
+        """Worker process entry point of a sharded crawl (see crawl_sharded)."""
+        work_queue = WorkQueue(queue_path)
+        # Replay runs hand out URLs of the coordinator's fixture server
+        self.base_url = work_queue.meta()["base_url"]
+        await self.crawl_docs(work_queue.urls(), work_queue=work_queue, worker_id=worker_id)
+
+    async def run(self, page_queue: Optional[asyncio.Queue] = None):
+        """Main execution method
 
-    async def run(self):
-        """Main execution method"""
+        page_queue: optional queue receiving `(page_index, file_name)` for
+            every page as soon as it is saved (see crawl_docs)
+        """
+        if self.replay_dir:
+            with FixtureServer(self.replay_dir) as server:
+                self.base_url = server.origin + urlparse(DEFAULT_BASE_URL).path
+                print(f"Replaying fixtures from {self.replay_dir} at {self.base_url}")
+                try:
+                    await self._run(page_queue)
+                finally:
+                    self.base_url = DEFAULT_BASE_URL
+        else:
+            await self._run(page_queue)
+
+    async def _run(self, page_queue: Optional[asyncio.Queue]):
         print("Starting PineScript documentation crawler...")
-        urls = await self.get_all_doc_urls()
+        resume_run = CrawlJournal(self.journal_path).last_incomplete_run() if self.resume else None
+        if resume_run:
+            # The interrupted run already fixed the URL list and its numbering
+            print(f"Found unfinished crawl {resume_run['run_id']} in {self.journal_path}")
+            urls = resume_run["urls"]
+        else:
+            if self.resume:
+                print("No unfinished crawl to resume, starting a new one")
+            urls = await self.get_all_doc_urls()
         if not urls:
             print("No documentation pages found!")
             return
             
         print(f"\nFound {len(urls)} documentation pages")
-        await self.crawl_docs(urls)
+        if self.shards > 1 and not resume_run:
+            await self.crawl_sharded(urls, page_queue=page_queue)
+        else:
+            await self.crawl_docs(urls, resume_run=resume_run, page_queue=page_queue)
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Crawl the Pine Script documentation")
+    add_crawler_arguments(parser)
+    # Internal: started by a sharded crawl for each of its worker processes
+    parser.add_argument("--worker", default=None, metavar="QUEUE", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", type=int, default=1, help=argparse.SUPPRESS)
+    return parser
+
+
+def add_crawler_arguments(parser: argparse.ArgumentParser):
+    """Register crawler tuning flags (shared with 3_scrap_and_process.py)."""
+    parser.add_argument("--concurrency", type=int, default=4, help="Page fetches in flight at the start (default: 4)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Grow page fetches in flight up to this while responses stay healthy (default: --concurrency)")
+    parser.add_argument("--target-latency", type=float, default=5.0,
+                        help="Seconds a response may take and still count as healthy (default: 5.0)")
+    parser.add_argument("--max-retries", type=int, default=2,
+                        help="End-of-run retry rounds for pages that hit timeouts, 429s or 5xx (default: 2)")
+    parser.add_argument("--retry-backoff", type=float, default=2.0,
+                        help="Seconds before the first retry round, doubled each round (default: 2.0)")
+    parser.add_argument("--rate-limit", type=float, default=2.0, help="Max pages/second started, 0 disables (default: 2.0)")
+    parser.add_argument("--burst", type=float, default=None, help="Token bucket capacity (default: max(1, rate limit))")
+    parser.add_argument("--fetch-mode", choices=FETCH_MODES, default="browser",
+                        help="'http' converts static HTML without a browser, falling back to it when needed (default: browser)")
+    parser.add_argument("--profile", choices=BROWSER_PROFILES, default="full",
+                        help="'light' blocks images/media/fonts and third-party hosts and recycles the browser (default: full)")
+    parser.add_argument("--recycle-after", type=int, default=None,
+                        help=f"Relaunch the browser after this many pages, 0 never (default: {LIGHT_RECYCLE_AFTER} with --profile light, else 0)")
+    parser.add_argument("--naming", choices=NAMING_MODES, default="timestamp",
+                        help="'stable' names pages {index}_{name}.md with a .sha256 sidecar so unchanged pages keep their file (default: timestamp)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last unfinished crawl from pinescript_docs/crawl_journal.jsonl")
+    parser.add_argument("--record", dest="record_dir", default=None,
+                        help="Save the HTML of every fetched page into this fixtures directory")
+    parser.add_argument("--replay", dest="replay_dir", default=None,
+                        help="Crawl a recorded fixtures directory served on a local port instead of tradingview.com")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory for crawl output (default: pinescript_docs next to the script)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip pages unchanged since the last crawl (uses pinescript_docs/crawl_state.json)")
+    parser.add_argument("--discovery-ttl", type=float, default=0,
+                        help="Seconds to reuse nav URLs from pinescript_docs/discovery_cache.json, 0 disables "
+                             "(default: 0; ignored with --record/--replay)")
+    parser.add_argument("--expand", action="store_true",
+                        help="Also crawl in-scope links found on crawled pages that the nav misses")
+    parser.add_argument("--budget", type=int, default=None,
+                        help="With --incremental, crawl at most N pages per run, the most likely to have changed first")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Worker processes, each with its own browser, sharing a SQLite work queue (default: 1)")
+
+
+def crawler_kwargs_from_args(args: argparse.Namespace) -> dict:
+    """Map parsed crawler flags onto PineScriptDocsCrawler keyword arguments."""
+    return {
+        "concurrency": args.concurrency,
+        "rate_limit": args.rate_limit,
+        "burst": args.burst,
+        "incremental": args.incremental,
+        "fetch_mode": args.fetch_mode,
+        "resume": args.resume,
+        "naming": args.naming,
+        "record_dir": args.record_dir,
+        "replay_dir": args.replay_dir,
+        "output_dir": args.output_dir,
+        "max_concurrency": args.max_concurrency,
+        "target_latency": args.target_latency,
+        "max_retries": args.max_retries,
+        "retry_backoff": args.retry_backoff,
+        "profile": args.profile,
+        "recycle_after": args.recycle_after,
+        "shards": args.shards,
+        "discovery_ttl": args.discovery_ttl,
+        "expand": args.expand,
+        "budget": args.budget,
+    }
+
 
-async def main():
-    crawler = PineScriptDocsCrawler()
-    await crawler.run()
+async def main(argv: Optional[List[str]] = None):
+    args = build_arg_parser().parse_args(argv)
+    crawler = PineScriptDocsCrawler(**crawler_kwargs_from_args(args))
+    if args.worker:
+        await crawler.run_worker(args.worker, args.worker_id)
+    else:
+        await crawler.run()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -1,89 +1,242 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
 import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 
+
+def _source_version():
+    """Hash of this file, so any change to the processing code forces a rebuild"""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# Part of every manifest key, see PineScriptDocsProcessor.is_unchanged
+PROCESSOR_VERSION = _source_version()
+
+# "Previous   Next To <page>" pager lines left over from the site navigation
+DIET_PAGER = re.compile(r'^\s*Previous\s+Next\b')
+
+# Namespaces of Pine Script built-ins (functions, variables and constants)
+PINE_NAMESPACES = (
+    "adjustment", "alert", "array", "backadjustment", "barmerge", "barstate", "box", "chart", "color",
+    "currency", "dayofweek", "display", "dividends", "earnings", "extend", "font", "format", "hline",
+    "input", "label", "line", "linefill", "location", "log", "map", "math", "matrix", "order", "plot",
+    "polyline", "position", "request", "runtime", "scale", "session", "settlement_as_close", "shape",
+    "size", "splits", "str", "strategy", "syminfo", "table", "text", "ticker", "timeframe", "ta",
+    "xloc", "yloc",
+)
+
+# A namespaced identifier such as `ta.sma` or `strategy.commission.percent`,
+# not part of a longer dotted name, URL fragment or word
+PINE_IDENTIFIER = re.compile(r'(?<![\w.])(?:%s)(?:\.[A-Za-z_]\w*)+' % "|".join(PINE_NAMESPACES))
+
+# server.utils.count_tokens once it is known to work, False if it doesn't
+_tiktoken_count = None
+
+# token_model of chunk records whose token counts are estimates
+TOKEN_ESTIMATE = "chars/4"
+
+
+def tiktoken_available():
+    """Whether tokens can be counted with the RAG server's tokenizer (checked once)"""
+    global _tiktoken_count
+    if _tiktoken_count is None:
+        try:
+            from server.utils import count_tokens as tiktoken_count
+            tiktoken_count("")  # loads the encoding, which may need a download
+            _tiktoken_count = tiktoken_count
+        except Exception as e:
+            print(f"Estimating tokens as characters / 4 (tiktoken unavailable: {e})")
+            _tiktoken_count = False
+    return bool(_tiktoken_count)
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Tokens in `text` as the RAG server counts them (tiktoken), or about len/4 without it"""
+    if tiktoken_available():
+        return _tiktoken_count(text, model=model)
+    return (len(text) + 3) // 4
+
+
+def ingest_chunk_settings():
+    """`(chunk_token_threshold, embedding_model)` as server/ingest.py uses them.
+
+    They come from the RAG server's config (environment and .env included).
+    If it can't load, e.g. without API keys, its declared defaults are used.
+    """
+    from server.config import Config
+    try:
+        config = Config()
+    except Exception:
+        fields = Config.model_fields
+        return fields['chunk_token_threshold'].default, fields['embedding_model'].default
+    return config.chunk_token_threshold, config.embedding_model
+
+
 class PineScriptDocsProcessor:
-    def __init__(self, input_dir, output_dir):
+    def __init__(self, input_dir, output_dir, jobs=1, force=False, combined=True, dedupe=False, token_diet=False,
+                 chunks=False, chunk_tokens=None, embedding_model=None, symbols=False):
         self.input_dir = input_dir
+        # Worker processes used by process_all; 0 means one per CPU
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        # (input file, seconds) for each file of the last process_all, in order
+        self.timings = []
         # Place the processed output as a sibling `processed` folder next to
         # the `input_dir` (which will be the new `unprocessed` folder).
         base_dir = os.path.dirname(input_dir)
         self.output_dir = os.path.join(base_dir, "processed")
         os.makedirs(self.output_dir, exist_ok=True)
+        # The combined processed file of the default docs lives in the script's
+        # directory (not inside the processed folder); any other input dir gets
+        # its own, next to its `processed` folder
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        if os.path.abspath(input_dir) == os.path.join(script_dir, "pinescript_docs", "unprocessed"):
+            combined_dir = script_dir
+        else:
+            combined_dir = base_dir
+        self.combined_path = os.path.join(combined_dir, 'processed_all_docs.md')
+        # Set to False when only the per-file outputs are needed (e.g. by ingest)
+        self.combined = combined
+        # Input hash, processor version and output of every processed file;
+        # process_all skips inputs that match it unless `force` is set
+        self.manifest_path = os.path.join(base_dir, 'processing_manifest.json')
+        self.force = force
+        # Store each code block / function doc once, see reference_duplicates
+        self.dedupe = dedupe
+        # Strip or compact boilerplate in the output, see apply_token_diet
+        self.token_diet = token_diet
+        # (input file, tokens without dedupe / token diet, tokens written) of the last process_all
+        self.token_savings = []
+        # Pre-chunked JSONL for server/ingest.py, see chunk_records. Files over
+        # chunk_tokens (counted for embedding_model) get one chunk per section,
+        # like ingest's chunk_document. Both default to the server config's
+        # chunk_token_threshold and embedding_model
+        self.chunks = chunks
+        if chunks and (chunk_tokens is None or embedding_model is None):
+            ingest_tokens, ingest_model = ingest_chunk_settings()
+            chunk_tokens = ingest_tokens if chunk_tokens is None else chunk_tokens
+            embedding_model = ingest_model if embedding_model is None else embedding_model
+        self.chunk_tokens = chunk_tokens
+        self.embedding_model = embedding_model
+        self.chunks_path = os.path.join(self.output_dir, 'processed_chunks.jsonl')
+        # Inverted index of namespaced Pine identifiers, see write_symbol_index
+        self.symbols = symbols
+        self.symbols_path = os.path.join(self.output_dir, 'symbol_index.json')
         
-    def clean_navigation(self, text):
-        """Remove navigation elements and links"""
-        # Remove navigation sections
-        text = re.sub(r'Version Version.*?Auto', '', text, flags=re.DOTALL)
-        text = re.sub(r'\* \[.*?\n', '', text)
-        text = re.sub(r'Copyright © .*?TradingView.*?\n', '', text)
-        text = re.sub(r'On this page.*?\n', '', text)
-        return text
-        
-    def extract_code_blocks(self, text):
-        """Preserve and clean code blocks"""
-        # Find Pine Script code blocks
-        code_blocks = re.findall(r'```(?:pine)?(.*?)```', text, re.DOTALL)
-        clean_blocks = []
-        for block in code_blocks:
-            # Clean the code block
-            clean_block = block.strip()
-            if clean_block:
-                clean_blocks.append(f"```pine\n{clean_block}\n```")
-        return clean_blocks
-        
-    def extract_function_docs(self, text):
-        """Extract function documentation"""
-        # Find function descriptions
-        functions = re.findall(r'@function.*?@returns.*?\n', text, re.DOTALL)
-        return functions
-
-    def remove_markdown_links(self, text):
-        """Replace inline markdown links like [text](url) with just the display text.
-
-        This preserves any leading/trailing spaces inside the [brackets], so
-        cases such as "### [ Intrabars](...)" become "###  Intrabars" (note
-        the intentional double spacing when the bracketed text starts with a
-        space). It replaces any occurrence of [display](...) with display.
-        """
-        # Replace any [display](url) with the captured display text.
-        # Using a non-greedy match for the parentheses content.
-        return re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", text)
-        
-    def process_file(self, filename):
-        """Process a single documentation file"""
-        with open(os.path.join(self.input_dir, filename), 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Clean navigation and basic structure
-        content = self.clean_navigation(content)
-        
-        # Remove inline markdown links so only their display text remains
-        content = self.remove_markdown_links(content)
-        
-        # Extract valuable parts
-        code_blocks = self.extract_code_blocks(content)
-        function_docs = self.extract_function_docs(content)
-        
-        # Extract main content sections. Accept headings like:
-        #   ## [Title]\n...
-        #   ## Title\n...
-        # Capture either the bracketed title (group 1) or the plain title (group 2)
-        sections_raw = re.findall(r"##\s+(?:\[(.*?)\]|([^\n]+))\s*\n(.*?)(?=^##\s+|\Z)", content, re.DOTALL | re.MULTILINE)
+    def load_structure(self, filename):
+        """Return the crawler's `{stem}.structure.json` sidecar for an input file, or None"""
+        path = os.path.join(self.input_dir, f"{os.path.splitext(filename)[0]}.structure.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def heading_key(text):
+        """Heading text as compared with the sidecar: no code/emphasis markers, zero-width spaces or extra whitespace"""
+        return " ".join(re.sub(r"[`*_\u200b]", "", text).split())
+
+    def split_known_sections(self, content, structure):
+        r"""Split content at `## ` lines whose title is a known H2 of the page.
+
+        `structure` is the crawler's sidecar; only its level-2 headings start
+        a section, like scan_sections which never ends a section at `###`.
+        Titles are compared by heading_key, since the HTML headings lose the
+        markdown's formatting (e.g. "`for` loops"). Text before the first
+        known heading is dropped, as scan_sections does. Returns a list of
+        `(title, body)`, empty when no known heading is found or when any
+        `## ` line matches none, so the caller falls back to scan_sections
+        instead of merging that section into the one before it.
+        """
+        known = {self.heading_key(h["text"]) for h in structure.get("headings", []) if h.get("level") == 2}
         sections = []
-        for g1, g2, body in sections_raw:
-            title = (g1 or g2 or '').strip()
-            sections.append((title, body))
-        
+        title = None
+        body = []
+        for line in content.splitlines(keepends=True):
+            if line.startswith("## "):
+                heading = line[3:].strip()
+                if heading.startswith("[") and "]" in heading:
+                    heading = heading[1:heading.index("]")].strip()
+                if self.heading_key(heading) not in known:
+                    return []
+                if title is not None:
+                    sections.append((title, "".join(body)))
+                title = heading
+                body = []
+                continue
+            if title is not None:
+                body.append(line)
+        if title is not None:
+            sections.append((title, "".join(body)))
+        return sections
+
+    def process_text(self, content, filename, structure=None, dedupe=None, token_diet=None):
+        """Turn one raw page into processed markdown, or None if nothing useful is left.
+
+        See process_parts for the arguments.
+        """
+        parts = self.process_parts(content, filename, structure, dedupe, token_diet)
+        return self.join_parts(parts, self.token_diet if token_diet is None else token_diet)
+
+    def join_parts(self, parts, token_diet=False):
+        """The processed page made of process_parts' parts, or None without any"""
+        if not parts:
+            return None
+        processed = "\n\n".join(text for _, text in parts)
+        return self.apply_token_diet(processed) if token_diet else processed
+
+    def process_parts(self, content, filename, structure=None, dedupe=None, token_diet=None):
+        """The `(heading, text)` parts of a processed page, see assemble_parts.
+
+        `dedupe` and `token_diet` default to the processor's settings; without
+        them the output is exactly that of the original cascade of regex
+        passes (kept in scripts/bench_processor.py). The page goes through a
+        few linear passes: one over the lines for the navigation cleanup,
+        then str.find scans for the links, the code blocks and function
+        docs, the sections and the footnotes and URLs of each section.
+        """
+        content = self.strip_markdown_links(self.clean_navigation_lines(content))
+        code_blocks, function_docs = self.scan_code_and_function_docs(content)
+        sections = self.split_known_sections(content, structure) if structure else []
+        if not sections:
+            sections = self.scan_sections(content)
+        token_diet = self.token_diet if token_diet is None else token_diet
+        if token_diet:
+            # Drop the nav bullet left in titles like "## * Introduction" here,
+            # so dedupe references name the heading as written
+            sections = [(title[2:] if title.startswith("* ") else title, body) for title, body in sections]
+        return self.assemble_parts(
+            content, filename, sections, code_blocks, function_docs,
+            lambda text: self.strip_delimited(text, "[^", "]"),
+            lambda text: self.strip_delimited(text, "(https://", ")"),
+            self.dedupe if dedupe is None else dedupe,
+        )
+
+    def assemble_parts(self, content, filename, sections, code_blocks, function_docs, remove_footnotes, remove_links, dedupe=False):
+        """`(heading, text)` parts of the processed page, joined by blank lines into the page.
+
+        A part is a section written, or the code examples / function
+        documentation appendix with its blocks.
+        """
         # Build processed content
         processed = []
+        # (title, text) of the sections written, for dedupe
+        kept = []
         
         if sections:
             for title, section in sections:
                 if any(keyword in section.lower() for keyword in ['pine', 'script', 'function', 'indicator', 'value', 'parameter']):
-                    clean_section = re.sub(r'\[\^.*?\]', '', section)  # Remove footnotes
-                    clean_section = re.sub(r'\(https://.*?\)', '', clean_section)  # Remove links
+                    clean_section = remove_footnotes(section)
+                    clean_section = remove_links(clean_section)
                     processed.append(f"## {title}\n{clean_section.strip()}")
+                    kept.append((title, clean_section))
 
         # Fallback: if nothing useful was extracted but there are code blocks or
         # function docs, or the document contains Pine-related keywords, turn
@@ -93,76 +246,825 @@ class PineScriptDocsProcessor:
             has_keywords = any(k in content_lower for k in ['pine', 'script', 'function', 'indicator'])
             if code_blocks or function_docs or has_keywords:
                 fallback_title = os.path.splitext(filename)[0]
-                clean_content = re.sub(r'\[\^.*?\]', '', content)  # remove footnotes
+                clean_content = remove_footnotes(content)
                 processed.append(f"## {fallback_title}\n{clean_content.strip()}")
+                kept.append((fallback_title, clean_content))
+
+        if dedupe:
+            # Code is matched without the fence the extraction put around it
+            code_blocks = self.reference_duplicates(code_blocks, kept, lambda block: block[len("```pine\n"):-len("\n```")], "code block")
+            function_docs = self.reference_duplicates(
+                function_docs, kept + [("Code Examples", "\n".join(code_blocks))], str.strip, "function doc")
         
+        parts = [(title, text) for (title, _), text in zip(kept, processed)]
         if code_blocks:
-            processed.append("\n## Code Examples\n")
-            processed.extend(code_blocks)
+            parts.append(("Code Examples", "\n\n".join(["\n## Code Examples\n"] + code_blocks)))
             
         if function_docs:
-            processed.append("\n## Function Documentation\n")
-            processed.extend(function_docs)
+            parts.append(("Function Documentation", "\n\n".join(["\n## Function Documentation\n"] + function_docs)))
             
-        if not processed:
+        return parts
+
+    @staticmethod
+    def reference_duplicates(parts, sections, body, noun):
+        """Drop repeated parts and parts already in a written section.
+
+        Each part is kept once. Parts whose `body` appears in the text of a
+        section `(title, text)` are replaced by one line per section saying
+        how many of them it holds, so they are stored (and embedded) once.
+        """
+        unique = []
+        seen = set()
+        found = {}
+        for part in parts:
+            text = body(part)
+            if text in seen:
+                continue
+            seen.add(text)
+            title = next((title for title, section in sections if text in section), None)
+            if title is None:
+                unique.append(part)
+            else:
+                found[title] = found.get(title, 0) + 1
+        references = [f'- {count} {noun}{"s" if count > 1 else ""} in "## {title}"' for title, count in found.items()]
+        return (["\n".join(references)] if references else []) + unique
+
+    @staticmethod
+    def apply_token_diet(text):
+        """Strip or compact boilerplate that costs tokens without adding content.
+
+        - "Pine Script®\\nCopied\\n`code`" widgets become ```pine fences
+        - "!image" placeholders and "Previous ... Next" pager lines are dropped
+        - trailing whitespace (markdown hard breaks) is stripped
+        - runs of blank lines become one blank line, outside code fences
+        """
+        lines = []
+        in_fence = False
+        in_widget = False
+        blank = False
+        source = text.split("\n")
+        # No widget closes at or after this line (saves rescanning to the end)
+        unclosed_from = len(source)
+        number = 0
+        while number < len(source):
+            line = source[number].rstrip()
+            number += 1
+            if in_widget:
+                if line == "`":
+                    line, in_widget = "```", False
+                lines.append(line)
+                continue
+            if line == "Pine Script®" and number + 2 < unclosed_from and source[number].strip() == "Copied" \
+                    and source[number + 1].startswith("`") and not source[number + 1].rstrip().endswith("`"):
+                # The widget's code runs to a line holding only the closing backtick
+                closing = next((i for i in range(number + 2, len(source)) if source[i].rstrip() == "`"), None)
+                if closing is None:
+                    unclosed_from = number + 2
+                else:
+                    lines.append("```pine")
+                    source[number + 1] = source[number + 1][1:]
+                    number += 1
+                    in_widget = True
+                    blank = False
+                    continue
+            if line.startswith("```"):
+                in_fence = not in_fence
+            elif not in_fence:
+                if line == "!image" or DIET_PAGER.match(line):
+                    continue
+                if not line:
+                    if blank:
+                        continue
+                    blank = True
+                else:
+                    blank = False
+            lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def clean_navigation_lines(text):
+        """Remove navigation elements and links in one pass over the lines.
+
+        The "Version Version ... Auto" menu may span lines and is cut out
+        first. Each remaining rule drops a line from its marker through the
+        newline, which glues what precedes the marker to the next line, so
+        every rule keeps the pending prefix of the line it cut and the
+        following rules see the glued line, as when the rules run one after another.
+        """
+        pieces = []
+        pos = 0
+        while True:
+            start = text.find("Version Version", pos)
+            if start < 0:
+                break
+            end = text.find("Auto", start + 15)
+            if end < 0:
+                break
+            pieces.append(text[pos:start])
+            pos = end + 4
+        pieces.append(text[pos:])
+        lines = "".join(pieces).split("\n")
+
+        out = []
+        bullet = copyright = on_this_page = ""
+        last = len(lines) - 1
+        for number, line in enumerate(lines):
+            if number < last:
+                line += "\n"
+                # "* [" to the end of the line
+                cut = line.find("* [")
+                if cut >= 0:
+                    bullet += line[:cut]
+                    continue
+            line, bullet = bullet + line, ""
+            if line.endswith("\n"):
+                # "Copyright © " to the end of a line that mentions TradingView after it
+                cut = line.find("Copyright © ")
+                if cut >= 0 and line.find("TradingView", cut + 12) >= 0:
+                    copyright += line[:cut]
+                    continue
+            line, copyright = copyright + line, ""
+            if line.endswith("\n"):
+                # "On this page" to the end of the line
+                cut = line.find("On this page")
+                if cut >= 0:
+                    on_this_page += line[:cut]
+                    continue
+            out.append(on_this_page + line)
+            on_this_page = ""
+        out.append(on_this_page + copyright + bullet)
+        return "".join(out)
+
+    @staticmethod
+    def strip_markdown_links(text):
+        """Replace inline markdown links with their display text: `[display](url)` becomes `display`.
+
+        Both parts may span lines; a match ends at the first `]`, which must
+        be followed by `(`, and at the first `)` after it.
+        """
+        out = []
+        pos = 0
+        start = text.find("[")
+        while start >= 0:
+            close = text.find("]", start + 1)
+            if close < 0:
+                break
+            if close > start + 1 and text.startswith("(", close + 1):
+                end = text.find(")", close + 2)
+                if end < 0:
+                    break
+                if end > close + 2:
+                    out.append(text[pos:start])
+                    out.append(text[start + 1:close])
+                    pos = end + 1
+                    start = text.find("[", pos)
+                    continue
+            # Every `[` before `close` shares it and fails the same way
+            start = text.find("[", close + 1)
+        out.append(text[pos:])
+        return "".join(out)
+
+    @staticmethod
+    def scan_code_and_function_docs(text):
+        """Code blocks (fenced as ```pine) and `@function ... @returns` docs of `text`, in order"""
+        code_blocks = []
+        pos = 0
+        while True:
+            start = text.find("```", pos)
+            if start < 0:
+                break
+            body = start + 7 if text.startswith("pine", start + 3) else start + 3
+            end = text.find("```", body)
+            if end < 0:
+                break
+            clean_block = text[body:end].strip()
+            if clean_block:
+                code_blocks.append(f"```pine\n{clean_block}\n```")
+            pos = end + 3
+
+        function_docs = []
+        pos = 0
+        while True:
+            start = text.find("@function", pos)
+            if start < 0:
+                break
+            returns = text.find("@returns", start + 9)
+            if returns < 0:
+                break
+            end = text.find("\n", returns + 8)
+            if end < 0:
+                break
+            function_docs.append(text[start:end + 1])
+            pos = end + 1
+        return code_blocks, function_docs
+
+    @staticmethod
+    def strip_delimited(text, opener, closer):
+        """Remove every `opener ... closer` span that stays on one line (the regex `opener.*?closer`)"""
+        out = []
+        pos = 0
+        start = text.find(opener)
+        while start >= 0:
+            end = text.find(closer, start + len(opener))
+            if end < 0:
+                break
+            newline = text.rfind("\n", start + len(opener), end)
+            if newline >= 0:
+                # Every opener before that newline would run into it too
+                start = text.find(opener, newline + 1)
+                continue
+            out.append(text[pos:start])
+            pos = end + len(closer)
+            start = text.find(opener, pos)
+        out.append(text[pos:])
+        return "".join(out)
+
+    @staticmethod
+    def _newline_run_end(text, pos):
+        """End of `\\s*\\n` at `pos`: just past the last newline of the whitespace run there, or None"""
+        end = None
+        while pos < len(text) and text[pos].isspace():
+            if text[pos] == "\n":
+                end = pos + 1
+            pos += 1
+        return end
+
+    def _heading_matcher(self, text):
+        """Return a `match(start)` for `##\\s+(?:\\[(.*?)\\]|([^\\n]+))\\s*\\n` at `start`.
+
+        `match` follows the pattern's backtracking order and returns
+        `(title, body_start)` or None. Headings are tried left to right, so the
+        lookups that would otherwise run to the end of the text from every
+        `##` (a bracket that never closes before a newline, a heading line
+        without a newline) are answered from state kept across calls, which
+        keeps a whole scan linear in the length of the text.
+        """
+        n = len(text)
+        last_newline = text.rfind("\n")
+        # Last answer to "first `]` at or after `searched_from` followed by
+        # whitespace holding a newline": (searched_from, close, body_start)
+        closing = [n + 1, -1, None]
+
+        def closing_bracket(pos):
+            searched_from, close, body_start = closing
+            if not (searched_from <= pos and (close < 0 or pos <= close)):
+                close = text.find("]", pos)
+                body_start = None
+                while close >= 0:
+                    body_start = self._newline_run_end(text, close + 1)
+                    if body_start is not None:
+                        break
+                    close = text.find("]", close + 1)
+                closing[:] = [pos, close, body_start]
+            return close, body_start
+
+        def match(start):
+            first = start + 2
+            ws_end = first
+            while ws_end < n and text[ws_end].isspace():
+                ws_end += 1
+            # \s+ is greedy: try the longest whitespace run first, then shorter ones
+            for pos in range(ws_end, first, -1):
+                if pos >= n:
+                    continue
+                if text[pos] == "[":
+                    # Lazy .*? across lines: the first `]` followed by whitespace holding a newline
+                    close, body_start = closing_bracket(pos + 1)
+                    if close >= 0:
+                        return text[pos + 1:close], body_start
+                if text[pos] != "\n" and pos <= last_newline:
+                    line_end = text.find("\n", pos)
+                    return text[pos:line_end], self._newline_run_end(text, line_end)
             return None
+
+        return match
+
+    def scan_sections(self, content):
+        """Split content into `(title, body)` sections at `## ` headings, in linear time.
+
+        As with the original heading regex, a heading may start at any `##`,
+        including the last two characters of `###` or mid-line, while a body
+        only ends at a line starting with `##` plus whitespace, or at the end
+        of the text.
+        """
+        sections = []
+        match_heading = self._heading_matcher(content)
+        start = content.find("##")
+        while start >= 0:
+            match = match_heading(start)
+            if match is None:
+                start = content.find("##", start + 1)
+                continue
+            title, body_start = match
+            body_end = len(content)
+            if content.startswith("##", body_start) and body_start + 2 < len(content) \
+                    and content[body_start + 2].isspace():
+                body_end = body_start
+            else:
+                candidate = content.find("\n##", body_start)
+                while candidate >= 0:
+                    if candidate + 3 < len(content) and content[candidate + 3].isspace():
+                        body_end = candidate + 1
+                        break
+                    candidate = content.find("\n##", candidate + 1)
+            sections.append((title.strip(), content[body_start:body_end]))
+            start = content.find("##", body_end)
+        return sections
+
+    def process_file(self, filename):
+        """Process a single documentation file"""
+        return self.process_file_with_stats(filename)[0]
+
+    def process_file_with_stats(self, filename):
+        """process_file plus its stats: `tokens` (without dedupe / token diet, written) and chunk records"""
+        with open(os.path.join(self.input_dir, filename), 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        structure = self.load_structure(filename)
+        parts = self.process_parts(content, filename, structure)
+        processed = self.join_parts(parts, self.token_diet)
+        if processed is None:
+            return None, {}
+
+        stats = {}
+        if self.dedupe or self.token_diet:
+            full = self.process_text(content, filename, structure, dedupe=False, token_diet=False)
+            stats['tokens'] = (count_tokens(full), count_tokens(processed))
             
         # Save processed content
         output_filename = f"processed_{filename}"
         with open(os.path.join(self.output_dir, output_filename), 'w', encoding='utf-8') as f:
-            f.write("\n\n".join(processed))
+            f.write(processed)
+        if self.chunks:
+            stats['chunks'] = self.chunk_records(output_filename, processed, parts)
+        if self.symbols:
+            stats['symbols'] = self.section_symbols(parts, stats.get('chunks'))
             
-        return output_filename
-        
-    def process_all(self):
-        """Process all markdown files in the input directory"""
-        processed_files = []
-        print(f"Looking for files in: {self.input_dir}")
+        return output_filename, stats
+
+    @staticmethod
+    def section_symbols(parts, chunks=None):
+        """`[heading, chunk_index, chunk_sha256, identifiers]` for each part of a processed file.
+
+        Identifiers are the sorted namespaced Pine names (`ta.sma`,
+        `request.security`, ...) in the part's prose and code. With chunk
+        records the part's chunk is given by its index and its
+        `content_sha256`; otherwise both are None. The hash, not a document
+        id, identifies the chunk: ingest renumbers the documents of a file
+        when it splits a chunk over the embedding model's limit, but keeps
+        the hash in every piece's metadata.
+        """
+        sections = []
+        for index, (heading, text) in enumerate(parts):
+            chunk_index = chunk_sha256 = None
+            if chunks:
+                chunk_index = index if len(chunks) > 1 else 0
+                chunk_sha256 = chunks[chunk_index]['content_sha256']
+            # Names cut short by the docs' wildcards (`plot.style_*`) are not identifiers
+            identifiers = {name for name in PINE_IDENTIFIER.findall(text) if not name.endswith("_")}
+            sections.append([heading, chunk_index, chunk_sha256, sorted(identifiers)])
+        return sections
+
+    def load_symbol_sections(self):
+        """Per-file section_symbols of the previous symbol index, empty if missing or unreadable"""
+        if not os.path.exists(self.symbols_path):
+            return {}
+        try:
+            with open(self.symbols_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            sections = [[file_index, heading, chunk_index, chunk_sha256, []]
+                        for file_index, heading, chunk_index, chunk_sha256 in index['sections']]
+            for identifier, postings in index['symbols'].items():
+                for posting in postings:
+                    sections[posting][4].append(identifier)
+            by_file = {}
+            for file_index, heading, chunk_index, chunk_sha256, identifiers in sections:
+                by_file.setdefault(index['files'][file_index], []).append(
+                    [heading, chunk_index, chunk_sha256, identifiers])
+            return by_file
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"Ignoring unreadable symbol index {self.symbols_path}: {e}")
+            return {}
+
+    def write_symbol_index(self, processed_files, symbol_sections):
+        """Write the symbol index of `processed_files` as compact JSON.
+
+        `files` lists the processed files, `sections` holds `[file index,
+        heading, chunk index, chunk sha256]` rows, and `symbols` maps every
+        identifier to the rows of the sections that mention it, so a lookup
+        is one dict access.
+        """
+        files = []
+        sections = []
+        symbols = {}
+        for output_file in processed_files:
+            if output_file not in symbol_sections:
+                continue
+            files.append(output_file)
+            for heading, chunk_index, chunk_sha256, identifiers in symbol_sections[output_file]:
+                for identifier in identifiers:
+                    symbols.setdefault(identifier, []).append(len(sections))
+                sections.append([len(files) - 1, heading, chunk_index, chunk_sha256])
+        tmp_path = f"{self.symbols_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': files, 'sections': sections, 'symbols': dict(sorted(symbols.items()))},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.symbols_path)
+        print(f"Symbol index written to: {self.symbols_path} ({len(symbols)} identifiers)")
+
+    def chunk_records(self, output_filename, processed, parts):
+        """Chunk records of a processed file for server/ingest.py.
+
+        Like ingest's chunk_document, a file within chunk_tokens is one chunk
+        without a heading; a larger one gets a chunk per part (section or
+        appendix) the processor wrote, without the overlap ingest prepends.
+        Token counts are for embedding_model, or estimates when `token_model`
+        says so.
+        """
+        # The flag ingest would set on the chunk's metadata
+        from server.utils import detect_code_snippets
+        token_model = self.embedding_model if tiktoken_available() else TOKEN_ESTIMATE
+        chunks = [(None, processed)]
+        if len(parts) > 1 and count_tokens(processed, model=self.embedding_model) > self.chunk_tokens:
+            chunks = [(heading, (self.apply_token_diet(text) if self.token_diet else text).strip()) for heading, text in parts]
+        file_sha256 = hashlib.sha256(processed.encode('utf-8')).hexdigest()
+        return [{
+            'file': output_filename,
+            'file_sha256': file_sha256,
+            'chunk_index': index,
+            'chunk_count': len(chunks),
+            'heading': heading,
+            'content': text,
+            'content_sha256': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            'token_count': count_tokens(text, model=self.embedding_model),
+            'token_model': token_model,
+            'has_code': detect_code_snippets(text),
+        } for index, (heading, text) in enumerate(chunks)]
+
+    def load_chunk_records(self):
+        """Chunk records of the previous chunks file by processed file, empty if missing or unreadable"""
+        records = {}
+        if not os.path.exists(self.chunks_path):
+            return records
+        try:
+            with open(self.chunks_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records.setdefault(record['file'], []).append(record)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable chunks file {self.chunks_path}: {e}")
+            return {}
+        return records
+
+    def write_chunk_records(self, processed_files, records):
+        """Write the chunk records of `processed_files`, in order, as JSONL"""
+        tmp_path = f"{self.chunks_path}.tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for output_file in processed_files:
+                for record in records.get(output_file, []):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+        os.replace(tmp_path, self.chunks_path)
+        print(f"Chunks for ingest written to: {self.chunks_path} ({count} chunks)")
         
-        # Collect markdown files and sort them in natural numeric order so
-        # files named like "1_name.md", "2_name.md", ..., "10_name.md" are
-        # processed in ascending numeric order.
+    def load_page_order(self):
+        """Nav position of each file listed in the crawler's `page_order.json`, empty if missing or unreadable"""
+        path = os.path.join(self.input_dir, 'page_order.json')
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return {name: position for position, name in enumerate(json.load(f).get('files', []))}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Ignoring unreadable page order {path}: {e}")
+            return {}
+
+    def input_files(self):
+        """Return the markdown files of the input directory in nav order"""
+        # Stable-named pages (`concepts_alerts.md`) are ordered by the
+        # crawler's page_order.json. Other files are sorted in natural
+        # numeric order so files named like "1_name.md", "2_name.md", ...,
+        # "10_name.md" are processed in ascending numeric order.
         all_files = [f for f in os.listdir(self.input_dir) if f.endswith('.md') and f != 'all_docs.md']
         print(f"Found files (unsorted): {all_files}")
+        page_order = self.load_page_order()
 
         # Natural sort: prefer leading numeric prefix when present
         def _sort_key(name):
+            if name in page_order:
+                return (0, page_order[name], name)
             m = re.match(r'^(\d+)[._-]?', name)
             if m:
-                # numeric-prefixed files come first, sorted by integer value
-                return (0, int(m.group(1)), name)
+                # numeric-prefixed files come next, sorted by integer value
+                return (1, int(m.group(1)), name)
             # non-prefixed files come after, sorted lexicographically
-            return (1, name)
+            return (2, name)
 
         all_files.sort(key=_sort_key)
+        return all_files
+
+    def write_combined(self, processed_files):
+        """Write `processed_all_docs.md` from processed output files, in the given order.
+
+        The files are appended to the combined file without passing through
+        Python (os.sendfile where the platform supports it), and the result
+        replaces the previous combined file in one step.
+        """
+        combined_path = self.combined_path
+        tmp_path = f"{combined_path}.tmp"
+        with open(tmp_path, 'wb') as combined:
+            for filename in processed_files:
+                combined.write(f"\n\n# {filename[:-3]}\n\n".encode('utf-8'))
+                with open(os.path.join(self.output_dir, filename), 'rb') as f:
+                    self._append_file(combined, f)
+                combined.write(b"\n\n---\n\n")
+        os.replace(tmp_path, combined_path)
+
+        print(f"Combined processed file written to: {combined_path}")
+        return combined_path
+
+    @staticmethod
+    def _append_file(combined, source):
+        """Copy the whole of `source` onto the end of `combined` (both binary files)"""
+        combined.flush()
+        size = os.fstat(source.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(combined.fileno(), source.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            # No sendfile for these files: fall back to a buffered copy of the rest
+            pass
+        if offset < size:
+            source.seek(offset)
+            shutil.copyfileobj(source, combined)
+        # sendfile moved the descriptor's offset, keep the buffered writer in step
+        combined.seek(0, os.SEEK_END)
+
+    def load_manifest(self):
+        """Return the processing manifest ({input file: entry}), empty if missing or unreadable"""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('files', {})
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable processing manifest {self.manifest_path}: {e}")
+            return {}
+
+    def save_manifest(self, entries):
+        # Write to a temp file first so an interrupted save never truncates the manifest
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def input_hash(self, filename):
+        """sha256 of an input file and its structure sidecar, which also shapes the output"""
+        digest = hashlib.sha256()
+        with open(os.path.join(self.input_dir, filename), 'rb') as f:
+            digest.update(f.read())
+        sidecar = os.path.join(self.input_dir, f"{os.path.splitext(filename)[0]}.structure.json")
+        if os.path.exists(sidecar):
+            with open(sidecar, 'rb') as f:
+                digest.update(b'\0')
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def output_hash(self, output_file):
+        """sha256 of a processed file, or None if it does not exist"""
+        try:
+            with open(os.path.join(self.output_dir, output_file), 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    def output_options(self):
+        """Settings that change the processed output, part of every manifest key"""
+        options = {'dedupe': self.dedupe, 'token_diet': self.token_diet}
+        if self.chunks:
+            options['chunks'] = {'tokens': self.chunk_tokens, 'model': self.embedding_model}
+        if self.symbols:
+            options['symbols'] = True
+        return options
+
+    def is_unchanged(self, entry, input_hash):
+        """Whether a manifest entry still describes the output for this input.
+
+        The input, the processor version and the output options must match, and the processed
+        file must still be on disk as it was written (or the input must have
+        been skipped for lack of content).
+        """
+        if not entry or entry.get('input_sha256') != input_hash or entry.get('processor_version') != PROCESSOR_VERSION:
+            return False
+        if entry.get('options') != self.output_options():
+            return False
+        output_file = entry.get('output')
+        return output_file is None or self.output_hash(output_file) == entry.get('output_sha256')
+
+    def timed_process_file(self, filename):
+        """process_file_with_stats plus the seconds it took"""
+        started = time.perf_counter()
+        output_file, stats = self.process_file_with_stats(filename)
+        return output_file, time.perf_counter() - started, stats
+
+    def process_all(self):
+        """Process all markdown files in the input directory"""
+        processed_files = []
+        print(f"Looking for files in: {self.input_dir}")
+        
+        all_files = self.input_files()
         print(f"Processing files in order: {all_files}")
 
+        started = time.monotonic()
+        previous_manifest = self.load_manifest()
+        manifest = {} if self.force else previous_manifest
+        input_hashes = {filename: self.input_hash(filename) for filename in all_files}
+        unchanged = {f for f in all_files if self.is_unchanged(manifest.get(f), input_hashes[f])}
+        to_process = [f for f in all_files if f not in unchanged]
+        if unchanged:
+            print(f"Skipping {len(unchanged)} unchanged file(s) (same input and processor version)")
+
+        jobs = min(self.jobs, len(to_process))
+        self.timings = []
+        self.token_savings = []
+        outputs = {}
+        # Chunk records and symbol sections by processed file: this run's, then
+        # the previous files' for unchanged inputs
+        chunk_records = {}
+        symbol_sections = {}
+        if jobs > 1:
+            # Files are independent and CPU-bound, so they are spread over
+            # worker processes. The module is usually loaded by file path
+            # under a private name (see 3_scrap_and_process.py), which spawned
+            # workers can't re-import; forked workers inherit it.
+            context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+                # map yields results in input order, keeping the natural sort
+                self._collect(to_process, executor.map(self.timed_process_file, to_process), outputs,
+                              chunk_records, symbol_sections)
+        else:
+            self._collect(to_process, map(self.timed_process_file, to_process), outputs, chunk_records, symbol_sections)
+        for enabled, load, collected in ((self.chunks, self.load_chunk_records, chunk_records),
+                                         (self.symbols, self.load_symbol_sections, symbol_sections)):
+            if enabled and unchanged:
+                previous = load()
+                for filename in unchanged:
+                    output_file = manifest[filename].get('output')
+                    if output_file in previous:
+                        collected[output_file] = previous[output_file]
+
+        entries = {}
         for filename in all_files:
-            print(f"Processing file: {filename}")
-            output_file = self.process_file(filename)
+            if filename in outputs:
+                output_file = outputs[filename]
+                entries[filename] = self.manifest_entry(input_hashes[filename], output_file)
+            else:
+                entries[filename] = manifest[filename]
+                output_file = manifest[filename].get('output')
             if output_file:
                 processed_files.append(output_file)
-                print(f"Successfully processed: {output_file}")
-            else:
-                print(f"Skipped file: {filename} (no valid content found)")
+        # Entries of inputs that are gone are dropped, with their outputs
+        self.drop_outputs(previous_manifest, entries)
+        self.save_manifest(entries)
+
+        busy = sum(elapsed for _, elapsed in self.timings)
+        print(f"Processed {len(to_process)} files ({len(unchanged)} unchanged) in {time.monotonic() - started:.2f}s "
+              f"with {max(jobs, 1)} job(s) ({busy:.2f}s of per-file work)")
+        for filename, elapsed in sorted(self.timings, key=lambda item: item[1], reverse=True)[:5]:
+            print(f"  slowest: {filename} ({elapsed * 1000:.0f} ms)")
+        if self.token_savings:
+            before = sum(counts[1] for counts in self.token_savings)
+            after = sum(counts[2] for counts in self.token_savings)
+            options = " and ".join(name for name, enabled in (('dedupe', self.dedupe), ('token_diet', self.token_diet))
+                                   if enabled)
+            print(f"{options} saved {before - after} of {before} tokens ({(before - after) / max(before, 1):.1%}) "
+                  f"over {len(self.token_savings)} files")
         
-        # Create a combined processed file in the script's directory (not inside the processed folder)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        combined_path = os.path.join(script_dir, 'processed_all_docs.md')
-        with open(combined_path, 'w', encoding='utf-8') as combined:
-            for filename in processed_files:
-                with open(os.path.join(self.output_dir, filename), 'r', encoding='utf-8') as f:
-                    combined.write(f"\n\n# {filename[:-3]}\n\n")
-                    combined.write(f.read())
-                    combined.write("\n\n---\n\n")
+        self.write_outputs(processed_files, chunk_records, symbol_sections)
 
-        print(f"Combined processed file written to: {combined_path}")
+    def manifest_entry(self, input_hash, output_file):
+        """Manifest entry of an input just processed into `output_file` (None if skipped)"""
+        return {
+            'input_sha256': input_hash,
+            'processor_version': PROCESSOR_VERSION,
+            'options': self.output_options(),
+            'output': output_file,
+            'output_sha256': self.output_hash(output_file) if output_file else None,
+        }
+
+    def update_manifest(self, outputs):
+        """Record `{input file: output file or None}` processed outside process_all (e.g. by the pipeline)"""
+        entries = self.load_manifest()
+        for filename, output_file in outputs.items():
+            entries[filename] = self.manifest_entry(self.input_hash(filename), output_file)
+        # Entries of inputs that are gone are dropped, with their outputs
+        kept = {filename: entry for filename, entry in entries.items()
+                if os.path.exists(os.path.join(self.input_dir, filename))}
+        self.drop_outputs(entries, kept)
+        self.save_manifest(kept)
+
+    def drop_outputs(self, previous, entries):
+        """Delete the processed files of `previous` manifest entries that are not in `entries`.
+
+        Their chunk records and symbol sections go with them, as
+        write_outputs only covers the outputs of current entries.
+        """
+        current = {entry.get('output') for entry in entries.values()}
+        for filename, entry in previous.items():
+            output_file = entry.get('output')
+            if filename in entries or not output_file or output_file in current:
+                continue
+            try:
+                os.remove(os.path.join(self.output_dir, output_file))
+                print(f"Removed {output_file} (input {filename} is gone)")
+            except FileNotFoundError:
+                pass
+
+    def write_outputs(self, processed_files, chunk_records, symbol_sections):
+        """Write the outputs covering all of `processed_files`: chunks JSONL, symbol index and combined file"""
+        if self.chunks:
+            self.write_chunk_records(processed_files, chunk_records)
+        if self.symbols:
+            self.write_symbol_index(processed_files, symbol_sections)
+        if self.combined:
+            self.write_combined(processed_files)
+
+    def _collect(self, filenames, results, outputs, chunk_records, symbol_sections):
+        """Record and report `(output_file, seconds, stats)` results in input order"""
+        for filename, (output_file, elapsed, stats) in zip(filenames, results):
+            self.timings.append((filename, elapsed))
+            outputs[filename] = output_file
+            print(f"Processing file: {filename}")
+            if output_file:
+                print(f"Successfully processed: {output_file} ({elapsed * 1000:.0f} ms)")
+                if 'chunks' in stats:
+                    chunk_records[output_file] = stats['chunks']
+                if 'symbols' in stats:
+                    symbol_sections[output_file] = stats['symbols']
+                if 'tokens' in stats:
+                    before, after = stats['tokens']
+                    self.token_savings.append((filename, before, after))
+                    print(f"  tokens: {before} -> {after} (saved {before - after})")
+            else:
+                print(f"Skipped file: {filename} (no valid content found, {elapsed * 1000:.0f} ms)")
+
+
+def add_processor_arguments(parser: argparse.ArgumentParser):
+    """Register processor flags (shared with 3_scrap_and_process.py)."""
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Worker processes for processing files, 0 for one per CPU (default: 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess every file, even those the processing manifest marks as unchanged")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Store each code block and function doc once, referencing the section that holds it")
+    parser.add_argument("--token-diet", action="store_true",
+                        help="Strip or compact boilerplate (code widget markers, image placeholders, blank line runs)")
+    parser.add_argument("--chunks", action="store_true",
+                        help="Also write processed/processed_chunks.jsonl, the chunks server/ingest.py indexes")
+    parser.add_argument("--chunk-tokens", type=int, default=None,
+                        help="Files over this many tokens get one chunk per section "
+                             "(default: the server config's chunk_token_threshold, as ingest)")
+    parser.add_argument("--embedding-model", default=None,
+                        help="Model whose tokenizer counts chunk tokens (default: the server config's embedding_model)")
+    parser.add_argument("--symbols", action="store_true",
+                        help="Also write processed/symbol_index.json, mapping Pine identifiers like ta.sma to their sections")
+    parser.add_argument("--no-combined", dest="combined", action="store_false",
+                        help="Don't write processed_all_docs.md, only the per-file outputs")
+
+
+def processor_kwargs_from_args(args: argparse.Namespace) -> dict:
+    """Map parsed processor flags onto PineScriptDocsProcessor keyword arguments."""
+    return {
+        "jobs": args.jobs,
+        "force": args.force,
+        "combined": args.combined,
+        "dedupe": args.dedupe,
+        "token_diet": args.token_diet,
+        "chunks": args.chunks,
+        "chunk_tokens": args.chunk_tokens,
+        "embedding_model": args.embedding_model,
+        "symbols": args.symbols,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process the crawled Pine Script documentation")
+    add_processor_arguments(parser)
+    args = parser.parse_args(argv)
 
-if __name__ == "__main__":
     # Get the script's directory and set up paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
     # Read from the new `unprocessed` folder created by the crawler
     input_dir = os.path.join(script_dir, "pinescript_docs", "unprocessed")
     
-    processor = PineScriptDocsProcessor(input_dir, "processed")
-    processor.process_all()
\ No newline at end of file
+    processor = PineScriptDocsProcessor(input_dir, "processed", **processor_kwargs_from_args(args))
+    processor.process_all()
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ Usage:
 	python 3_scrap_and_process.py        # run crawl then process
 	python 3_scrap_and_process.py --crawl-only
 	python 3_scrap_and_process.py --process-only
+	python 3_scrap_and_process.py --pipeline   # process pages while crawling
 
 This file intentionally avoids executing the crawler during import; it
 explicitly calls the crawler's async main or run method when requested.
@@ -18,8 +19,11 @@ from __future__ import annotations
 import argparse
 import asyncio
 import importlib.util
+import multiprocessing
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 
@@ -39,11 +43,14 @@ def load_module_from_path(name: str, path: str):
 	return module
 
 
-async def run_crawler_module(mod, *, verbose: bool = True):
+async def run_crawler_module(mod, *, verbose: bool = True, crawler_kwargs: dict | None = None):
 	"""Run the crawler module. Accepts either an async `main()` function
 	or a `PineScriptDocsCrawler` class that exposes `run()` or `main()`.
+
+	When `crawler_kwargs` is given the crawler class is instantiated directly
+	with those options (the module's `main()` would parse its own argv).
 	"""
-	if hasattr(mod, "main"):
+	if crawler_kwargs is None and hasattr(mod, "main"):
 		main_obj = getattr(mod, "main")
 		if asyncio.iscoroutinefunction(main_obj):
 			if verbose:
@@ -56,7 +63,7 @@ async def run_crawler_module(mod, *, verbose: bool = True):
 		if verbose:
 			print("Running crawler: PineScriptDocsCrawler.run()")
 		crawler_cls = getattr(mod, "PineScriptDocsCrawler")
-		crawler = crawler_cls()
+		crawler = crawler_cls(**(crawler_kwargs or {}))
 		# prefer async run() if present, else call sync run() if available
 		if hasattr(crawler, "run"):
 			run_meth = getattr(crawler, "run")
@@ -72,7 +79,7 @@ async def run_crawler_module(mod, *, verbose: bool = True):
 	raise RuntimeError("Crawler module does not expose an async entrypoint we can call")
 
 
-def run_processor_module(mod, input_dir: str, *, verbose: bool = True):
+def run_processor_module(mod, input_dir: str, *, verbose: bool = True, processor_kwargs: dict | None = None):
 	"""Run the processor from the loaded module by instantiating
 	PineScriptDocsProcessor(input_dir, output_dir) and calling process_all().
 	"""
@@ -83,19 +90,111 @@ def run_processor_module(mod, input_dir: str, *, verbose: bool = True):
 		print(f"Running processor against: {input_dir}")
 
 	Processor = getattr(mod, "PineScriptDocsProcessor")
-	processor = Processor(input_dir, "processed")
+	processor = Processor(input_dir, "processed", **(processor_kwargs or {}))
 	# process_all is synchronous in the provided file
 	processor.process_all()
 
 
+async def run_pipeline(crawler, processor, *, verbose: bool = True, workers: int = 1):
+	"""Crawl and process concurrently.
+
+	The crawler puts `(page_index, file_name)` on an asyncio queue as soon as
+	a page is saved; each page is handed to `processor.process_file` in a
+	worker thread (or, with `workers` > 1, in a pool of that many worker
+	processes, like the processor's --jobs) while the crawl keeps fetching.
+	Pages the processing manifest marks as unchanged (see
+	PineScriptDocsProcessor.is_unchanged) are not processed again: their
+	previous output, chunk records and symbol sections are reused.
+	The combined processed file, the chunks JSONL and the symbol index are
+	assembled at the end in page order, and the processing manifest is updated, so
+	end-to-end time approaches max(crawl, process) instead of their sum.
+	"""
+	if verbose:
+		print(f"Running crawler and processor as a pipeline ({workers} processing worker(s))")
+
+	loop = asyncio.get_running_loop()
+	queue: asyncio.Queue = asyncio.Queue()
+	# page_index -> (input file, output file or None)
+	results: dict[int, tuple[str, str | None]] = {}
+	# Chunk records and symbol sections by output file, see
+	# PineScriptDocsProcessor.chunk_records and section_symbols
+	chunk_records: dict[str, list] = {}
+	symbol_sections: dict[str, list] = {}
+	# input file -> output file or None, for the pages processed by this run
+	processed: dict[str, str | None] = {}
+	manifest = {} if processor.force else processor.load_manifest()
+	# The previous run's records, for pages that turn out unchanged
+	previous_chunks = processor.load_chunk_records() if processor.chunks and manifest else {}
+	previous_symbols = processor.load_symbol_sections() if processor.symbols and manifest else {}
+	started = time.monotonic()
+	busy = 0.0
+
+	async def consume(executor):
+		tasks = []
+
+		async def handle(page_index: int, file_name: str):
+			nonlocal busy
+			entry = manifest.get(file_name)
+			if entry and await asyncio.to_thread(
+					lambda: processor.is_unchanged(entry, processor.input_hash(file_name))):
+				output = entry.get("output")
+				results[page_index] = (file_name, output)
+				if output in previous_chunks:
+					chunk_records[output] = previous_chunks[output]
+				if output in previous_symbols:
+					symbol_sections[output] = previous_symbols[output]
+				if verbose:
+					print(f"Pipeline: {file_name} unchanged")
+				return
+			output, elapsed, stats = await loop.run_in_executor(executor, processor.timed_process_file, file_name)
+			busy += elapsed
+			results[page_index] = (file_name, output)
+			processed[file_name] = output
+			if output and "chunks" in stats:
+				chunk_records[output] = stats["chunks"]
+			if output and "symbols" in stats:
+				symbol_sections[output] = stats["symbols"]
+			if verbose:
+				status = f"processed -> {output}" if output else "skipped (no valid content found)"
+				print(f"Pipeline: {file_name} {status} ({elapsed * 1000:.0f} ms)")
+
+		while True:
+			item = await queue.get()
+			if item is None:
+				break
+			tasks.append(asyncio.create_task(handle(*item)))
+		await asyncio.gather(*tasks)
+
+	if workers > 1:
+		# Processing is CPU-bound: threads would only take turns on the GIL.
+		# Forked workers inherit the processor module loaded by file path.
+		context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+		executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+	else:
+		executor = ThreadPoolExecutor(max_workers=1)
+	with executor:
+		consumer = asyncio.create_task(consume(executor))
+		try:
+			await crawler.run(page_queue=queue)
+		finally:
+			# Always release the consumer, even if the crawl failed
+			await queue.put(None)
+			await consumer
+
+	ordered = [results[i] for i in sorted(results)]
+	processed_files = [output for _, output in ordered if output]
+	# Unchanged pages keep their manifest entries
+	processor.update_manifest(processed)
+	processor.write_outputs(processed_files, chunk_records, symbol_sections)
+	if verbose:
+		print(
+			f"Pipeline finished in {time.monotonic() - started:.1f}s: {len(processed)} files processed, "
+			f"{len(ordered) - len(processed)} unchanged ({busy:.1f}s of processing overlapped with crawling)"
+		)
+
+
 def main(argv: list[str] | None = None):
 	argv = argv if argv is not None else sys.argv[1:]
-	parser = argparse.ArgumentParser(description="Run scraper and processor")
-	group = parser.add_mutually_exclusive_group()
-	group.add_argument("--crawl-only", action="store_true", help="Only run the crawler")
-	group.add_argument("--process-only", action="store_true", help="Only run the processor")
-	parser.add_argument("--no-verbose", dest="verbose", action="store_false", help="Reduce output")
-	args = parser.parse_args(argv)
 
 	repo_dir = Path(__file__).resolve().parent
 	path_scraper = str(repo_dir / "1_scrap_docs.py")
@@ -105,25 +204,53 @@ def main(argv: list[str] | None = None):
 	scraper_mod = load_module_from_path("_pinescraper_1", path_scraper)
 	processor_mod = load_module_from_path("_pinescraper_2", path_processor)
 
+	parser = argparse.ArgumentParser(description="Run scraper and processor")
+	group = parser.add_mutually_exclusive_group()
+	group.add_argument("--crawl-only", action="store_true", help="Only run the crawler")
+	group.add_argument("--process-only", action="store_true", help="Only run the processor")
+	group.add_argument("--pipeline", action="store_true", help="Process each page as soon as it is crawled")
+	parser.add_argument("--no-verbose", dest="verbose", action="store_false", help="Reduce output")
+	if hasattr(scraper_mod, "add_crawler_arguments"):
+		scraper_mod.add_crawler_arguments(parser.add_argument_group("crawler options"))
+	if hasattr(processor_mod, "add_processor_arguments"):
+		processor_mod.add_processor_arguments(parser.add_argument_group("processor options"))
+	args = parser.parse_args(argv)
+
+	crawler_kwargs = None
+	if hasattr(scraper_mod, "crawler_kwargs_from_args"):
+		crawler_kwargs = scraper_mod.crawler_kwargs_from_args(args)
+	processor_kwargs = None
+	if hasattr(processor_mod, "processor_kwargs_from_args"):
+		processor_kwargs = processor_mod.processor_kwargs_from_args(args)
+
 	# Decide what to run
 	do_crawl = not args.process_only
 	do_process = not args.crawl_only
 
+	# The crawler writes to <output dir>/unprocessed, pinescript_docs next to the scripts by default
+	output_dir = (crawler_kwargs or {}).get("output_dir") or os.path.join(str(repo_dir), "pinescript_docs")
+	input_dir = os.path.join(output_dir, "unprocessed")
+
 	try:
+		if args.pipeline:
+			crawler = scraper_mod.PineScriptDocsCrawler(**(crawler_kwargs or {}))
+			os.makedirs(input_dir, exist_ok=True)
+			processor = processor_mod.PineScriptDocsProcessor(input_dir, "processed", **(processor_kwargs or {}))
+			asyncio.run(run_pipeline(crawler, processor, verbose=args.verbose, workers=processor.jobs))
+			return
+
 		if do_crawl:
 			# run the crawler's async main using asyncio.run
-			asyncio.run(run_crawler_module(scraper_mod, verbose=args.verbose))
+			asyncio.run(run_crawler_module(scraper_mod, verbose=args.verbose, crawler_kwargs=crawler_kwargs))
 		else:
 			if args.verbose:
 				print("Skipping crawler step (per flags)")
 
 		if do_process:
-			# The crawler writes to pinescript_docs/unprocessed by default
-			input_dir = os.path.join(str(repo_dir), "pinescript_docs", "unprocessed")
 			if not os.path.isdir(input_dir):
 				print(f"Warning: input directory not found: {input_dir}")
 				print("Processor will still be invoked; it may decide to skip processing.")
-			run_processor_module(processor_mod, input_dir, verbose=args.verbose)
+			run_processor_module(processor_mod, input_dir, verbose=args.verbose, processor_kwargs=processor_kwargs)
 		else:
 			if args.verbose:
 				print("Skipping processing step (per flags)")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Benchmark crawl throughput against recorded fixtures (no network needed).
+
+Record the docs once, then replay them from a local HTTP server as many
+times as needed while tuning concurrency, rate limit or fetch mode:
+
+    python 1_scrap_docs.py --record fixtures/pine-docs
+    python scripts/bench_crawl.py fixtures/pine-docs --concurrency 1 4 8 --fetch-mode http
+
+Each configuration crawls the fixtures into a throwaway output directory and
+reports wall time and pages/second.
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_crawler_module():
+    spec = importlib.util.spec_from_file_location("_pinescraper_1", os.path.join(REPO_DIR, "1_scrap_docs.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["_pinescraper_1"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawl throughput against recorded fixtures")
+    parser.add_argument("fixtures", help="Fixtures directory recorded with 1_scrap_docs.py --record")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrency values to compare")
+    parser.add_argument("--fetch-mode", default="browser", help="Fetch mode passed to the crawler")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Rate limit passed to the crawler (default: off)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration (best time is reported)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.fixtures):
+        print(f"Fixtures directory not found: {args.fixtures}")
+        sys.exit(1)
+
+    scraper = load_crawler_module()
+    rows = []
+    for concurrency in args.concurrency:
+        best = None
+        pages = 0
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as output_dir:
+                crawler = scraper.PineScriptDocsCrawler(
+                    concurrency=concurrency,
+                    rate_limit=args.rate_limit,
+                    fetch_mode=args.fetch_mode,
+                    replay_dir=args.fixtures,
+                    output_dir=output_dir,
+                )
+                started = time.monotonic()
+                # The crawler is chatty; keep the benchmark output readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    asyncio.run(crawler.run())
+                elapsed = time.monotonic() - started
+                unprocessed = os.path.join(output_dir, "unprocessed")
+                pages = len([f for f in os.listdir(unprocessed) if f.endswith(".md")]) if os.path.isdir(unprocessed) else 0
+            best = elapsed if best is None else min(best, elapsed)
+        rows.append((concurrency, pages, best))
+
+    print(f"{'concurrency':>11} {'pages':>6} {'seconds':>8} {'pages/s':>8}")
+    for concurrency, pages, elapsed in rows:
+        rate = pages / elapsed if elapsed else 0.0
+        print(f"{concurrency:>11} {pages:>6} {elapsed:>8.2f} {rate:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
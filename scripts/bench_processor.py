@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark the page processor against its regex reference implementation.
+
+Runs PineScriptDocsProcessor.process_text and process_text_regex, the
+original cascade of regex passes the processor replaced, over every
+markdown file in a directory, checks that both produce the same output and
+reports the time each takes:
+
+    python scripts/bench_processor.py pinescript_docs/unprocessed --repeat 5
+
+tests/test_process_docs.py checks the processor against process_text_regex
+as well.
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_processor_module():
+    spec = importlib.util.spec_from_file_location("_pinescraper_2", os.path.join(REPO_DIR, "2_process_docs.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["_pinescraper_2"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def clean_navigation(text):
+    """Remove navigation elements and links"""
+    text = re.sub(r'Version Version.*?Auto', '', text, flags=re.DOTALL)
+    text = re.sub(r'\* \[.*?\n', '', text)
+    text = re.sub(r'Copyright © .*?TradingView.*?\n', '', text)
+    text = re.sub(r'On this page.*?\n', '', text)
+    return text
+
+
+def extract_code_blocks(text):
+    """Pine Script code blocks, stripped and fenced as ```pine"""
+    return [f"```pine\n{block.strip()}\n```" for block in re.findall(r'```(?:pine)?(.*?)```', text, re.DOTALL)
+            if block.strip()]
+
+
+def extract_function_docs(text):
+    """`@function ... @returns` docs through the end of the @returns line"""
+    return re.findall(r'@function.*?@returns.*?\n', text, re.DOTALL)
+
+
+def remove_markdown_links(text):
+    """Replace inline markdown links like [text](url) with just the display text"""
+    return re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", text)
+
+
+def sections_regex(content):
+    """Split content into `(title, body)` sections with the `##` heading regex (quadratic on some pages)"""
+    sections_raw = re.findall(r"##\s+(?:\[(.*?)\]|([^\n]+))\s*\n(.*?)(?=^##\s+|\Z)", content, re.DOTALL | re.MULTILINE)
+    return [((g1 or g2 or '').strip(), body) for g1, g2, body in sections_raw]
+
+
+def process_text_regex(processor, content, filename, structure=None):
+    """What `processor.process_text` returns without dedupe or token diet, computed with regexes"""
+    content = remove_markdown_links(clean_navigation(content))
+    code_blocks = extract_code_blocks(content)
+    function_docs = extract_function_docs(content)
+    sections = processor.split_known_sections(content, structure) if structure else []
+    if not sections:
+        sections = sections_regex(content)
+    return processor.join_parts(processor.assemble_parts(
+        content, filename, sections, code_blocks, function_docs,
+        lambda text: re.sub(r'\[\^.*?\]', '', text),  # Remove footnotes
+        lambda text: re.sub(r'\(https://.*?\)', '', text),  # Remove links
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the page processor against its regex reference")
+    parser.add_argument("input_dir", nargs="?", default=os.path.join(REPO_DIR, "pinescript_docs", "processed"),
+                        help="Directory of markdown pages (default: pinescript_docs/processed)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best time is reported)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Input directory not found: {args.input_dir}")
+        sys.exit(1)
+
+    processor_mod = load_processor_module()
+    processor = processor_mod.PineScriptDocsProcessor(args.input_dir, "processed", combined=False)
+    pages = []
+    for filename in sorted(os.listdir(args.input_dir)):
+        if filename.endswith(".md"):
+            with open(os.path.join(args.input_dir, filename), "r", encoding="utf-8") as f:
+                pages.append((filename, f.read(), processor.load_structure(filename)))
+
+    mismatches = [filename for filename, content, structure in pages
+                  if processor.process_text(content, filename, structure)
+                  != process_text_regex(processor, content, filename, structure)]
+    for filename in mismatches:
+        print(f"Output differs: {filename}")
+
+    rows = []
+    regex = lambda content, filename, structure: process_text_regex(processor, content, filename, structure)
+    for name, process in (("regex", regex), ("processor", processor.process_text)):
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for filename, content, structure in pages:
+                process(content, filename, structure)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        rows.append((name, best))
+
+    size = sum(len(content) for _, content, _ in pages)
+    print(f"{len(pages)} pages, {size / 1e6:.2f} MB")
+    print(f"{'version':>11} {'seconds':>8} {'MB/s':>8}")
+    for name, elapsed in rows:
+        rate = size / 1e6 / elapsed if elapsed else 0.0
+        print(f"{name:>11} {elapsed:>8.3f} {rate:>8.2f}")
+    print(f"speedup: {rows[0][1] / rows[1][1]:.2f}x")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
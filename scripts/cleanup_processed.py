@@ -3,7 +3,9 @@
 
 Files are expected to end with _YYYYMMDD_HHMMSS.md. For each base (everything
 before the timestamp), we keep the file with the highest timestamp and remove
-older files.
+older files. When the crawler runs with `--naming stable` the page is written
+as `{base}.md` instead; once such a file exists every timestamped file of that
+base is stale and removed as well.
 """
 import os
 import re
@@ -30,11 +32,14 @@ for fn in files:
 
 removed = []
 for base, ts_files in by_base.items():
-    if len(ts_files) <= 1:
-        continue
     ts_files.sort(reverse=True)  # highest timestamp first
-    to_keep = ts_files[0][1]
-    to_remove = [fn for ts, fn in ts_files[1:]]
+    if f"{base}.md" in files:
+        # A stable-named file supersedes all timestamped versions
+        to_remove = [fn for ts, fn in ts_files]
+    elif len(ts_files) <= 1:
+        continue
+    else:
+        to_remove = [fn for ts, fn in ts_files[1:]]
     for fn in to_remove:
         path = os.path.join(ROOT, fn)
         try:
@@ -2,6 +2,7 @@
 
 Scans, parses, chunks, embeds, and indexes processed markdown files.
 """
+import json
 import re
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
@@ -27,6 +28,13 @@ from server.supabase_client import (
 
 logger = logging.getLogger(__name__)
 
+# conservative per-model max token limits (fallback to 8192)
+MODEL_MAX_TOKENS = {
+    "text-embedding-3-small": 8192,
+    "text-embedding-3-large": 8192,
+    "text-embedding-ada-002": 8192
+}
+
 
 def scan_documents(docs_dir: Optional[str] = None) -> List[Path]:
     """Scan processed documents directory for markdown files.
@@ -59,7 +67,8 @@ def chunk_document(
     content: str,
     filename: str,
     chunk_token_threshold: int,
-    overlap_tokens: int
+    overlap_tokens: int,
+    model: str = "gpt-4o"
 ) -> List[Tuple[str, Optional[str], int]]:
     """Chunk document by H1/H2 headings if it exceeds token threshold.
     
@@ -71,11 +80,13 @@ def chunk_document(
         filename: Source filename (for logging)
         chunk_token_threshold: Token count threshold for chunking
         overlap_tokens: Number of tokens to overlap between chunks
+        model: Model whose tokenizer counts the tokens (parse_document
+            passes the embedding model, as the processor's --chunks does)
     
     Returns:
         List of tuples: (chunk_content, section_heading, chunk_index)
     """
-    total_tokens = count_tokens(content)
+    total_tokens = count_tokens(content, model=model)
     
     # If under threshold, return as single chunk
     if total_tokens <= chunk_token_threshold:
@@ -105,7 +116,7 @@ def chunk_document(
                 chunks.append((chunk_content, current_heading, len(chunks)))
                 
                 # Calculate overlap from previous chunk
-                chunk_tokens = count_tokens(chunk_content)
+                chunk_tokens = count_tokens(chunk_content, model=model)
                 if chunk_tokens > overlap_tokens:
                     # Extract last overlap_tokens worth of content
                     overlap_content = extract_token_overlap(
@@ -208,7 +219,8 @@ def parse_document(filepath: Path) -> List[Document]:
         content,
         filename,
         config.chunk_token_threshold,
-        config.chunk_overlap_tokens
+        config.chunk_overlap_tokens,
+        model=config.embedding_model
     )
     
     documents = []
@@ -247,6 +259,106 @@ def parse_document(filepath: Path) -> List[Document]:
     return documents
 
 
+def load_chunks(chunks_path: Optional[str] = None) -> Dict[str, List[dict]]:
+    """Load the pre-chunked JSONL written by `2_process_docs.py --chunks`.
+    
+    Args:
+        chunks_path: Path to the chunks file (defaults to pinescript_docs/processed/processed_chunks.jsonl)
+    
+    Returns:
+        Dict mapping processed filename to its chunk records in chunk order
+        (empty if the file is missing or unreadable)
+    """
+    if chunks_path is None:
+        project_root = Path(__file__).parent.parent
+        chunks_path = project_root / "pinescript_docs" / "processed" / "processed_chunks.jsonl"
+    else:
+        chunks_path = Path(chunks_path)
+    
+    if not chunks_path.exists():
+        logger.debug(f"No chunks file at {chunks_path}, files will be chunked at ingest")
+        return {}
+    
+    records: Dict[str, List[dict]] = {}
+    try:
+        with open(chunks_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records.setdefault(record["file"], []).append(record)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Failed to read chunks file {chunks_path}: {e}")
+        return {}
+    
+    for file_records in records.values():
+        file_records.sort(key=lambda record: record["chunk_index"])
+    logger.info(f"Loaded {sum(len(r) for r in records.values())} chunks for {len(records)} files from {chunks_path}")
+    return records
+
+
+def documents_from_chunks(
+    filepath: Path,
+    records: List[dict],
+    embedding_model: str
+) -> Optional[List[Document]]:
+    """Build Document objects from the processor's chunk records of a file.
+    
+    The records are only used if they were made from the file as it is on
+    disk (same sha256); otherwise the caller should fall back to
+    parse_document. Token counts are reused when they were counted for
+    `embedding_model`, and recounted otherwise.
+    
+    Args:
+        filepath: Path to the processed markdown file
+        records: Chunk records of that file, in chunk order
+        embedding_model: Model the token counts must be for
+    
+    Returns:
+        List of Document objects, or None if the records are stale or incomplete
+    """
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        logger.error(f"Failed to read {filepath}: {e}")
+        return None
+    
+    content_hash = hash_string(content)
+    if not records or any(record.get("file_sha256") != content_hash for record in records):
+        logger.info(f"{filepath.name}: chunk records are stale, re-chunking at ingest")
+        return None
+    if [record["chunk_index"] for record in records] != list(range(len(records))):
+        logger.warning(f"{filepath.name}: chunk records are incomplete, re-chunking at ingest")
+        return None
+    
+    documents = []
+    for record in records:
+        token_count = record["token_count"]
+        if record.get("token_model") != embedding_model:
+            token_count = count_tokens(record["content"], model=embedding_model)
+        documents.append(Document(
+            id=generate_doc_id(filepath.name, record["chunk_index"]),
+            content=record["content"],
+            source_filename=filepath.name,
+            chunk_index=record["chunk_index"],
+            chunk_count=len(records),
+            section_heading=record.get("heading"),
+            token_count=token_count,
+            code_snippet=record["has_code"],
+            metadata={
+                "file_path": str(filepath),
+                "processed_timestamp": datetime.now().isoformat(),
+                "chunked_by": "processor",
+                # Lets the processor's symbol index find the chunk (and its pieces, if split)
+                "content_sha256": record["content_sha256"]
+            },
+            embedding=None  # Will be populated later
+        ))
+    
+    logger.debug(f"{filepath.name}: {len(documents)} chunks from the processor")
+    return documents
+
+
 def split_text_by_token_limit(text: str, max_tokens: int, overlap_tokens: int, model: str) -> List[str]:
     """Split text into parts each under max_tokens (approximate using token counts).
 
@@ -312,6 +424,74 @@ def split_text_by_token_limit(text: str, max_tokens: int, overlap_tokens: int, m
     return parts
 
 
+def split_oversized_documents(
+    documents: List[Document],
+    max_tokens: int,
+    overlap_tokens: int,
+    model: str
+) -> List[Document]:
+    """Split documents over the embedding model's context length.
+    
+    Documents are rebuilt per file so chunk_count and chunk_index remain
+    consistent for each source file. Files whose documents all fit are
+    returned as they are, keeping their ids and token counts; in a file
+    that needs splitting, the documents that fit keep their token count and
+    only the split pieces are counted again.
+    
+    Args:
+        documents: Parsed documents, grouped by file in order
+        max_tokens: Maximum tokens of one document
+        overlap_tokens: Overlap between the pieces of a split document
+        model: Model whose tokenizer counts the tokens
+    
+    Returns:
+        Documents ready for embedding
+    """
+    # Group by filename
+    files_map: Dict[str, List[Document]] = {}
+    for doc in documents:
+        files_map.setdefault(doc.source_filename, []).append(doc)
+
+    expanded_documents: List[Document] = []
+    for filename, docs in files_map.items():
+        if all(doc.token_count <= max_tokens for doc in docs):
+            expanded_documents.extend(docs)
+            continue
+
+        new_parts = []  # tuples (content, section_heading, code_snippet, metadata, token_count)
+        for doc in docs:
+            # If doc is small enough (by embedding model), keep as-is
+            if doc.token_count <= max_tokens:
+                new_parts.append((doc.content, doc.section_heading, doc.code_snippet, doc.metadata, doc.token_count))
+                continue
+
+            # Otherwise split into smaller pieces
+            subtexts = split_text_by_token_limit(doc.content, max_tokens, overlap_tokens, model=model)
+            for i, sub in enumerate(subtexts):
+                # keep the section heading only for the first subpart of this doc
+                heading = doc.section_heading if i == 0 else None
+                has_code = detect_code_snippets(sub)
+                new_parts.append((sub, heading, has_code, doc.metadata, count_tokens(sub, model=model)))
+
+        # Create Document objects with new chunk_count and chunk_index
+        total = len(new_parts)
+        for idx, (content, heading, has_code, metadata, token_count) in enumerate(new_parts):
+            expanded_documents.append(Document(
+                id=generate_doc_id(filename, idx),
+                content=content,
+                source_filename=filename,
+                chunk_index=idx,
+                chunk_count=total,
+                section_heading=heading,
+                token_count=token_count,
+                code_snippet=has_code,
+                metadata=metadata,
+                embedding=None
+            ))
+
+    return expanded_documents
+
+
 def check_manifest(
     files: List[Path],
     existing_manifest: Dict[str, FileManifest]
@@ -434,11 +614,16 @@ async def index_documents(full_reindex: bool = False) -> Dict[str, any]:
     
     logger.info(f"Processing {len(files_to_process)} files")
     
-    # Step 4: Parse documents
+    # Step 4: Parse documents, using the processor's chunks where they are current
+    chunk_records = load_chunks()
     all_documents = []
     for filepath in files_to_process:
         try:
-            docs = parse_document(filepath)
+            docs = None
+            if filepath.name in chunk_records:
+                docs = documents_from_chunks(filepath, chunk_records[filepath.name], config.embedding_model)
+            if docs is None:
+                docs = parse_document(filepath)
             all_documents.extend(docs)
         except Exception as e:
             logger.error(f"Failed to parse {filepath}: {e}")
@@ -452,61 +637,13 @@ async def index_documents(full_reindex: bool = False) -> Dict[str, any]:
     
     logger.info(f"Parsed {len(all_documents)} document chunks")
     
-    # Step 4.5: Ensure no document exceeds embedding model context length by
-    # splitting overly-large chunks. Rebuild documents per-file so chunk_count
-    # and chunk_index remain consistent for each source file.
-    embedding_model = config.embedding_model
-    # conservative per-model max token limits (fallback to 8192)
-    MODEL_MAX_TOKENS = {
-        "text-embedding-3-small": 8192,
-        "text-embedding-3-large": 8192,
-        "text-embedding-ada-002": 8192
-    }
-    max_tokens_allowed = MODEL_MAX_TOKENS.get(embedding_model, 8192)
-
-    expanded_documents: List[Document] = []
-    # Group by filename
-    files_map: Dict[str, List[Document]] = {}
-    for doc in all_documents:
-        files_map.setdefault(doc.source_filename, []).append(doc)
-
-    for filename, docs in files_map.items():
-        new_parts = []  # tuples (content, section_heading, code_snippet, metadata)
-
-        for doc in docs:
-            # If doc is small enough (by embedding model), keep as-is
-            if doc.token_count <= max_tokens_allowed:
-                new_parts.append((doc.content, doc.section_heading, doc.code_snippet, doc.metadata))
-                continue
-
-            # Otherwise split into smaller pieces
-            subtexts = split_text_by_token_limit(doc.content, max_tokens_allowed, config.chunk_overlap_tokens, model=embedding_model)
-            for i, sub in enumerate(subtexts):
-                # keep the section heading only for the first subpart of this doc
-                heading = doc.section_heading if i == 0 else None
-                has_code = detect_code_snippets(sub)
-                new_parts.append((sub, heading, has_code, doc.metadata))
-
-        # Create Document objects with new chunk_count and chunk_index
-        total = len(new_parts)
-        for idx, (content, heading, has_code, metadata) in enumerate(new_parts):
-            token_count = count_tokens(content, model=embedding_model)
-            doc_id = generate_doc_id(filename, idx)
-            new_doc = Document(
-                id=doc_id,
-                content=content,
-                source_filename=filename,
-                chunk_index=idx,
-                chunk_count=total,
-                section_heading=heading,
-                token_count=token_count,
-                code_snippet=has_code,
-                metadata=metadata,
-                embedding=None
-            )
-            expanded_documents.append(new_doc)
-
-    all_documents = expanded_documents
+    # Step 4.5: Ensure no document exceeds embedding model context length
+    all_documents = split_oversized_documents(
+        all_documents,
+        MODEL_MAX_TOKENS.get(config.embedding_model, 8192),
+        config.chunk_overlap_tokens,
+        config.embedding_model
+    )
 
     # Step 5: Estimate embedding cost
     avg_tokens = sum(doc.token_count for doc in all_documents) / len(all_documents)
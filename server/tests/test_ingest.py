@@ -2,6 +2,7 @@
 
 Tests parsing, chunking, code detection, and manifest diffing.
 """
+import json
 import pytest
 from pathlib import Path
 from datetime import datetime
@@ -9,7 +10,10 @@ from server.ingest import (
     parse_document,
     chunk_document,
     check_manifest,
-    extract_token_overlap
+    extract_token_overlap,
+    load_chunks,
+    documents_from_chunks,
+    split_oversized_documents
 )
 from server.models import FileManifest
 from server.utils import count_tokens, hash_string
@@ -342,6 +346,115 @@ def test_parse_generates_deterministic_ids(temp_markdown_file):
     assert docs1[0].id == docs2[0].id
 
 
+# Tests for processor chunks
+
+def write_chunks(tmp_path, content, token_model="text-embedding-3-small"):
+    """Write a processed file and its chunk records as the processor does."""
+    filepath = tmp_path / "processed_1_intro.md"
+    filepath.write_text(content, encoding="utf-8")
+    sections = ["## Intro\nPine basics.", "## Code Examples\n\n```pine\nplot(close)\n```"]
+    records = [
+        {
+            "file": filepath.name,
+            "file_sha256": hash_string(content),
+            "chunk_index": index,
+            "chunk_count": len(sections),
+            "heading": section.split("\n", 1)[0][3:],
+            "content": section,
+            "content_sha256": hash_string(section),
+            "token_count": 7,
+            "token_model": token_model,
+            "has_code": "```" in section,
+        }
+        for index, section in enumerate(sections)
+    ]
+    chunks_path = tmp_path / "processed_chunks.jsonl"
+    # Out of order on purpose: load_chunks sorts by chunk_index
+    chunks_path.write_text("".join(json.dumps(record) + "\n" for record in reversed(records)), encoding="utf-8")
+    return filepath, chunks_path
+
+
+def test_load_chunks_groups_records_by_file(tmp_path):
+    """Test loading the processor's chunks JSONL."""
+    content = "## Intro\nPine basics.\n\n## Code Examples\n\n```pine\nplot(close)\n```"
+    filepath, chunks_path = write_chunks(tmp_path, content)
+    
+    records = load_chunks(str(chunks_path))
+    
+    assert list(records) == [filepath.name]
+    assert [record["chunk_index"] for record in records[filepath.name]] == [0, 1]
+    assert load_chunks(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_documents_from_chunks(tmp_path):
+    """Test building documents from current chunk records without re-chunking."""
+    content = "## Intro\nPine basics.\n\n## Code Examples\n\n```pine\nplot(close)\n```"
+    filepath, chunks_path = write_chunks(tmp_path, content)
+    records = load_chunks(str(chunks_path))[filepath.name]
+    
+    docs = documents_from_chunks(filepath, records, "text-embedding-3-small")
+    
+    assert [doc.section_heading for doc in docs] == ["Intro", "Code Examples"]
+    assert [doc.chunk_index for doc in docs] == [0, 1]
+    assert all(doc.chunk_count == 2 for doc in docs)
+    assert [doc.code_snippet for doc in docs] == [False, True]
+    assert all(doc.token_count == 7 for doc in docs)  # reused, not recounted
+    assert docs[1].content == "## Code Examples\n\n```pine\nplot(close)\n```"
+    assert docs[0].metadata["chunked_by"] == "processor"
+    assert docs[1].metadata["content_sha256"] == hash_string(docs[1].content)
+
+
+def test_documents_from_chunks_rejects_stale_records(tmp_path):
+    """Test that records of an older version of the file are not used."""
+    content = "## Intro\nPine basics."
+    filepath, chunks_path = write_chunks(tmp_path, content)
+    records = load_chunks(str(chunks_path))[filepath.name]
+    
+    filepath.write_text(content + "\nEdited.", encoding="utf-8")
+    assert documents_from_chunks(filepath, records, "text-embedding-3-small") is None
+    
+    filepath.write_text(content, encoding="utf-8")
+    assert documents_from_chunks(filepath, records[1:], "text-embedding-3-small") is None
+
+
+def test_split_oversized_documents_keeps_documents_that_fit(tmp_path, monkeypatch):
+    """Test that documents within the limit keep their id and token count."""
+    content = "## Intro\nPine basics.\n\n## Code Examples\n\n```pine\nplot(close)\n```"
+    filepath, chunks_path = write_chunks(tmp_path, content)
+    docs = documents_from_chunks(filepath, load_chunks(str(chunks_path))[filepath.name], "text-embedding-3-small")
+    
+    def no_counting(text, model="gpt-4o"):
+        raise AssertionError("documents that fit are not counted again")
+    
+    monkeypatch.setattr("server.ingest.count_tokens", no_counting)
+    assert split_oversized_documents(docs, 8192, 100, "text-embedding-3-small") == docs
+    
+    # Only the pieces of a split document are counted
+    monkeypatch.setattr("server.ingest.count_tokens", lambda text, model="gpt-4o": len(text) // 4)
+    docs[1].content = "Plot the close. " * 20
+    docs[1].token_count = 80
+    split = split_oversized_documents(docs, 30, 1, "text-embedding-3-small")
+    assert split[0].id == docs[0].id and split[0].token_count == 7
+    assert len(split) > 2
+    assert [doc.chunk_index for doc in split] == list(range(len(split)))
+    assert all(doc.chunk_count == len(split) for doc in split)
+
+
+def test_chunk_document_counts_with_given_model(monkeypatch):
+    """Test that chunking counts tokens with the model it is given."""
+    models = []
+    
+    def counting(text, model="gpt-4o"):
+        models.append(model)
+        return len(text)
+    
+    monkeypatch.setattr("server.ingest.count_tokens", counting)
+    chunks = chunk_document("## One\nfirst\n## Two\nsecond", "test.md", 10, 2, model="text-embedding-3-small")
+    
+    assert len(chunks) == 2
+    assert set(models) == {"text-embedding-3-small"}
+
+
 # Tests for manifest checking
 
 def test_check_manifest_new_file(tmp_path, sample_manifest):
@@ -0,0 +1,47 @@
+"""Pytest configuration for the crawler/processor script tests.
+
+`1_scrap_docs.py` and `2_process_docs.py` start with a digit and can't be
+imported with a plain module name, so they are loaded by file path the same
+way `3_scrap_and_process.py` does.
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_script(name: str, filename: str):
+    spec = importlib.util.spec_from_file_location(name, REPO_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def scraper_mod():
+    """The loaded `1_scrap_docs.py` module (skipped if crawl4ai is missing)."""
+    pytest.importorskip("crawl4ai")
+    return load_script("_pinescraper_1", "1_scrap_docs.py")
+
+
+@pytest.fixture(scope="session")
+def processor_mod():
+    """The loaded `2_process_docs.py` module."""
+    return load_script("_pinescraper_2", "2_process_docs.py")
+
+
+@pytest.fixture(scope="session")
+def orchestrator_mod():
+    """The loaded `3_scrap_and_process.py` module."""
+    return load_script("_pinescraper_3", "3_scrap_and_process.py")
+
+
+@pytest.fixture(scope="session")
+def bench_processor_mod():
+    """The loaded `scripts/bench_processor.py` module, home of the regex reference processor."""
+    return load_script("_pinescraper_bench_processor", "scripts/bench_processor.py")
@@ -0,0 +1,442 @@
+"""Tests for PineScriptDocsProcessor in 2_process_docs.py."""
+import hashlib
+import json
+import os
+
+
+def make_processor(processor_mod, tmp_path, **kwargs):
+    input_dir = tmp_path / "unprocessed"
+    input_dir.mkdir()
+    return processor_mod.PineScriptDocsProcessor(str(input_dir), "processed", **kwargs)
+
+
+PAGE = (
+    "# 1_intro\n\nSource: https://example.com/intro\n\n"
+    "## Intro\nPine script basics.\n"
+    "## not a real heading\nstill part of the intro script text\n"
+    "### Details\nfunction details\n"
+    "## [Usage](https://example.com/intro#usage)\nCall the function with a value.\n"
+)
+
+
+def read_output(processor, name):
+    with open(os.path.join(processor.output_dir, name), encoding="utf-8") as f:
+        return f.read()
+
+
+LOOPS_PAGE = (
+    "# 1_loops\n\nSource: https://example.com/loops\n\n"
+    "## `for` loops\nCount with a for loop in the script.\n"
+    "### Details\nfunction details\n"
+    "## _while_ loops\nRepeat the script while the condition holds.\n"
+    "## \u200b`for...in`\u200b loops\nIterate over an array value.\n"
+)
+
+
+def test_sections_split_by_structure_sidecar(processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    (tmp_path / "unprocessed" / "1_loops.md").write_text(LOOPS_PAGE, encoding="utf-8")
+    # The HTML headings have lost the markdown's code and emphasis markers
+    structure = {"title": "Loops", "headings": [
+        {"level": 1, "text": "Loops", "anchor": None},
+        {"level": 2, "text": "for loops", "anchor": "for-loops"},
+        {"level": 3, "text": "Details", "anchor": "details"},
+        {"level": 2, "text": "while loops", "anchor": "while-loops"},
+        {"level": 2, "text": "for...in loops", "anchor": "for-in-loops"},
+    ], "toc": []}
+    (tmp_path / "unprocessed" / "1_loops.structure.json").write_text(json.dumps(structure), encoding="utf-8")
+
+    sections = processor.split_known_sections(LOOPS_PAGE, structure)
+    assert [title for title, _ in sections] == ["`for` loops", "_while_ loops", "\u200b`for...in`\u200b loops"]
+
+    text = read_output(processor, processor.process_file("1_loops.md"))
+    assert text.index("for loop in the script") < text.index("### Details") < text.index("Repeat the script while")
+    assert text.index("## _while_ loops") < text.index("## \u200b`for...in`\u200b loops")
+
+
+def test_unknown_heading_falls_back_to_heading_scan(processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    structure = {"headings": [{"level": 2, "text": "Intro"}, {"level": 2, "text": "Usage"}]}
+
+    # "## not a real heading" matches no H2 of the sidecar
+    assert processor.split_known_sections(PAGE, structure) == []
+    assert processor.process_text(PAGE, "1_intro.md", structure) == processor.process_text(PAGE, "1_intro.md")
+
+
+def test_sections_fall_back_to_heading_scan_without_sidecar(processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    (tmp_path / "unprocessed" / "1_intro.md").write_text(PAGE, encoding="utf-8")
+
+    sections = processor.split_known_sections(PAGE, {"headings": []})
+    assert sections == []
+
+    text = read_output(processor, processor.process_file("1_intro.md"))
+    # Every `## ` line starts a section for the heading scan
+    assert text.count("## not a real heading\n") == 1
+    assert "## Intro\nPine script basics." in text
+
+
+# Fragments that exercise every rule of the regex reference, including the
+# awkward overlaps (markers cut mid-line, `###`, links spanning lines)
+FUZZ_TOKENS = [
+    "##", "## ", "###", "[", "]", "(", ")", "\n", " ", "\t", "\r", "x", "pine script",
+    "* [", "Copyright © ", "TradingView", "On this page", "Version Version", "Auto",
+    "```", "pine", "@function", "@returns", "[^", "(https://", "\n## ",
+]
+
+
+def test_processor_matches_regex_reference_on_fuzzed_pages(processor_mod, bench_processor_mod, tmp_path):
+    import random
+
+    processor = make_processor(processor_mod, tmp_path)
+    reference = bench_processor_mod.process_text_regex
+    rng = random.Random(17)
+    for _ in range(3000):
+        page = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(0, 40)))
+        assert processor.process_text(page, "page.md") == reference(processor, page, "page.md"), repr(page)
+
+
+def test_processor_matches_regex_reference_on_docs(processor_mod, bench_processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    reference = bench_processor_mod.process_text_regex
+    pages = [PAGE, PAGE.replace("## ", "* [nav](x)\n## ", 1) + "Copyright © 2024 TradingView\nOn this page\n"]
+    docs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pinescript_docs", "processed")
+    if os.path.isdir(docs_dir):
+        for filename in sorted(os.listdir(docs_dir))[:20]:
+            with open(os.path.join(docs_dir, filename), encoding="utf-8") as f:
+                pages.append(f.read())
+    for page in pages:
+        assert processor.process_text(page, "page.md") == reference(processor, page, "page.md")
+
+
+def test_section_scan_is_linear_on_adversarial_pages(processor_mod, tmp_path):
+    import time
+
+    processor = make_processor(processor_mod, tmp_path)
+    # Each page is a few hundred KB. The regex takes minutes on the
+    # unclosed-bracket and missing-newline pages (every `##` rescans the rest
+    # of the text); a linear scan handles all of them in well under a second.
+    pages = {
+        "many headings": "## heading\npine body\n" * 20000,
+        "heading runs": "### a\n#### b\n##### c\n" * 20000,
+        "unclosed brackets": "## [" * 50000 + "\n",
+        "brackets without newline": "## [pine] " * 40000,
+        "headings without newline": ("##" + " " * 30) * 10000,
+        "bracket titles spanning lines": "## [a\n" * 40000 + "]\n",
+        "unclosed footnotes": "## pine\n" + "[^a\n" * 50000 + "]",
+        "unclosed links": "## pine\n" + "[a](" * 50000,
+    }
+    for name, page in pages.items():
+        started = time.monotonic()
+        processor.scan_sections(page)
+        processor.process_text(page, "page.md")
+        elapsed = time.monotonic() - started
+        assert elapsed < 5.0, f"{name}: {elapsed:.2f}s"
+
+
+def test_process_all_with_jobs_keeps_natural_order(processor_mod, tmp_path):
+    import argparse
+
+    names = ["10_ten", "2_two", "1_one", "3_three", "notes"]
+    for name in names:
+        (tmp_path / "unprocessed").mkdir(exist_ok=True)
+        (tmp_path / "unprocessed" / f"{name}.md").write_text(
+            f"# {name}\n\n## {name.title()}\nPine script page {name}.\n", encoding="utf-8")
+
+    combined = {}
+    for jobs in (1, 3):
+        processor = processor_mod.PineScriptDocsProcessor(str(tmp_path / "unprocessed"), "processed", jobs=jobs, force=True)
+        processor.combined_path = str(tmp_path / f"combined_{jobs}.md")
+        processor.process_all()
+        combined[jobs] = (tmp_path / f"combined_{jobs}.md").read_text(encoding="utf-8")
+        assert [filename for filename, _ in processor.timings] == [
+            "1_one.md", "2_two.md", "3_three.md", "10_ten.md", "notes.md"]
+        assert all(elapsed >= 0 for _, elapsed in processor.timings)
+
+    assert combined[3] == combined[1]
+    positions = [combined[3].index(f"# processed_{name}") for name in ["1_one", "2_two", "3_three", "10_ten", "notes"]]
+    assert positions == sorted(positions)
+
+    parser = argparse.ArgumentParser()
+    processor_mod.add_processor_arguments(parser)
+    kwargs = processor_mod.processor_kwargs_from_args(parser.parse_args(["--jobs", "0", "--no-combined"]))
+    assert kwargs == {"jobs": 0, "force": False, "combined": False, "dedupe": False, "token_diet": False,
+                      "chunks": False, "chunk_tokens": None, "embedding_model": None,
+                      "symbols": False}
+    assert processor_mod.PineScriptDocsProcessor(str(tmp_path / "unprocessed"), "processed", jobs=0).jobs >= 1
+
+
+def test_manifest_skips_unchanged_inputs(processor_mod, tmp_path, monkeypatch):
+    processor = make_processor(processor_mod, tmp_path)
+    processor.combined_path = str(tmp_path / "combined.md")
+    unprocessed = tmp_path / "unprocessed"
+    (unprocessed / "1_intro.md").write_text(PAGE, encoding="utf-8")
+    (unprocessed / "2_empty.md").write_text("# 2_empty\n\nnothing here\n", encoding="utf-8")
+
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["1_intro.md", "2_empty.md"]
+    output = tmp_path / "processed" / "processed_1_intro.md"
+    manifest = json.loads((tmp_path / "processing_manifest.json").read_text(encoding="utf-8"))["files"]
+    assert manifest["1_intro.md"]["output"] == "processed_1_intro.md"
+    assert manifest["1_intro.md"]["processor_version"] == processor_mod.PROCESSOR_VERSION
+    assert manifest["2_empty.md"]["output"] is None
+    mtime = output.stat().st_mtime_ns
+
+    # Nothing changed: nothing is processed, the combined file still lists the page
+    processor.process_all()
+    assert processor.timings == []
+    assert output.stat().st_mtime_ns == mtime
+    assert "# processed_1_intro" in (tmp_path / "combined.md").read_text(encoding="utf-8")
+
+    # An edited input, a new structure sidecar or a touched output are rebuilt
+    (unprocessed / "2_empty.md").write_text("# 2_empty\n\nA pine script page\n", encoding="utf-8")
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["2_empty.md"]
+    (unprocessed / "1_intro.structure.json").write_text(json.dumps({"headings": []}), encoding="utf-8")
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["1_intro.md"]
+    output.write_text("edited", encoding="utf-8")
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["1_intro.md"]
+    assert output.read_text(encoding="utf-8") != "edited"
+
+    # A different processor version, or --force, rebuilds everything
+    monkeypatch.setattr(processor_mod, "PROCESSOR_VERSION", "changed")
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["1_intro.md", "2_empty.md"]
+    processor.force = True
+    processor.process_all()
+    assert len(processor.timings) == 2
+
+    # Removed inputs drop out of the manifest, and their outputs with them
+    assert (tmp_path / "processed" / "processed_2_empty.md").exists()
+    (unprocessed / "2_empty.md").unlink()
+    processor.process_all()
+    manifest = json.loads((tmp_path / "processing_manifest.json").read_text(encoding="utf-8"))["files"]
+    assert sorted(manifest) == ["1_intro.md"]
+    assert sorted(os.listdir(tmp_path / "processed")) == ["processed_1_intro.md"]
+    assert "processed_2_empty" not in (tmp_path / "combined.md").read_text(encoding="utf-8")
+
+
+def test_inputs_follow_the_crawler_page_order(processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    unprocessed = tmp_path / "unprocessed"
+    for name in ["welcome", "language_loops", "concepts_alerts", "1_legacy"]:
+        (unprocessed / f"{name}.md").write_text(f"# {name}\n\n## Page\nPine script page.\n", encoding="utf-8")
+    (unprocessed / "page_order.json").write_text(json.dumps(
+        {"files": ["welcome.md", "concepts_alerts.md", "gone.md", "language_loops.md"]}), encoding="utf-8")
+
+    assert processor.input_files() == ["welcome.md", "concepts_alerts.md", "language_loops.md", "1_legacy.md"]
+
+
+def test_combined_file_is_concatenated_or_skipped(processor_mod, tmp_path, monkeypatch):
+    processor = make_processor(processor_mod, tmp_path)
+    processor.combined_path = str(tmp_path / "combined.md")
+    pages = {"processed_1_a.md": "## A\npine ü\n" * 5000, "processed_2_b.md": "## B\nscript\n"}
+    for name, text in pages.items():
+        (tmp_path / "processed" / name).write_text(text, encoding="utf-8")
+    expected = "".join(f"\n\n# {name[:-3]}\n\n{text}\n\n---\n\n" for name, text in pages.items())
+
+    processor.write_combined(list(pages))
+    assert (tmp_path / "combined.md").read_text(encoding="utf-8") == expected
+
+    # Without sendfile the files are copied through a buffer instead
+    def no_sendfile(*args):
+        raise OSError("sendfile not supported")
+    monkeypatch.setattr(processor_mod.os, "sendfile", no_sendfile)
+    (tmp_path / "combined.md").unlink()
+    processor.write_combined(list(pages))
+    assert (tmp_path / "combined.md").read_text(encoding="utf-8") == expected
+    assert not os.path.exists(f"{processor.combined_path}.tmp")
+
+    (tmp_path / "combined.md").unlink()
+    (tmp_path / "unprocessed" / "1_intro.md").write_text(PAGE, encoding="utf-8")
+    processor.combined = False
+    processor.process_all()
+    assert (tmp_path / "processed" / "processed_1_intro.md").exists()
+    assert not (tmp_path / "combined.md").exists()
+
+
+DEDUPE_PAGE = (
+    "# 4_functions\n\n"
+    "## Declaring functions\nA Pine script function:\n"
+    "```pine\n// @function Doubles a value\n// @returns The doubled value\ndouble(x) => x * 2\n```\n"
+    "The same example again:\n```pine\n// @function Doubles a value\n// @returns The doubled value\ndouble(x) => x * 2\n```\n"
+    "## Misc\n```\nx = 1\n```\n"
+)
+
+
+def test_dedupe_stores_each_code_block_once(processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    processor.combined_path = str(tmp_path / "combined.md")
+    (tmp_path / "unprocessed" / "4_functions.md").write_text(DEDUPE_PAGE, encoding="utf-8")
+
+    full = processor.process_text(DEDUPE_PAGE, "4_functions.md")
+    assert full.count("double(x) => x * 2") == 4
+    processor.dedupe = True
+    text = processor.process_text(DEDUPE_PAGE, "4_functions.md")
+
+    # The section keeps its code, the appendices point back at it
+    assert text.count("double(x) => x * 2") == 2
+    assert '- 1 code block in "## Declaring functions"' in text
+    assert '- 1 function doc in "## Declaring functions"' in text
+    # Code that only appears in a dropped section is still stored once
+    assert text.count("x = 1") == 1
+    assert text.index("## Code Examples") < text.index("```pine\nx = 1\n```")
+
+    processor.process_all()
+    [(filename, before, after)] = processor.token_savings
+    assert filename == "4_functions.md" and after < before
+    output = (tmp_path / "processed" / "processed_4_functions.md").read_text(encoding="utf-8")
+    assert output == text
+
+    # Switching the mode off rebuilds the file despite the unchanged input
+    processor.dedupe = False
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["4_functions.md"]
+    assert processor.token_savings == []
+    assert (tmp_path / "processed" / "processed_4_functions.md").read_text(encoding="utf-8") == full
+
+
+DIET_PAGE = (
+    "# 5_first-indicator\n\n"
+    "## * Introduction\nA Pine script example:  \n\n\n\n"
+    "Pine Script®\nCopied\n`//@version=6  \nindicator(\"MACD\")  \n\n\nplot(close)  \n`\n"
+    "!image\nIt plots the close.\n"
+    " Previous   Next To Pine Script® version 5\n"
+    "```pine\na = 1\n\n\nb = 2\n```\n"
+)
+
+
+def test_token_diet_compacts_boilerplate(processor_mod, tmp_path, capsys):
+    processor = make_processor(processor_mod, tmp_path, chunks=True, symbols=True)
+    processor.combined_path = str(tmp_path / "combined.md")
+    (tmp_path / "unprocessed" / "5_first-indicator.md").write_text(DIET_PAGE, encoding="utf-8")
+
+    processor.token_diet = True
+    text = processor.process_text(DIET_PAGE, "5_first-indicator.md")
+
+    assert text.startswith("## Introduction\nA Pine script example:\n\n```pine\n//@version=6\nindicator(\"MACD\")\n\n\nplot(close)\n```\n")
+    assert "Copied" not in text and "!image" not in text and "Previous" not in text
+    # Code is left alone apart from trailing whitespace
+    assert "a = 1\n\n\nb = 2" in text
+    assert not any(line != line.rstrip() for line in text.splitlines())
+
+    # A widget that never closes is left as it is
+    unclosed = processor.apply_token_diet("Pine Script®\nCopied\n`x = 1\nmore text")
+    assert unclosed == "Pine Script®\nCopied\n`x = 1\nmore text"
+
+    capsys.readouterr()
+    processor.process_all()
+    [(filename, before, after)] = processor.token_savings
+    assert filename == "5_first-indicator.md" and after < before
+    # Only the options that change the token count name the savings
+    assert f"\ntoken_diet saved {before - after} of {before} tokens" in capsys.readouterr().out
+
+
+def test_chunks_jsonl_follows_processed_sections(processor_mod, tmp_path, monkeypatch):
+    # Chunk size and tokenizer follow the server config, like ingest
+    for name, value in (("SUPABASE_URL", "https://example.supabase.co"), ("SUPABASE_SERVICE_ROLE_KEY", "key"),
+                        ("OPENAI_API_KEY", "key"), ("CHUNK_TOKEN_THRESHOLD", "1234")):
+        monkeypatch.setenv(name, value)
+    configured = processor_mod.PineScriptDocsProcessor(str(tmp_path / "configured" / "unprocessed"), "processed", chunks=True)
+    assert configured.chunk_tokens == 1234
+    monkeypatch.delenv("OPENAI_API_KEY")
+    assert processor_mod.ingest_chunk_settings() == (1500, "text-embedding-3-small")
+
+    processor = make_processor(processor_mod, tmp_path, chunks=True)
+    processor.combined_path = str(tmp_path / "combined.md")
+    unprocessed = tmp_path / "unprocessed"
+    (unprocessed / "1_intro.md").write_text(PAGE, encoding="utf-8")
+    (unprocessed / "4_functions.md").write_text(DEDUPE_PAGE, encoding="utf-8")
+
+    def read_chunks():
+        with open(processor.chunks_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    # Small files are a single chunk without a heading, as ingest would make them
+    processor.process_all()
+    records = read_chunks()
+    assert [(r["file"], r["chunk_index"], r["chunk_count"], r["heading"]) for r in records] == [
+        ("processed_1_intro.md", 0, 1, None), ("processed_4_functions.md", 0, 1, None)]
+    text = read_output(processor, "processed_4_functions.md")
+    assert records[1]["content"] == text
+    assert records[1]["file_sha256"] == records[1]["content_sha256"]
+    assert records[1]["has_code"] and records[1]["token_count"] > 0
+
+    # Larger files get a chunk per section and appendix the processor wrote
+    processor.chunk_tokens = 10
+    processor.process_all()
+    records = read_chunks()
+    functions = [r for r in records if r["file"] == "processed_4_functions.md"]
+    assert [r["heading"] for r in functions] == ["Declaring functions", "Code Examples", "Function Documentation"]
+    assert [r["chunk_index"] for r in functions] == [0, 1, 2]
+    assert all(r["chunk_count"] == 3 for r in functions)
+    assert functions[0]["content"].startswith("## Declaring functions\nA Pine script function:")
+    assert functions[1]["content"].startswith("## Code Examples\n\n\n```pine")
+    assert all(r["content"] in text for r in functions)
+
+    # Unchanged inputs keep their chunks from the previous run
+    (unprocessed / "1_intro.md").write_text(PAGE + "More pine script.\n", encoding="utf-8")
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["1_intro.md"]
+    assert [r for r in read_chunks() if r["file"] == "processed_4_functions.md"] == functions
+
+
+SYMBOL_PAGE = (
+    "# 6_strategies\n\n"
+    "## Entries\nA Pine script strategy enters with strategy.entry() and reads "
+    "strategy.commission.percent, e.g. after ta.sma(close, 14).\n"
+    "See https://www.tradingview.com/pine-script-reference/v6/#fun_ta.ema and plot.style_*.\n"
+    "## Data\nThe request.security() function value:\n"
+    "```pine\nhtf = request.security(syminfo.tickerid, \"D\", ta.sma(close, 10))\nmy.ta.rsi = 1\n```\n"
+)
+
+
+def test_symbol_index_maps_identifiers_to_sections(processor_mod, tmp_path):
+    processor = make_processor(processor_mod, tmp_path)
+    processor.combined_path = str(tmp_path / "combined.md")
+    processor.symbols = True
+    unprocessed = tmp_path / "unprocessed"
+    (unprocessed / "1_intro.md").write_text(PAGE, encoding="utf-8")
+    (unprocessed / "6_strategies.md").write_text(SYMBOL_PAGE, encoding="utf-8")
+
+    def lookup(identifier):
+        with open(processor.symbols_path, encoding="utf-8") as f:
+            index = json.load(f)
+        rows = [index["sections"][row] for row in index["symbols"].get(identifier, [])]
+        return [(index["files"][file_index], heading, chunk_index, chunk_sha256)
+                for file_index, heading, chunk_index, chunk_sha256 in rows]
+
+    processor.process_all()
+    with open(processor.symbols_path, encoding="utf-8") as f:
+        index = json.load(f)
+    assert sorted(index["symbols"]) == [
+        "request.security", "strategy.commission.percent", "strategy.entry", "syminfo.tickerid", "ta.sma"]
+    assert lookup("strategy.entry") == [("processed_6_strategies.md", "Entries", None, None)]
+    assert lookup("ta.sma") == [
+        ("processed_6_strategies.md", "Entries", None, None),
+        ("processed_6_strategies.md", "Data", None, None),
+        ("processed_6_strategies.md", "Code Examples", None, None),
+    ]
+
+    # With chunks, rows carry the chunk's index and content hash
+    processor.chunks = True
+    processor.chunk_tokens = 10
+    processor.process_all()
+    [(file, heading, chunk_index, chunk_sha256)] = lookup("strategy.entry")
+    assert (file, heading, chunk_index) == ("processed_6_strategies.md", "Entries", 0)
+    with open(processor.chunks_path, encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f]
+    [chunk] = [c for c in chunks if c["content_sha256"] == chunk_sha256]
+    assert (chunk["file"], chunk["chunk_index"]) == (file, chunk_index)
+    assert "strategy.entry" in chunk["content"]
+    assert chunk_sha256 == hashlib.sha256(chunk["content"].encode("utf-8")).hexdigest()
+
+    # Unchanged files keep their rows across incremental runs
+    before = lookup("request.security")
+    (unprocessed / "1_intro.md").write_text(PAGE + "Uses math.max.\n", encoding="utf-8")
+    processor.process_all()
+    assert [name for name, _ in processor.timings] == ["1_intro.md"]
+    assert lookup("request.security") == before
+    assert lookup("math.max")[0][:2] == ("processed_1_intro.md", "Usage")
@@ -0,0 +1,126 @@
+"""Tests for the crawl/process orchestration in 3_scrap_and_process.py."""
+import asyncio
+import json
+import os
+import sys
+
+
+PAGE = """# {index}_{name}
+
+Source: https://www.tradingview.com/pine-script-docs/{name}
+
+## {title}
+This page documents a Pine Script function.
+"""
+
+
+class FakeCrawler:
+    """Writes canned pages and reports them on the queue like crawl_docs does.
+
+    Pages are saved out of order to check the combined file is still ordered.
+    """
+
+    def __init__(self, unprocessed_dir, names):
+        self.unprocessed_dir = unprocessed_dir
+        self.names = names
+        self.processed_during_crawl = None
+
+    async def run(self, page_queue=None):
+        order = list(enumerate(self.names, start=1))[::-1]
+        for index, name in order:
+            file_name = f"{index}_{name}.md"
+            with open(os.path.join(self.unprocessed_dir, file_name), "w", encoding="utf-8") as f:
+                f.write(PAGE.format(index=index, name=name, title=name.title()))
+            page_queue.put_nowait((index, file_name))
+            await asyncio.sleep(0.02)
+        self.processed_during_crawl = len(os.listdir(os.path.join(self.unprocessed_dir, "..", "processed")))
+
+
+def test_pipeline_processes_pages_while_crawling(orchestrator_mod, processor_mod, tmp_path):
+    unprocessed = tmp_path / "pinescript_docs" / "unprocessed"
+    unprocessed.mkdir(parents=True)
+    processor = processor_mod.PineScriptDocsProcessor(str(unprocessed), "processed")
+    processor.combined_path = str(tmp_path / "processed_all_docs.md")
+    crawler = FakeCrawler(str(unprocessed), ["alpha", "beta", "gamma"])
+
+    asyncio.run(orchestrator_mod.run_pipeline(crawler, processor, verbose=False))
+
+    # Processing overlapped with the crawl instead of starting after it
+    assert crawler.processed_during_crawl >= 2
+    combined = (tmp_path / "processed_all_docs.md").read_text(encoding="utf-8")
+    positions = [combined.index(f"# processed_{i}_{name}") for i, name in enumerate(["alpha", "beta", "gamma"], 1)]
+    assert positions == sorted(positions)
+
+
+def test_process_only_reads_the_crawler_output_dir(orchestrator_mod, scraper_mod, processor_mod, tmp_path, monkeypatch):
+    # main() loads the scripts itself; keep the session's modules registered afterwards
+    monkeypatch.setitem(sys.modules, "_pinescraper_1", scraper_mod)
+    monkeypatch.setitem(sys.modules, "_pinescraper_2", processor_mod)
+    unprocessed = tmp_path / "docs" / "unprocessed"
+    unprocessed.mkdir(parents=True)
+    (unprocessed / "1_alpha.md").write_text(PAGE.format(index=1, name="alpha", title="Alpha"), encoding="utf-8")
+
+    orchestrator_mod.main(["--process-only", "--no-verbose", "--no-combined", "--output-dir", str(tmp_path / "docs")])
+
+    assert (tmp_path / "docs" / "processed" / "processed_1_alpha.md").exists()
+
+
+def test_combined_file_stays_in_a_custom_output_dir(orchestrator_mod, scraper_mod, processor_mod, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "_pinescraper_1", scraper_mod)
+    monkeypatch.setitem(sys.modules, "_pinescraper_2", processor_mod)
+    repo_combined = os.path.join(os.path.dirname(processor_mod.__file__), "processed_all_docs.md")
+    repo_mtime = os.stat(repo_combined).st_mtime_ns if os.path.exists(repo_combined) else None
+    unprocessed = tmp_path / "docs" / "unprocessed"
+    unprocessed.mkdir(parents=True)
+    (unprocessed / "1_alpha.md").write_text(PAGE.format(index=1, name="alpha", title="Alpha"), encoding="utf-8")
+
+    orchestrator_mod.main(["--process-only", "--no-verbose", "--output-dir", str(tmp_path / "docs")])
+
+    assert "# processed_1_alpha" in (tmp_path / "docs" / "processed_all_docs.md").read_text(encoding="utf-8")
+    assert (os.stat(repo_combined).st_mtime_ns if os.path.exists(repo_combined) else None) == repo_mtime
+
+
+def test_pipeline_processes_in_worker_processes(orchestrator_mod, processor_mod, tmp_path):
+    unprocessed = tmp_path / "pinescript_docs" / "unprocessed"
+    unprocessed.mkdir(parents=True)
+    processor = processor_mod.PineScriptDocsProcessor(str(unprocessed), "processed", jobs=2)
+    processor.combined_path = str(tmp_path / "processed_all_docs.md")
+    names = ["alpha", "beta", "gamma"]
+
+    asyncio.run(orchestrator_mod.run_pipeline(FakeCrawler(str(unprocessed), names), processor,
+                                              verbose=False, workers=processor.jobs))
+
+    combined = (tmp_path / "processed_all_docs.md").read_text(encoding="utf-8")
+    positions = [combined.index(f"# processed_{i}_{name}") for i, name in enumerate(names, 1)]
+    assert positions == sorted(positions)
+
+
+def test_pipeline_writes_chunks_symbols_and_manifest(orchestrator_mod, processor_mod, tmp_path, capsys):
+    unprocessed = tmp_path / "pinescript_docs" / "unprocessed"
+    unprocessed.mkdir(parents=True)
+    processor = processor_mod.PineScriptDocsProcessor(str(unprocessed), "processed", chunks=True, symbols=True,
+                                                      combined=False)
+    names = ["alpha", "beta"]
+
+    asyncio.run(orchestrator_mod.run_pipeline(FakeCrawler(str(unprocessed), names), processor, verbose=False))
+
+    with open(processor.chunks_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["file"] for record in records] == ["processed_1_alpha.md", "processed_2_beta.md"]
+    assert sorted(processor.load_manifest()) == ["1_alpha.md", "2_beta.md"]
+    assert sorted(processor.load_symbol_sections()) == ["processed_1_alpha.md", "processed_2_beta.md"]
+
+    # A later process_all finds the pipeline's outputs up to date
+    capsys.readouterr()
+    processor.process_all()
+    assert "Skipping 2 unchanged file(s)" in capsys.readouterr().out
+
+    # So does a later pipeline run, which reuses the outputs and their records
+    mtime = (tmp_path / "pinescript_docs" / "processed" / "processed_1_alpha.md").stat().st_mtime_ns
+    asyncio.run(orchestrator_mod.run_pipeline(FakeCrawler(str(unprocessed), names), processor, verbose=True))
+    assert "0 files processed, 2 unchanged" in capsys.readouterr().out
+    assert (tmp_path / "pinescript_docs" / "processed" / "processed_1_alpha.md").stat().st_mtime_ns == mtime
+    with open(processor.chunks_path, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == records
+    assert sorted(processor.load_manifest()) == ["1_alpha.md", "2_beta.md"]
+    assert sorted(processor.load_symbol_sections()) == ["processed_1_alpha.md", "processed_2_beta.md"]
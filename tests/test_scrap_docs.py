@@ -0,0 +1,824 @@
+"""Tests for the crawler in 1_scrap_docs.py using a fake AsyncWebCrawler."""
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+
+class FakeWebCrawler:
+    """Stand-in for AsyncWebCrawler that serves canned markdown per URL.
+
+    `delays` lets a test make early URLs finish after later ones and
+    `failures` maps a URL to status codes returned before it succeeds.
+    """
+
+    pages = {}
+    delays = {}
+    failures = {}
+    rendered = []
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, config=None, **kwargs):
+        self.config = config
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def arun(self, url, config=None, **kwargs):
+        cls = type(self)
+        cls.rendered.append(url)
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            await asyncio.sleep(cls.delays.get(url, 0))
+        finally:
+            cls.in_flight -= 1
+        if cls.failures.get(url):
+            status = cls.failures[url].pop(0)
+            return SimpleNamespace(success=False, markdown=None, html="", error_message=str(status), status_code=status)
+        if url not in cls.pages:
+            return SimpleNamespace(success=False, markdown=None, html="", error_message="404", status_code=404)
+        return SimpleNamespace(success=True, markdown=cls.pages[url], html="", error_message=None, status_code=200)
+
+
+@pytest.fixture
+def fake_crawler(scraper_mod, monkeypatch):
+    FakeWebCrawler.pages = {}
+    FakeWebCrawler.delays = {}
+    FakeWebCrawler.failures = {}
+    FakeWebCrawler.rendered = []
+    FakeWebCrawler.in_flight = 0
+    FakeWebCrawler.max_in_flight = 0
+    monkeypatch.setattr(scraper_mod, "AsyncWebCrawler", FakeWebCrawler)
+    return FakeWebCrawler
+
+
+@pytest.fixture
+def http_handler(scraper_mod, monkeypatch):
+    """Route the crawler's httpx client through a MockTransport.
+
+    Tests assign `holder["handler"]`; by default every request gets a 200.
+    """
+    holder = {"handler": lambda request: httpx.Response(200, text="<html></html>")}
+    real_client = httpx.AsyncClient
+
+    def client_factory(**kwargs):
+        transport = httpx.MockTransport(lambda request: holder["handler"](request))
+        return real_client(transport=transport, **kwargs)
+
+    monkeypatch.setattr(scraper_mod.httpx, "AsyncClient", client_factory)
+    return holder
+
+
+def make_crawler(scraper_mod, tmp_path, **kwargs):
+    crawler = scraper_mod.PineScriptDocsCrawler(**kwargs)
+    crawler.output_dir = str(tmp_path / "pinescript_docs")
+    return crawler
+
+
+def test_token_bucket_limits_rate(scraper_mod):
+    bucket = scraper_mod.TokenBucket(rate=50, capacity=1)
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(take(6))
+    # One token is available up front, the other five refill at 50/s
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_token_bucket_disabled(scraper_mod):
+    bucket = scraper_mod.TokenBucket(rate=0)
+    start = time.monotonic()
+    asyncio.run(bucket.acquire())
+    assert time.monotonic() - start < 0.05
+
+
+def test_crawl_docs_keeps_navbar_order(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first", f"{base}/a/second", f"{base}/a/missing", f"{base}/a/fourth"]
+    fake_crawler.pages = {
+        urls[0]: "first body",
+        urls[1]: "second body",
+        urls[3]: "fourth body",
+    }
+    # The first page finishes last
+    fake_crawler.delays = {urls[0]: 0.05}
+
+    crawler = make_crawler(scraper_mod, tmp_path, concurrency=4, rate_limit=0)
+    asyncio.run(crawler.crawl_docs(urls))
+
+    assert fake_crawler.max_in_flight > 1
+    unprocessed = sorted(os.listdir(os.path.join(crawler.output_dir, "unprocessed")))
+    assert [name.split("_")[0] for name in unprocessed] == ["1", "2", "4"]
+
+    combined = [f for f in os.listdir(crawler.output_dir) if f.startswith("all_docs_")][0]
+    with open(os.path.join(crawler.output_dir, combined), encoding="utf-8") as f:
+        text = f.read()
+    assert text.index("# 1_first") < text.index("# 2_second") < text.index("# 4_fourth")
+
+    failed = [f for f in os.listdir(crawler.output_dir) if f.startswith("failed_urls_")][0]
+    with open(os.path.join(crawler.output_dir, failed), encoding="utf-8") as f:
+        assert f.read().startswith(urls[2])
+
+
+def test_incremental_crawl_skips_unchanged_pages(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first", f"{base}/a/second"]
+    fake_crawler.pages = {urls[0]: "first body", urls[1]: "second body"}
+
+    def first_run(request):
+        return httpx.Response(200, headers={"ETag": f'"{request.url.path}"'}, text=str(request.url))
+
+    http_handler["handler"] = first_run
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, incremental=True)
+    asyncio.run(crawler.crawl_docs(urls))
+    assert fake_crawler.rendered == urls
+
+    unprocessed = os.path.join(crawler.output_dir, "unprocessed")
+    written = sorted(os.listdir(unprocessed))
+    with open(os.path.join(crawler.output_dir, "crawl_state.json"), encoding="utf-8") as f:
+        state = json.load(f)["pages"]
+    assert state[urls[0]]["etag"] == '"/pine-script-docs/a/first"'
+    assert state[urls[0]]["file"] == written[0]
+
+    # Second run: the first page answers 304, the second page changed
+    def second_run(request):
+        if request.headers.get("If-None-Match") == '"/pine-script-docs/a/first"':
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": '"v2"'}, text="changed")
+
+    http_handler["handler"] = second_run
+    fake_crawler.rendered = []
+    fake_crawler.pages[urls[1]] = "second body, edited"
+    time.sleep(1)  # new run timestamp
+    asyncio.run(crawler.crawl_docs(urls))
+
+    assert fake_crawler.rendered == [urls[1]]
+    after = sorted(os.listdir(unprocessed))
+    # The superseded file of the changed page is replaced, the unchanged one kept
+    assert written[0] in after
+    assert written[1] not in after
+    assert len(after) == 2
+
+    combined = sorted(f for f in os.listdir(crawler.output_dir) if f.startswith("all_docs_"))[-1]
+    with open(os.path.join(crawler.output_dir, combined), encoding="utf-8") as f:
+        text = f.read()
+    assert "first body" in text and "second body, edited" in text
+
+
+def test_failed_render_does_not_store_new_validators(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first"]
+    fake_crawler.pages = {urls[0]: "v1 body"}
+    version = {"etag": '"v1"'}
+
+    def handler(request):
+        if request.headers.get("If-None-Match") == version["etag"]:
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": version["etag"]}, text=version["etag"])
+
+    http_handler["handler"] = handler
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, incremental=True, naming="stable", max_retries=0)
+    asyncio.run(crawler.crawl_docs(urls))
+
+    # The page changes but its render fails once
+    version["etag"] = '"v2"'
+    fake_crawler.pages[urls[0]] = "v2 body"
+    fake_crawler.failures = {urls[0]: [404]}
+    asyncio.run(crawler.crawl_docs(urls))
+    state = scraper_mod.CrawlState(os.path.join(crawler.output_dir, "crawl_state.json"))
+    assert state.get(urls[0])["etag"] is None
+
+    fake_crawler.rendered = []
+    asyncio.run(crawler.crawl_docs(urls))
+    assert fake_crawler.rendered == urls
+    page_path = os.path.join(crawler.output_dir, "unprocessed", "a_first.md")
+    assert crawler.read_page_file(page_path) == "v2 body"
+
+
+def test_http_fetch_mode_falls_back_to_browser(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/static", f"{base}/a/dynamic"]
+    fake_crawler.pages = {urls[1]: "rendered by the browser"}
+
+    def handler(request):
+        if request.url.path.endswith("/static"):
+            return httpx.Response(200, text="<html><body><nav>menu</nav><main><div>"
+                                            "<h1>Static page</h1><p>Served without a browser.</p>"
+                                            "</div></main></body></html>")
+        return httpx.Response(200, text="<html><body><div id='app'></div></body></html>")
+
+    http_handler["handler"] = handler
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, fetch_mode="http")
+    asyncio.run(crawler.crawl_docs(urls))
+
+    assert fake_crawler.rendered == [urls[1]]
+    unprocessed = os.path.join(crawler.output_dir, "unprocessed")
+    static_file = [f for f in os.listdir(unprocessed) if f.startswith("1_static") and f.endswith(".md")][0]
+    with open(os.path.join(unprocessed, static_file), encoding="utf-8") as f:
+        text = f.read()
+    assert "# Static page" in text
+    assert "Served without a browser." in text
+    assert "menu" not in text
+
+
+def test_http_discovery_reads_static_nav(scraper_mod, fake_crawler, http_handler, tmp_path):
+    http_handler["handler"] = lambda request: httpx.Response(200, text=(
+        "<html><body><nav class='sidebar'>"
+        "<a href='/pine-script-docs/welcome'>Welcome</a>"
+        "<a href='/pine-script-docs/language/loops#for'>Loops</a>"
+        "<a href='https://example.com/elsewhere'>External</a>"
+        "</nav></body></html>"))
+    crawler = make_crawler(scraper_mod, tmp_path, fetch_mode="http")
+
+    urls = asyncio.run(crawler.get_all_doc_urls())
+
+    assert urls == [
+        "https://www.tradingview.com/pine-script-docs/welcome",
+        "https://www.tradingview.com/pine-script-docs/language/loops",
+    ]
+    assert fake_crawler.rendered == []
+
+
+class SimulatedCrash(BaseException):
+    """Escapes the crawler's per-page error handling like a killed process would."""
+
+
+def test_resume_continues_interrupted_crawl(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/p{i}" for i in range(1, 5)]
+    fake_crawler.pages = {url: f"body {i}" for i, url in enumerate(urls, start=1)}
+    crawler = make_crawler(scraper_mod, tmp_path, concurrency=1, rate_limit=0, resume=True)
+
+    original_arun = fake_crawler.arun
+
+    async def crashing_arun(self, url, config=None, **kwargs):
+        if url == urls[2]:
+            raise SimulatedCrash()
+        return await original_arun(self, url, config=config, **kwargs)
+
+    fake_crawler.arun = crashing_arun
+    try:
+        with pytest.raises(SimulatedCrash):
+            asyncio.run(crawler.crawl_docs(urls))
+    finally:
+        fake_crawler.arun = original_arun
+
+    run = scraper_mod.CrawlJournal(crawler.journal_path).last_incomplete_run()
+    assert run["urls"] == urls
+    assert sorted(run["pages"]) == [1, 2]
+
+    fake_crawler.rendered = []
+    asyncio.run(crawler.run())
+
+    assert fake_crawler.rendered == urls[2:]
+    assert scraper_mod.CrawlJournal(crawler.journal_path).last_incomplete_run() is None
+    unprocessed = sorted(os.listdir(os.path.join(crawler.output_dir, "unprocessed")))
+    assert len(unprocessed) == 4
+    assert len({name.rsplit("_", 2)[-2] for name in unprocessed}) == 1  # one run timestamp
+
+    combined = [f for f in os.listdir(crawler.output_dir) if f.startswith("all_docs_")][0]
+    with open(os.path.join(crawler.output_dir, combined), encoding="utf-8") as f:
+        text = f.read()
+    assert [text.index(f"body {i}") for i in range(1, 5)] == sorted(text.index(f"body {i}") for i in range(1, 5))
+
+
+def test_stable_naming_keeps_unchanged_files(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first", f"{base}/a/second"]
+    fake_crawler.pages = {urls[0]: "first body", urls[1]: "second body"}
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, naming="stable")
+
+    asyncio.run(crawler.crawl_docs(urls))
+
+    unprocessed = os.path.join(crawler.output_dir, "unprocessed")
+    assert sorted(os.listdir(unprocessed)) == ["a_first.md", "a_first.sha256", "a_second.md", "a_second.sha256",
+                                               "page_order.json"]
+    first_path = os.path.join(unprocessed, "a_first.md")
+    assert crawler.read_hash_sidecar(first_path) == scraper_mod.sha256_text("first body")
+    first_mtime = os.stat(first_path).st_mtime_ns
+
+    fake_crawler.pages[urls[1]] = "second body, edited"
+    time.sleep(0.01)
+    asyncio.run(crawler.crawl_docs(urls))
+
+    assert sorted(os.listdir(unprocessed)) == ["a_first.md", "a_first.sha256", "a_second.md", "a_second.sha256",
+                                               "page_order.json"]
+    assert os.stat(first_path).st_mtime_ns == first_mtime
+    second_path = os.path.join(unprocessed, "a_second.md")
+    assert crawler.read_page_file(second_path) == "second body, edited"
+    assert crawler.read_hash_sidecar(second_path) == scraper_mod.sha256_text("second body, edited")
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_stable_naming_keeps_names_when_the_nav_changes(scraper_mod, fake_crawler, http_handler, tmp_path, incremental):
+    base = "https://www.tradingview.com/pine-script-docs"
+    a, b, x = f"{base}/a/A", f"{base}/a/B", f"{base}/b/X"
+    fake_crawler.pages = {a: "a body", b: "b body", x: "x body"}
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, naming="stable", incremental=incremental)
+    asyncio.run(crawler.crawl_docs([a, b]))
+    unprocessed = os.path.join(crawler.output_dir, "unprocessed")
+    a_mtime = os.stat(os.path.join(unprocessed, "a_A.md")).st_mtime_ns
+
+    # A page inserted at the top of the nav doesn't rename the others
+    time.sleep(0.01)
+    asyncio.run(crawler.crawl_docs([x, a, b]))
+
+    assert sorted(f for f in os.listdir(unprocessed) if f.endswith(".md")) == ["a_A.md", "a_B.md", "b_X.md"]
+    assert sorted(f for f in os.listdir(unprocessed) if f.endswith(".sha256")) == ["a_A.sha256", "a_B.sha256", "b_X.sha256"]
+    assert crawler.read_page_file(os.path.join(unprocessed, "a_A.md")) == "a body"
+    assert os.stat(os.path.join(unprocessed, "a_A.md")).st_mtime_ns == a_mtime
+    with open(os.path.join(unprocessed, "page_order.json"), encoding="utf-8") as f:
+        assert json.load(f)["files"] == ["b_X.md", "a_A.md", "a_B.md"]
+
+
+def test_stable_naming_supersedes_position_named_files(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first"]
+    fake_crawler.pages = {urls[0]: "first body"}
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, naming="stable", incremental=True)
+    unprocessed = os.path.join(crawler.output_dir, "unprocessed")
+    os.makedirs(unprocessed)
+    # A page written under its nav position by an older version
+    with open(os.path.join(unprocessed, "1_first.md"), "w", encoding="utf-8") as f:
+        f.write(crawler.page_text("1_first", urls[0], "first body"))
+    with open(os.path.join(unprocessed, "1_first.sha256"), "w", encoding="utf-8") as f:
+        f.write(scraper_mod.sha256_text("first body"))
+
+    asyncio.run(crawler.crawl_docs(urls))
+
+    assert sorted(os.listdir(unprocessed)) == ["a_first.md", "a_first.sha256", "page_order.json"]
+
+
+def write_fixture(root, path, body):
+    target = root.joinpath(*path.strip("/").split("/"), "index.html")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(f"<html><body>{body}</body></html>", encoding="utf-8")
+
+
+def test_replay_crawls_recorded_fixtures_offline(scraper_mod, fake_crawler, tmp_path):
+    fixtures = tmp_path / "fixtures"
+    write_fixture(fixtures, "/pine-script-docs/welcome", (
+        "<nav class='sidebar'>"
+        "<a href='/pine-script-docs/language/loops/'>Loops</a>"
+        "<a href='https://www.tradingview.com/pine-script-docs/language/arrays/'>Arrays</a>"
+        "</nav>"))
+    write_fixture(fixtures, "/pine-script-docs/language/loops", "<main><div><h1>Loops</h1><p>for loops</p></div></main>")
+    write_fixture(fixtures, "/pine-script-docs/language/arrays", "<main><div><h1>Arrays</h1><p>array.new</p></div></main>")
+
+    recorded = tmp_path / "recorded"
+    crawler = scraper_mod.PineScriptDocsCrawler(
+        rate_limit=0, fetch_mode="http", naming="stable",
+        replay_dir=str(fixtures), record_dir=str(recorded),
+        output_dir=str(tmp_path / "pinescript_docs"),
+    )
+    asyncio.run(crawler.run())
+
+    assert crawler.base_url == scraper_mod.DEFAULT_BASE_URL
+    assert fake_crawler.rendered == []
+    unprocessed = tmp_path / "pinescript_docs" / "unprocessed"
+    assert "for loops" in (unprocessed / "language_loops.md").read_text(encoding="utf-8")
+    assert "array.new" in (unprocessed / "language_arrays.md").read_text(encoding="utf-8")
+
+    # Every fetched page (and the welcome nav) was recorded under its URL path
+    for path in ("welcome", "language/loops", "language/arrays"):
+        assert (recorded / "pine-script-docs" / path / "index.html").exists()
+
+
+def test_crawl_report_has_per_page_timings(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/static", f"{base}/a/dynamic", f"{base}/a/missing"]
+    fake_crawler.pages = {urls[1]: "rendered"}
+
+    def handler(request):
+        if request.url.path.endswith("/static"):
+            return httpx.Response(200, text="<main><div><h1>Static</h1><p>body</p></div></main>")
+        return httpx.Response(200, text="<div id='app'></div>")
+
+    http_handler["handler"] = handler
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, fetch_mode="http")
+    asyncio.run(crawler.crawl_docs(urls))
+
+    report_name = [f for f in os.listdir(crawler.output_dir) if f.startswith("crawl_report_")][0]
+    with open(os.path.join(crawler.output_dir, report_name), encoding="utf-8") as f:
+        report = json.load(f)
+
+    pages = {page["url"]: page for page in report["pages"]}
+    assert [page["page_index"] for page in report["pages"]] == [1, 2, 3]
+    static = pages[urls[0]]
+    assert static["status"] == "saved" and static["via"] == "http" and static["attempts"] == 1
+    assert {"navigation", "extraction", "markdown", "write", "total"} <= set(static["timings_ms"])
+    assert static["bytes"]["file"] > static["bytes"]["markdown"] > 0
+    dynamic = pages[urls[1]]
+    assert dynamic["via"] == "browser" and dynamic["attempts"] == 2
+    assert pages[urls[2]]["status"] == "failed" and pages[urls[2]]["error"] == "404"
+    assert report["timings_ms"]["total"]["count"] == 3
+    assert set(report["timings_ms"]["navigation"]) == {"count", "p50", "p95", "max"}
+
+
+def test_percentile_nearest_rank(scraper_mod):
+    values = list(range(1, 101))
+    assert scraper_mod.percentile(values, 50) == 50
+    assert scraper_mod.percentile(values, 95) == 95
+    assert scraper_mod.percentile([7], 95) == 7
+
+
+def test_adaptive_limiter_grows_and_backs_off(scraper_mod):
+    limiter = scraper_mod.AdaptiveLimiter(2, maximum=4, target_latency=1.0, base_backoff=0.01)
+
+    async def scenario():
+        # Two healthy responses at limit 2 earn one more slot
+        for _ in range(2):
+            await limiter.record(0.1, 200)
+        assert limiter.limit == 3
+        # Slow responses don't count towards growth
+        for _ in range(5):
+            await limiter.record(2.0, 200)
+        assert limiter.limit == 3
+        await limiter.record(0.1, 429, retry_after=0.05)
+        assert limiter.limit == 1
+        started = time.monotonic()
+        await limiter.acquire()
+        await limiter.release()
+        return time.monotonic() - started
+
+    waited = asyncio.run(scenario())
+    assert waited >= 0.04
+    assert limiter.peak_limit == 3
+    assert limiter.backoffs == 1
+
+
+def test_retry_after_seconds(scraper_mod):
+    assert scraper_mod.retry_after_seconds("3") == 3.0
+    assert scraper_mod.retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert scraper_mod.retry_after_seconds(None) is None
+
+
+def test_transient_failures_are_retried(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first", f"{base}/a/flaky", f"{base}/a/missing"]
+    fake_crawler.pages = {urls[0]: "first body", urls[1]: "flaky body"}
+    fake_crawler.failures = {urls[1]: [503]}
+
+    crawler = make_crawler(scraper_mod, tmp_path, concurrency=2, rate_limit=0, retry_backoff=0)
+    asyncio.run(crawler.crawl_docs(urls))
+
+    unprocessed = sorted(os.listdir(os.path.join(crawler.output_dir, "unprocessed")))
+    assert [name.split("_")[0] for name in unprocessed] == ["1", "2"]
+    # The 404 is permanent and is not retried
+    assert fake_crawler.rendered.count(urls[2]) == 1
+
+    report_name = [f for f in os.listdir(crawler.output_dir) if f.startswith("crawl_report_")][0]
+    with open(os.path.join(crawler.output_dir, report_name), encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["counts"]["retried"] == 1
+    assert report["counts"]["failed"] == 1
+    assert report["adaptive"]["backoffs"] == 1
+    flaky = report["pages"][1]
+    assert flaky["status"] == "saved"
+    assert flaky["attempts"] == 2
+    assert flaky["retries"] == 1
+
+
+def test_page_writer_calls_back_after_write(scraper_mod, tmp_path):
+    seen = []
+
+    async def scenario():
+        async with scraper_mod.PageWriter() as writer:
+            for i in range(3):
+                path = str(tmp_path / f"{i}.md")
+                writer.submit([(path, f"page {i}")],
+                              lambda write_ms, error, path=path: seen.append(open(path, encoding="utf-8").read()))
+            # Submitting never waits for the disk
+            assert seen == []
+
+            # Coroutine callbacks are awaited before the next job
+            async def on_written(write_ms, error):
+                await asyncio.sleep(0.01)
+                seen.append("async")
+
+            writer.submit([(str(tmp_path / "3.md"), "page 3")], on_written)
+            writer.submit([(str(tmp_path / "4.md"), "page 4")], lambda write_ms, error: seen.append("page 4"))
+
+    asyncio.run(scenario())
+    assert seen == ["page 0", "page 1", "page 2", "async", "page 4"]
+
+
+def test_failed_page_write_marks_the_page_failed(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first", f"{base}/a/second"]
+    fake_crawler.pages = {urls[0]: "first body", urls[1]: "second body"}
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, naming="stable")
+    # A directory in the way makes writing the second page fail
+    os.makedirs(os.path.join(crawler.output_dir, "unprocessed", "a_second.sha256"))
+    asyncio.run(crawler.crawl_docs(urls))
+
+    with open(crawler.journal_path, encoding="utf-8") as f:
+        journaled = [json.loads(line)["url"] for line in f if '"page"' in line]
+    assert journaled == [urls[0]]
+    combined = [f for f in os.listdir(crawler.output_dir) if f.startswith("all_docs_")][0]
+    with open(os.path.join(crawler.output_dir, combined), encoding="utf-8") as f:
+        text = f.read()
+    assert "first body" in text and "second body" not in text
+    failed = [f for f in os.listdir(crawler.output_dir) if f.startswith("failed_urls_")][0]
+    with open(os.path.join(crawler.output_dir, failed), encoding="utf-8") as f:
+        assert f.read().startswith(f"{urls[1]}: Failed to write a_second.md")
+    report_name = [f for f in os.listdir(crawler.output_dir) if f.startswith("crawl_report_")][0]
+    with open(os.path.join(crawler.output_dir, report_name), encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["counts"]["success"] == 1 and report["counts"]["failed"] == 1
+    assert report["pages"][1]["status"] == "failed"
+
+
+def test_browser_session_recycles_after_n_pages(scraper_mod, fake_crawler):
+    session = scraper_mod.BrowserSession(None, recycle_after=2)
+
+    async def fetch(i):
+        async with session.page() as crawler:
+            await crawler.arun(f"https://example.com/{i}")
+
+    async def scenario():
+        async with session:
+            await asyncio.gather(*(fetch(i) for i in range(5)))
+
+    asyncio.run(scenario())
+    assert session.launches == 3
+    assert fake_crawler.max_in_flight <= 2
+
+
+def test_resource_blocker_allows_only_first_party_documents(scraper_mod):
+    handled = []
+
+    class Route:
+        def __init__(self, url, resource_type):
+            self.request = SimpleNamespace(url=url, resource_type=resource_type)
+
+        async def abort(self):
+            handled.append((self.request.url, "abort"))
+
+        async def continue_(self):
+            handled.append((self.request.url, "continue"))
+
+    domain = scraper_mod.site_domain("https://www.tradingview.com/pine-script-docs")
+    assert domain == "tradingview.com"
+    handle = scraper_mod.resource_blocker(domain)
+    requests = [
+        ("https://www.tradingview.com/pine-script-docs/welcome/", "document"),
+        ("https://static.tradingview.com/app.js", "script"),
+        ("https://static.tradingview.com/logo.png", "image"),
+        ("https://www.google-analytics.com/analytics.js", "script"),
+    ]
+
+    async def scenario():
+        for url, resource_type in requests:
+            await handle(Route(url, resource_type))
+
+    asyncio.run(scenario())
+    assert [action for _, action in handled] == ["continue", "continue", "abort", "abort"]
+    assert scraper_mod.site_domain("http://127.0.0.1:8000/pine-script-docs") == "127.0.0.1"
+
+
+def test_page_structure_sidecar_from_static_html(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    url = f"{base}/a/static"
+    html = ("<html><body><main><div><h1>Static page</h1>"
+            "<h2 id='first'>First part</h2><p>One.</p>"
+            "<h3><a href='#deeper'>Deeper</a></h3><p>Two.</p></div>"
+            "<nav aria-label='Table of contents'><a href='#first'>First part</a></nav>"
+            "</main></body></html>")
+    http_handler["handler"] = lambda request: httpx.Response(200, text=html)
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, fetch_mode="http", naming="stable")
+    asyncio.run(crawler.crawl_docs([url]))
+
+    with open(os.path.join(crawler.output_dir, "unprocessed", "a_static.structure.json"), encoding="utf-8") as f:
+        structure = json.load(f)
+    assert structure["title"] == "Static page"
+    assert structure["source"] == url
+    assert structure["headings"] == [
+        {"level": 1, "text": "Static page", "anchor": None},
+        {"level": 2, "text": "First part", "anchor": "first"},
+        {"level": 3, "text": "Deeper", "anchor": "deeper"},
+    ]
+    assert structure["toc"] == [{"text": "First part", "anchor": "first"}]
+
+    # Browser results carry the same fields as crawl4ai's extracted_content
+    extracted = json.dumps([{"title": "Rendered", "content": "<div><h2 id='x'>X</h2></div>"}])
+    assert crawler.page_structure("", extracted) == {
+        "title": "Rendered", "headings": [{"level": 2, "text": "X", "anchor": "x"}], "toc": []}
+
+
+def test_work_queue_hands_out_each_page_once(scraper_mod, tmp_path):
+    queue = scraper_mod.WorkQueue(str(tmp_path / "queue.sqlite3"))
+    queue.create("20240101_000000", "https://example.com/docs", ["u1", "u2", "u3"])
+
+    assert queue.meta()["run_id"] == "20240101_000000"
+    assert queue.claim(1) == (1, "u1")
+    assert queue.claim(2) == (2, "u2")
+    queue.record_page("20240101_000000", 1, "u1", "1_u1.md", "abc")
+    # Worker 2 died holding page 2: it goes back to the queue
+    assert queue.requeue_claimed() == 1
+    assert queue.claim(1) == (2, "u2")
+    queue.fail(2, "HTTP 404")
+    assert queue.claim(1) == (3, "u3")
+    assert queue.claim(1) is None
+
+    results = queue.results()
+    assert [row["status"] for row in results] == ["done", "failed", "claimed"]
+    assert results[1]["attempts"] == 2
+
+
+def test_sharded_crawl_rebuilds_navbar_order(scraper_mod, tmp_path):
+    fixtures = tmp_path / "fixtures"
+    names = [f"page{i}" for i in range(1, 7)]
+    write_fixture(fixtures, "/pine-script-docs/welcome", "<nav class='sidebar'>" + "".join(
+        f"<a href='/pine-script-docs/language/{name}/'>{name}</a>" for name in names) + "<a href='/pine-script-docs/gone/'>gone</a></nav>")
+    for name in names:
+        write_fixture(fixtures, f"/pine-script-docs/language/{name}",
+                      f"<main><div><h1>{name}</h1><p>body of {name}</p></div></main>")
+
+    output_dir = tmp_path / "pinescript_docs"
+    crawler = scraper_mod.PineScriptDocsCrawler(
+        rate_limit=0, fetch_mode="http", naming="stable", shards=2, max_retries=0,
+        replay_dir=str(fixtures), output_dir=str(output_dir),
+    )
+    # The worker processes render nothing: every fixture page is static HTML
+    asyncio.run(crawler.run())
+
+    unprocessed = output_dir / "unprocessed"
+    for i, name in enumerate(names, start=1):
+        assert f"body of {name}" in (unprocessed / f"language_{name}.md").read_text(encoding="utf-8")
+    combined = [f for f in os.listdir(output_dir) if f.startswith("all_docs_")][0]
+    text = (output_dir / combined).read_text(encoding="utf-8")
+    positions = [text.index(f"# {i}_{name}") for i, name in enumerate(names, start=1)]
+    assert positions == sorted(positions)
+    failed = [f for f in os.listdir(output_dir) if f.startswith("failed_urls_")][0]
+    assert "/gone/" in (output_dir / failed).read_text(encoding="utf-8")
+    # Each worker wrote its own report
+    assert len([f for f in os.listdir(output_dir) if f.startswith("crawl_report_")]) == 2
+
+
+def test_discovery_is_cached_until_ttl(scraper_mod, fake_crawler, http_handler, tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        return httpx.Response(200, text="<nav class='sidebar'><a href='/pine-script-docs/a/one/'>One</a></nav>")
+
+    http_handler["handler"] = handler
+    crawler = make_crawler(scraper_mod, tmp_path, fetch_mode="http", discovery_ttl=3600)
+    first = asyncio.run(crawler.get_all_doc_urls())
+    assert asyncio.run(crawler.get_all_doc_urls()) == first
+    assert len(requests) == 1
+
+    # An expired cache is refreshed
+    with open(crawler.discovery_cache_path, encoding="utf-8") as f:
+        cache = json.load(f)
+    cache["base_urls"][crawler.base_url]["discovered_at"] -= 7200
+    with open(crawler.discovery_cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    asyncio.run(crawler.get_all_doc_urls())
+    assert len(requests) == 2
+
+    # Recording fetches the nav itself and leaves the cache alone
+    with open(crawler.discovery_cache_path, encoding="utf-8") as f:
+        cache = f.read()
+    crawler.record_dir = str(tmp_path / "recorded")
+    asyncio.run(crawler.get_all_doc_urls())
+    assert len(requests) == 3
+    with open(crawler.discovery_cache_path, encoding="utf-8") as f:
+        assert f.read() == cache
+    crawler.record_dir = None
+
+    # Another base URL (e.g. a fixture server) gets its own entry
+    crawler.base_url = "http://127.0.0.1:8000/pine-script-docs"
+    asyncio.run(crawler.get_all_doc_urls())
+    assert len(requests) == 4
+    crawler.base_url = scraper_mod.DEFAULT_BASE_URL
+    assert asyncio.run(crawler.get_all_doc_urls()) == first
+    assert len(requests) == 4
+
+
+def test_expand_crawls_links_the_nav_misses(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    links = {
+        "/pine-script-docs/a/one": "<a href='../two/'>two</a><a href='https://example.com/x'>x</a>",
+        "/pine-script-docs/a/two": "<a href='/pine-script-docs/a/three/#part'>three</a><a href='../one/'>one</a>"
+                                   "<a href='/pine-script-docs/a/chart.png'>image</a>",
+        "/pine-script-docs/a/three": "",
+    }
+
+    def handler(request):
+        path = request.url.path.rstrip("/")
+        return httpx.Response(200, text=f"<html><body><main><div><h1>{path}</h1>{links[path]}</div></main></body></html>")
+
+    http_handler["handler"] = handler
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, fetch_mode="http", naming="stable", expand=True)
+    asyncio.run(crawler.crawl_docs([f"{base}/a/one/"]))
+
+    unprocessed = sorted(f for f in os.listdir(os.path.join(crawler.output_dir, "unprocessed")) if f.endswith(".md"))
+    assert unprocessed == ["a_one.md", "a_three.md", "a_two.md"]
+    with open(os.path.join(crawler.output_dir, "unprocessed", "page_order.json"), encoding="utf-8") as f:
+        assert json.load(f)["files"] == ["a_one.md", "a_two.md", "a_three.md"]
+    assert fake_crawler.rendered == []
+
+
+def test_recrawl_budget_prefers_frequently_changing_pages(scraper_mod, fake_crawler, http_handler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/stable", f"{base}/a/hot", f"{base}/a/warm"]
+    fake_crawler.pages = {url: f"body of {url}" for url in urls}
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(200, text=f"<html>{len(requested)}</html>")
+
+    http_handler["handler"] = handler
+    asyncio.run(make_crawler(scraper_mod, tmp_path, rate_limit=0, incremental=True).crawl_docs(urls))
+    assert requested == urls
+
+    state_path = os.path.join(tmp_path, "pinescript_docs", "crawl_state.json")
+    state = scraper_mod.CrawlState(state_path)
+    for url, changes in ((urls[0], [False] * 10), (urls[1], [True] * 10), (urls[2], [True, False] * 5)):
+        state.entries[url]["history"] = [{"crawled": state.entries[url]["last_crawled"], "changed": c} for c in changes]
+    state.save()
+    assert state.recrawl_priority(urls[1]) > state.recrawl_priority(urls[2]) > state.recrawl_priority(urls[0])
+
+    requested.clear()
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, incremental=True, budget=2)
+    asyncio.run(crawler.crawl_docs(urls))
+    assert sorted(requested) == sorted(urls[1:])
+
+    # The deferred page still appears in the combined output with its previous content
+    combined = sorted(f for f in os.listdir(crawler.output_dir) if f.startswith("all_docs_"))[-1]
+    with open(os.path.join(crawler.output_dir, combined), encoding="utf-8") as f:
+        assert f"body of {urls[0]}" in f.read()
+    history = scraper_mod.CrawlState(state_path).get(urls[1])["history"]
+    assert len(history) == 11 and history[-1]["changed"] is False
+
+
+def test_markdown_sections_ignore_code_fences(scraper_mod):
+    text = "intro\n# Title\nbody\n```\n# not a heading\n```\n## Part\none\n## Part\ntwo\n### Deeper\nthree\n"
+    keys = [key for key, _ in scraper_mod.markdown_sections(text)]
+    assert keys == ["", "Title", "Part", "Part (2)"]
+
+
+def test_changed_pages_get_section_diff(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first", f"{base}/a/second"]
+    fake_crawler.pages = {
+        urls[0]: "# First\nintro\n## Keep\nsame\n## Edit\nold text\n## Drop\ngone soon\n",
+        urls[1]: "# Second\nunchanged page\n",
+    }
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0, naming="stable")
+    asyncio.run(crawler.crawl_docs(urls))
+
+    def latest_changes():
+        name = sorted(f for f in os.listdir(crawler.output_dir) if f.startswith("changes_"))[-1]
+        with open(os.path.join(crawler.output_dir, name), encoding="utf-8") as f:
+            return json.load(f)["pages"]
+
+    first_run = latest_changes()
+    assert [page["new"] for page in first_run] == [True, True]
+    assert first_run[0]["added"] == ["First", "Keep", "Edit", "Drop"]
+
+    for name in os.listdir(crawler.output_dir):
+        if name.startswith("changes_"):
+            os.remove(os.path.join(crawler.output_dir, name))
+    fake_crawler.pages[urls[0]] = "# First\nintro\n## Keep\nsame\n## Edit\nnew text\n## Added\nfresh\n"
+    asyncio.run(crawler.crawl_docs(urls))
+
+    (page,) = latest_changes()
+    assert page["url"] == urls[0] and page["new"] is False
+    assert page["added"] == ["Added"]
+    assert page["removed"] == ["Drop"]
+    assert page["modified"] == ["Edit"]
+
+
+def test_section_diff_with_timestamped_names_uses_the_journal(scraper_mod, fake_crawler, tmp_path):
+    base = "https://www.tradingview.com/pine-script-docs"
+    urls = [f"{base}/a/first"]
+    fake_crawler.pages = {urls[0]: "# First\nintro\n## Edit\nold text\n"}
+    crawler = make_crawler(scraper_mod, tmp_path, rate_limit=0)
+    asyncio.run(crawler.crawl_docs(urls))
+
+    fake_crawler.pages[urls[0]] = "# First\nintro\n## Edit\nnew text\n"
+    time.sleep(1)  # new run timestamp, so a new file name
+    asyncio.run(crawler.crawl_docs(urls))
+
+    name = sorted(f for f in os.listdir(crawler.output_dir) if f.startswith("changes_"))[-1]
+    with open(os.path.join(crawler.output_dir, name), encoding="utf-8") as f:
+        (page,) = json.load(f)["pages"]
+    assert page["new"] is False
+    assert page["previous_file"] != page["file"]
+    assert page["added"] == [] and page["modified"] == ["Edit"]